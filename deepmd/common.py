@@ -33,6 +33,9 @@ from deepmd.env import (
     op_module,
     tf,
 )
+from deepmd.utils.data_manifest import (
+    get_data_manifest,
+)
 from deepmd.utils.path import (
     DPPath,
 )
@@ -142,6 +145,7 @@ def add_data_requirement(
     repeat: int = 1,
     default: float = 0.0,
     dtype: Optional[np.dtype] = None,
+    load: bool = True,
 ):
     """Specify data requirements for training.
 
@@ -167,7 +171,14 @@ def add_data_requirement(
         default value of data
     dtype : np.dtype, optional
         the dtype of data, overwrites `high_prec` if provided
+    load : bool, optional, default=True
+        if false, the data is never read from the files and the default value
+        is used, e.g. when the data is not used by the loss. If the data has
+        been required before, it is read as long as any requirement loads it,
+        e.g. when the losses of several tasks share the requirements
     """
+    if key in data_requirement:
+        load = load or data_requirement[key]["load"]
     data_requirement[key] = {
         "ndof": ndof,
         "atomic": atomic,
@@ -177,6 +188,7 @@ def add_data_requirement(
         "repeat": repeat,
         "default": default,
         "dtype": dtype,
+        "load": load,
     }
 
 
@@ -344,6 +356,11 @@ def get_precision(precision: "_PRECISION") -> Any:
 def expand_sys_str(root_dir: Union[str, Path]) -> List[str]:
     """Recursively iterate over directories taking those that contain `type.raw` file.
 
+    The systems are sorted by their paths, so that their order does not depend
+    on the file system. If the environment variable `DP_DATA_MANIFEST` is set,
+    the result is cached in the data manifest, see
+    :mod:`deepmd.utils.data_manifest`.
+
     Parameters
     ----------
     root_dir : Union[str, Path]
@@ -352,13 +369,16 @@ def expand_sys_str(root_dir: Union[str, Path]) -> List[str]:
     Returns
     -------
     List[str]
-        list of string pointing to system directories
+        list of string pointing to system directories, sorted by the paths
     """
+    manifest = get_data_manifest()
+    if manifest is not None:
+        return manifest.expand_sys_str(root_dir)
     root_dir = DPPath(root_dir)
     matches = [str(d) for d in root_dir.rglob("*") if (d / "type.raw").is_file()]
     if (root_dir / "type.raw").is_file():
         matches.append(str(root_dir))
-    return matches
+    return sorted(matches)
 
 
 def get_np_precision(precision: "_PRECISION") -> np.dtype:
@@ -1,4 +1,12 @@
 # SPDX-License-Identifier: LGPL-3.0-or-later
+import os
+from collections import (
+    deque,
+)
+from concurrent.futures import (
+    Executor,
+    ThreadPoolExecutor,
+)
 from typing import (
     List,
     Optional,
@@ -60,6 +68,10 @@ from .se import (
     DescrptSe,
 )
 
+# the maximum number of atoms in all frames of the stat batches computed in
+# one session run, which bounds the memory of the run
+STAT_MERGE_MAX_ATOMS = 4096
+
 
 @Descriptor.register("se_e2_a")
 @Descriptor.register("se_a")
@@ -333,37 +345,86 @@ class DescrptSeA(DescrptSe):
             Additional keyword arguments.
         """
         if True:
-            sumr = []
-            suma = []
-            sumn = []
-            sumr2 = []
-            suma2 = []
-            for cc, bb, tt, nn, mm in zip(
-                data_coord, data_box, data_atype, natoms_vec, mesh
-            ):
-                sysr, sysr2, sysa, sysa2, sysn = self._compute_dstats_sys_smth(
-                    cc, bb, tt, nn, mm
+            # the systems are computed in parallel
+            with ThreadPoolExecutor() as executor:
+                stat_dict = self.compute_input_stats_sums(
+                    data_coord, data_box, data_atype, natoms_vec, mesh, executor
                 )
-                sumr.append(sysr)
-                suma.append(sysa)
-                sumn.append(sysn)
-                sumr2.append(sysr2)
-                suma2.append(sysa2)
             if not self.multi_task:
-                stat_dict = {
-                    "sumr": sumr,
-                    "suma": suma,
-                    "sumn": sumn,
-                    "sumr2": sumr2,
-                    "suma2": suma2,
-                }
                 self.merge_input_stats(stat_dict)
             else:
-                self.stat_dict["sumr"] += sumr
-                self.stat_dict["suma"] += suma
-                self.stat_dict["sumn"] += sumn
-                self.stat_dict["sumr2"] += sumr2
-                self.stat_dict["suma2"] += suma2
+                self.stat_dict["sumr"] += stat_dict["sumr"]
+                self.stat_dict["suma"] += stat_dict["suma"]
+                self.stat_dict["sumn"] += stat_dict["sumn"]
+                self.stat_dict["sumr2"] += stat_dict["sumr2"]
+                self.stat_dict["suma2"] += stat_dict["suma2"]
+
+    def compute_input_stats_sums(
+        self,
+        data_coord: list,
+        data_box: list,
+        data_atype: list,
+        natoms_vec: list,
+        mesh: list,
+        executor: Optional[Executor] = None,
+    ) -> dict:
+        """Compute the sums of the statisitcs of the training data, which can be
+        accumulated over the data and merged by :meth:`merge_input_stats`.
+
+        The consecutive batches with the same numbers of atoms and mesh are
+        computed in one session run, as long as the run has no more than
+        `STAT_MERGE_MAX_ATOMS` atoms in all frames.
+
+        Parameters
+        ----------
+        data_coord
+            The coordinates. Can be generated by deepmd.model.make_stat_input
+        data_box
+            The box. Can be generated by deepmd.model.make_stat_input
+        data_atype
+            The atom types. Can be generated by deepmd.model.make_stat_input
+        natoms_vec
+            The vector for the number of atoms of the system and different types of atoms. Can be generated by deepmd.model.make_stat_input
+        mesh
+            The mesh for neighbor searching. Can be generated by deepmd.model.make_stat_input
+        executor
+            The executor to compute the merged batches in parallel. At most as
+            many merged batches as the CPU cores are kept in the memory. The
+            batches are computed one by one if not given.
+
+        Returns
+        -------
+        dict
+            The lists of sumr, suma, sumn, sumr2 and suma2 of the systems
+        """
+        batches = _merge_stat_batches(
+            data_coord, data_box, data_atype, natoms_vec, mesh
+        )
+        stat_dict = {"sumr": [], "suma": [], "sumn": [], "sumr2": [], "suma2": []}
+
+        def append(result):
+            sysr, sysr2, sysa, sysa2, sysn = result
+            stat_dict["sumr"].append(sysr)
+            stat_dict["suma"].append(sysa)
+            stat_dict["sumn"].append(sysn)
+            stat_dict["sumr2"].append(sysr2)
+            stat_dict["suma2"].append(sysa2)
+
+        if executor is None:
+            for args in batches:
+                append(self._compute_dstats_sys_smth(*args))
+        else:
+            nworkers = os.cpu_count() or 1
+            futures = deque()
+            for args in batches:
+                futures.append(executor.submit(self._compute_dstats_sys_smth, *args))
+                del args
+                # at most nworkers merged batches are waiting to be computed
+                while len(futures) >= nworkers:
+                    append(futures.popleft().result())
+            while len(futures):
+                append(futures.popleft().result())
+        return stat_dict
 
     def merge_input_stats(self, stat_dict):
         """Merge the statisitcs computed from compute_input_stats to obtain the self.davg and self.dstd.
@@ -783,32 +844,28 @@ class DescrptSeA(DescrptSe):
             },
         )
         natoms = natoms_vec
-        dd_all = np.reshape(dd_all, [-1, self.ndescrpt * natoms[0]])
-        start_index = 0
-        sysr = []
-        sysa = []
-        sysn = []
-        sysr2 = []
-        sysa2 = []
-        for type_i in range(self.ntypes):
-            end_index = start_index + self.ndescrpt * natoms[2 + type_i]
-            dd = dd_all[:, start_index:end_index]
-            dd = np.reshape(dd, [-1, self.ndescrpt])
-            start_index = end_index
-            # compute
-            dd = np.reshape(dd, [-1, 4])
-            ddr = dd[:, :1]
-            dda = dd[:, 1:]
-            sumr = np.sum(ddr)
-            suma = np.sum(dda) / 3.0
-            sumn = dd.shape[0]
-            sumr2 = np.sum(np.multiply(ddr, ddr))
-            suma2 = np.sum(np.multiply(dda, dda)) / 3.0
-            sysr.append(sumr)
-            sysa.append(suma)
-            sysn.append(sumn)
-            sysr2.append(sumr2)
-            sysa2.append(suma2)
+        dd_all = np.reshape(dd_all, [-1, natoms[0], self.ndescrpt // 4, 4])
+        # sums over frames and neighbors of each atom, and then over the atoms
+        # of each type, which are contiguous
+        ddr = dd_all[..., 0]
+        dda = dd_all[..., 1:]
+        atom_sums = np.stack(
+            [
+                np.sum(ddr, axis=(0, 2)),
+                np.sum(dda, axis=(0, 2, 3)) / 3.0,
+                np.sum(np.square(ddr), axis=(0, 2)),
+                np.sum(np.square(dda), axis=(0, 2, 3)) / 3.0,
+            ]
+        )
+        type_end = np.cumsum(natoms[2 : 2 + self.ntypes])
+        cum_sums = np.concatenate(
+            [np.zeros([4, 1]), np.cumsum(atom_sums, axis=1)], axis=1
+        )
+        type_sums = np.diff(cum_sums[:, np.concatenate([[0], type_end])], axis=1)
+        sysr, sysa, sysr2, sysa2 = type_sums.tolist()
+        sysn = (
+            dd_all.shape[0] * (self.ndescrpt // 4) * natoms[2 : 2 + self.ntypes]
+        ).tolist()
         return sysr, sysr2, sysa, sysa2, sysn
 
     def _compute_std(self, sumv2, sumv, sumn):
@@ -1179,3 +1236,57 @@ class DescrptSeA(DescrptSe):
                 self.dstd = new_dstd
                 if self.original_sel is None:
                     self.original_sel = sel
+
+
+def _merge_stat_batches(
+    data_coord, data_box, data_atype, natoms_vec, mesh, max_atoms=None
+):
+    """Merge the consecutive stat batches with the same numbers of atoms and
+    mesh, which may belong to different systems.
+
+    Parameters
+    ----------
+    data_coord, data_box, data_atype, natoms_vec, mesh
+        The lists of the batches
+    max_atoms : int, optional
+        The maximum number of atoms in all frames of the merged batches,
+        `STAT_MERGE_MAX_ATOMS` by default. A batch with more atoms is not
+        merged with others.
+
+    Yields
+    ------
+    tuple
+        coord, box, atype, natoms_vec and mesh of the merged batches
+    """
+    if max_atoms is None:
+        max_atoms = STAT_MERGE_MAX_ATOMS
+    batches = []
+    natoms = 0
+    for cc, bb, tt, nn, mm in zip(data_coord, data_box, data_atype, natoms_vec, mesh):
+        batch_natoms = np.shape(cc)[0] * nn[0]
+        if (
+            batches
+            and np.array_equal(nn, batches[0][3])
+            and np.array_equal(mm, batches[0][4])
+            and natoms + batch_natoms <= max_atoms
+        ):
+            batches.append((cc, bb, tt, nn, mm))
+            natoms += batch_natoms
+            continue
+        if batches:
+            yield _concat_stat_batches(batches)
+        batches = [(cc, bb, tt, nn, mm)]
+        natoms = batch_natoms
+    if batches:
+        yield _concat_stat_batches(batches)
+
+
+def _concat_stat_batches(batches):
+    cc, bb, tt, nn, mm = zip(*batches)
+    return (
+        np.concatenate(cc),
+        np.concatenate(bb),
+        np.concatenate(tt),
+        nn[0],
+        mm[0],
+    )
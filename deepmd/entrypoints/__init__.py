@@ -19,6 +19,9 @@ from .freeze import (
 from .neighbor_stat import (
     neighbor_stat,
 )
+from .pack_data import (
+    pack_data,
+)
 from .test import (
     test,
 )
@@ -41,4 +44,5 @@ __all__ = [
     "make_model_devi",
     "convert",
     "neighbor_stat",
+    "pack_data",
 ]
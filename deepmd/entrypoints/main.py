@@ -21,6 +21,7 @@ from deepmd.entrypoints import (
     freeze,
     make_model_devi,
     neighbor_stat,
+    pack_data,
     test,
     train_dp,
     transfer,
@@ -87,6 +88,8 @@ def main(args: Optional[Union[List[str], argparse.Namespace]] = None):
         convert(**dict_args)
     elif args.command == "neighbor-stat":
         neighbor_stat(**dict_args)
+    elif args.command == "pack-data":
+        pack_data(**dict_args)
     elif args.command == "train-nvnmd":  # nvnmd
         train_nvnmd(**dict_args)
     elif args.command is None:
@@ -2,6 +2,7 @@
 import logging
 from typing import (
     List,
+    Optional,
 )
 
 from deepmd.common import (
@@ -23,6 +24,7 @@ def neighbor_stat(
     rcut: float,
     type_map: List[str],
     one_type: bool = False,
+    sample: Optional[float] = None,
     **kwargs,
 ):
     """Calculate neighbor statistics.
@@ -37,6 +39,9 @@ def neighbor_stat(
         type map
     one_type : bool, optional, default=False
         treat all types as a single type
+    sample : float, optional
+        only use a sample of the frames of each system: the fraction of the
+        frames if less than 1, otherwise the number of frames
     **kwargs
         additional arguments
 
@@ -57,7 +62,7 @@ def neighbor_stat(
         type_map=type_map,
     )
     data.get_batch()
-    nei = NeighborStat(data.get_ntypes(), rcut, one_type=one_type)
+    nei = NeighborStat(data.get_ntypes(), rcut, one_type=one_type, sample=sample)
     min_nbor_dist, max_nbor_size = nei.get_stat(data)
     log.info("min_nbor_dist: %f" % min_nbor_dist)
     log.info("max_nbor_size: %s" % str(max_nbor_size))
@@ -0,0 +1,49 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import logging
+from typing import (
+    List,
+)
+
+from deepmd.utils.data_pack import (
+    pack_systems,
+)
+
+log = logging.getLogger(__name__)
+
+
+def pack_data(
+    *,
+    system: str,
+    output: str,
+    set_prefix: str = "set",
+    alignment: int = 4096,
+    **kwargs,
+) -> List[str]:
+    """Pack data systems into a single file.
+
+    Parameters
+    ----------
+    system : str
+        the directory that is recursively searched for systems
+    output : str
+        the packed data file
+    set_prefix : str, optional, default=set
+        prefix of the set directories
+    alignment : int, optional, default=4096
+        the alignment of arrays in bytes
+    **kwargs
+        additional arguments
+
+    Returns
+    -------
+    List[str]
+        paths of the packed systems
+
+    Examples
+    --------
+    >>> pack_data(system="data", output="data.dpk")
+    """
+    packed = pack_systems(system, output, set_prefix=set_prefix, alignment=alignment)
+    log.info(f"packed {len(packed)} system(s) into {output}")
+    log.info(f"the systems can be given by the path {output}")
+    return packed
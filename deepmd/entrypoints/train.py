@@ -56,6 +56,7 @@ from deepmd.utils.neighbor_stat import (
     NeighborStat,
 )
 from deepmd.utils.path import (
+    DPH5Path,
     DPPath,
 )
 
@@ -215,7 +216,12 @@ def _do_work(jdata: Dict[str, Any], run_opt: RunOptions, is_compress: bool = Fal
         # init data
         if not multi_task_mode:
             train_data = get_data(
-                jdata["training"]["training_data"], rcut, ipt_type_map, modifier
+                jdata["training"]["training_data"],
+                rcut,
+                ipt_type_map,
+                modifier,
+                rank=run_opt.my_rank,
+                world_size=run_opt.world_size,
             )
             train_data.print_summary("training")
             if jdata["training"].get("validation_data", None) is not None:
@@ -239,6 +245,8 @@ def _do_work(jdata: Dict[str, Any], run_opt: RunOptions, is_compress: bool = Fal
                         ipt_type_map,
                         modifier,
                         multi_task_mode,
+                        rank=run_opt.my_rank,
+                        world_size=run_opt.world_size,
                     )
                     train_data[data_systems].print_summary(
                         f"training in {data_systems}"
@@ -288,7 +296,15 @@ def _do_work(jdata: Dict[str, Any], run_opt: RunOptions, is_compress: bool = Fal
         log.info("finished compressing")
 
 
-def get_data(jdata: Dict[str, Any], rcut, type_map, modifier, multi_task_mode=False):
+def get_data(
+    jdata: Dict[str, Any],
+    rcut,
+    type_map,
+    modifier,
+    multi_task_mode=False,
+    rank: int = 0,
+    world_size: int = 1,
+):
     systems = j_must_have(jdata, "systems")
     if isinstance(systems, str):
         systems = expand_sys_str(systems)
@@ -315,6 +331,13 @@ def get_data(jdata: Dict[str, Any], rcut, type_map, modifier, multi_task_mode=Fa
     batch_size = j_must_have(jdata, "batch_size")
     sys_probs = jdata.get("sys_probs", None)
     auto_prob = jdata.get("auto_prob", "prob_sys_size")
+    prefetch_size = jdata.get("prefetch_size", 0)
+    use_mmap = jdata.get("use_mmap", False)
+    shm_dir = jdata.get("shm_dir", None)
+    stream_block_size = jdata.get("stream_block_size", 0)
+    stream_buffer_size = jdata.get("stream_buffer_size", 1024)
+    if "hdf5_options" in jdata:
+        DPH5Path.set_file_options(**jdata["hdf5_options"])
     optional_type_map = not multi_task_mode
 
     data = DeepmdDataSystem(
@@ -329,8 +352,15 @@ def get_data(jdata: Dict[str, Any], rcut, type_map, modifier, multi_task_mode=Fa
         trn_all_set=True,  # sample from all sets
         sys_probs=sys_probs,
         auto_prob_style=auto_prob,
+        prefetch_size=prefetch_size,
+        use_mmap=use_mmap,
+        shm_dir=shm_dir,
+        stream_block_size=stream_block_size,
+        stream_buffer_size=stream_buffer_size,
     )
     data.add_dict(data_requirement)
+    if jdata.get("shard_systems", False) and world_size > 1:
+        data.set_shard(rank, world_size)
 
     return data
 
@@ -345,6 +375,8 @@ def get_modifier(modi_data=None):
                 modi_data["sys_charge_map"],
                 modi_data["ewald_h"],
                 modi_data["ewald_beta"],
+                modi_data.get("cache_dir", None),
+                modi_data.get("cache_size", None),
             )
         else:
             raise RuntimeError("unknown modifier type " + str(modi_data["type"]))
@@ -373,7 +405,7 @@ def get_type_map(jdata):
     return jdata["model"].get("type_map", None)
 
 
-def get_nbor_stat(jdata, rcut, one_type: bool = False):
+def get_nbor_stat(jdata, rcut, one_type: bool = False, sample: Optional[float] = None):
     max_rcut = get_rcut(jdata)
     type_map = get_type_map(jdata)
 
@@ -418,7 +450,7 @@ def get_nbor_stat(jdata, rcut, one_type: bool = False):
         map_ntypes = data_ntypes
     ntypes = max([map_ntypes, data_ntypes])
 
-    neistat = NeighborStat(ntypes, rcut, one_type=one_type)
+    neistat = NeighborStat(ntypes, rcut, one_type=one_type, sample=sample)
 
     min_nbor_dist, max_nbor_size = neistat.get_stat(train_data)
 
@@ -435,7 +467,13 @@ def get_nbor_stat(jdata, rcut, one_type: bool = False):
 
 
 def get_sel(jdata, rcut, one_type: bool = False):
-    _, max_nbor_size = get_nbor_stat(jdata, rcut, one_type=one_type)
+    # the min distance used by the model compression is always exact
+    _, max_nbor_size = get_nbor_stat(
+        jdata,
+        rcut,
+        one_type=one_type,
+        sample=jdata["training"].get("neighbor_stat_sample", None),
+    )
     return max_nbor_size
 
 
@@ -253,11 +253,7 @@ class EnerFitting(Fitting):
         # data[sys_idx][batch_idx][frame_idx]
         sys_ener = []
         for ss in range(len(data)):
-            sys_data = []
-            for ii in range(len(data[ss])):
-                for jj in range(len(data[ss][ii])):
-                    sys_data.append(data[ss][ii][jj])
-            sys_data = np.concatenate(sys_data)
+            sys_data = np.concatenate([np.ravel(bb) for bb in data[ss]])
             sys_ener.append(np.average(sys_data))
         sys_ener = np.array(sys_ener)
         sys_tynatom = []
@@ -265,12 +261,8 @@ class EnerFitting(Fitting):
             data = all_stat["real_natoms_vec"]
             nsys = len(data)
             for ss in range(len(data)):
-                tmp_tynatom = []
-                for ii in range(len(data[ss])):
-                    for jj in range(len(data[ss][ii])):
-                        tmp_tynatom.append(data[ss][ii][jj].astype(np.float64))
-                tmp_tynatom = np.average(np.array(tmp_tynatom), axis=0)
-                sys_tynatom.append(tmp_tynatom)
+                tmp_tynatom = np.concatenate(data[ss]).astype(np.float64)
+                sys_tynatom.append(np.average(tmp_tynatom, axis=0))
         else:
             data = all_stat["natoms_vec"]
             nsys = len(data)
@@ -1,7 +1,13 @@
 # SPDX-License-Identifier: LGPL-3.0-or-later
+import hashlib
+import logging
 import os
+from collections import (
+    OrderedDict,
+)
 from typing import (
     List,
+    Optional,
     Tuple,
 )
 
@@ -30,6 +36,8 @@ from deepmd.utils.sess import (
     run_sess,
 )
 
+log = logging.getLogger(__name__)
+
 
 class DipoleChargeModifier(DeepDipole):
     """Parameters
@@ -44,6 +52,14 @@ class DipoleChargeModifier(DeepDipole):
             Grid spacing of the reciprocal part of Ewald sum. Unit: A
     ewald_beta
             Splitting parameter of the Ewald sum. Unit: A^{-1}
+    cache_dir
+            The directory to save the corrections of the data, which are
+            reused by later jobs with the same model and data. If None, the
+            corrections are only kept in memory.
+    cache_size
+            The number of the latest used sets whose corrections are kept in
+            memory if `cache_dir` is None. If None, the corrections of all
+            sets are kept.
     """
 
     def __init__(
@@ -53,6 +69,8 @@ class DipoleChargeModifier(DeepDipole):
         sys_charge_map: List[float],
         ewald_h: float = 1,
         ewald_beta: float = 1,
+        cache_dir: Optional[str] = None,
+        cache_size: Optional[int] = None,
     ) -> None:
         """Constructor."""
         # the dipole model is loaded with prefix 'dipole_charge'
@@ -87,6 +105,12 @@ class DipoleChargeModifier(DeepDipole):
         assert self.ndescrpt == self.ndescrpt_a + self.ndescrpt_r
         self.force = None
         self.ntypes = len(self.sel_a)
+        # cache of the corrections
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        # the least recently used set is dropped first
+        self._corrections = OrderedDict()
+        self._hash = None
 
     def build_fv_graph(self) -> tf.Tensor:
         """Build the computational graph for the force and virial inference."""
@@ -402,7 +426,83 @@ class DipoleChargeModifier(DeepDipole):
 
         return all_coord, all_charge, dipole
 
-    def modify_data(self, data: dict, data_sys: DeepmdData) -> None:
+    def get_hash(self) -> str:
+        """Get the hash of the modifier, which changes with the dipole model
+        and the parameters.
+
+        Returns
+        -------
+        str
+            The hash of the modifier.
+        """
+        if self._hash is None:
+            h = hashlib.sha1()
+            with open(self.model_name, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+            h.update(
+                repr(
+                    (
+                        list(self.model_charge_map),
+                        list(self.sys_charge_map),
+                        self.ewald_h,
+                        self.ewald_beta,
+                    )
+                ).encode()
+            )
+            self._hash = h.hexdigest()
+        return self._hash
+
+    def _get_corrections(
+        self,
+        coord: np.ndarray,
+        box: np.ndarray,
+        atype: np.ndarray,
+        cache_key: Optional[str],
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Get the corrections of energy, force and virial, which are computed
+        once for each `cache_key`.
+        """
+        if cache_key is None:
+            return self.eval(coord, box, atype)
+        if cache_key in self._corrections:
+            self._corrections.move_to_end(cache_key)
+            return self._corrections[cache_key]
+        path = None
+        if self.cache_dir is not None:
+            h = hashlib.sha1(self.get_hash().encode())
+            h.update(cache_key.encode())
+            for arr in (coord, box, atype):
+                h.update(np.ascontiguousarray(arr).tobytes())
+            path = os.path.join(self.cache_dir, h.hexdigest() + ".npz")
+        if path is not None and os.path.isfile(path):
+            with np.load(path) as f:
+                corrections = (f["energy"], f["force"], f["virial"])
+        else:
+            corrections = self.eval(coord, box, atype)
+            if path is not None:
+                tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+                try:
+                    os.makedirs(self.cache_dir, exist_ok=True)
+                    np.savez(
+                        tmp_path,
+                        energy=corrections[0],
+                        force=corrections[1],
+                        virial=corrections[2],
+                    )
+                    os.replace(tmp_path, path)
+                except OSError as e:
+                    log.warning(f"cannot save the corrections to {path}: {e}")
+        if self.cache_dir is None and self.cache_size != 0:
+            self._corrections[cache_key] = corrections
+            if self.cache_size is not None:
+                while len(self._corrections) > self.cache_size:
+                    self._corrections.popitem(last=False)
+        return corrections
+
+    def modify_data(
+        self, data: dict, data_sys: DeepmdData, cache_key: Optional[str] = None
+    ) -> None:
         """Modify data.
 
         Parameters
@@ -421,6 +521,9 @@ class DipoleChargeModifier(DeepDipole):
             - virial        virial
         data_sys : DeepmdData
             The data system.
+        cache_key : str, optional
+            The key of the data, e.g. the path of the set, under which the
+            corrections are cached. If None, the corrections are not cached.
         """
         if (
             "find_energy" not in data
@@ -438,7 +541,7 @@ class DipoleChargeModifier(DeepDipole):
         atype = atype[0]
         nframes = coord.shape[0]
 
-        tot_e, tot_f, tot_v = self.eval(coord, box, atype)
+        tot_e, tot_f, tot_v = self._get_corrections(coord, box, atype, cache_key)
 
         # print(tot_f[:,0])
 
@@ -112,12 +112,31 @@ class EnerStdLoss(Loss):
                 "When generalized force loss is used, the dimension of generalized coordinates should be larger than 0"
             )
         # data required
+        # labels not used by the loss are never read; the energy is always
+        # read as it is used by the data statistics
         add_data_requirement("energy", 1, atomic=False, must=False, high_prec=True)
-        add_data_requirement("force", 3, atomic=True, must=False, high_prec=False)
-        add_data_requirement("virial", 9, atomic=False, must=False, high_prec=False)
-        add_data_requirement("atom_ener", 1, atomic=True, must=False, high_prec=False)
         add_data_requirement(
-            "atom_pref", 1, atomic=True, must=False, high_prec=False, repeat=3
+            "force",
+            3,
+            atomic=True,
+            must=False,
+            high_prec=False,
+            load=self.has_f or self.has_pf or self.has_gf,
+        )
+        add_data_requirement(
+            "virial", 9, atomic=False, must=False, high_prec=False, load=self.has_v
+        )
+        add_data_requirement(
+            "atom_ener", 1, atomic=True, must=False, high_prec=False, load=self.has_ae
+        )
+        add_data_requirement(
+            "atom_pref",
+            1,
+            atomic=True,
+            must=False,
+            high_prec=False,
+            repeat=3,
+            load=self.has_pf,
         )
         # drdq: the partial derivative of atomic coordinates w.r.t. generalized coordinates
         # TODO: could numb_generalized_coord decided from the training data?
@@ -127,6 +146,7 @@ class EnerStdLoss(Loss):
             atomic=True,
             must=False,
             high_prec=False,
+            load=self.has_gf,
         )
         if self.enable_atom_ener_coeff:
             add_data_requirement(
@@ -414,11 +434,28 @@ class EnerSpinLoss(Loss):
         self.has_ae = self.start_pref_ae != 0.0 or self.limit_pref_ae != 0.0
         # data required
         add_data_requirement("energy", 1, atomic=False, must=False, high_prec=True)
-        add_data_requirement("force", 3, atomic=True, must=False, high_prec=False)
-        add_data_requirement("virial", 9, atomic=False, must=False, high_prec=False)
-        add_data_requirement("atom_ener", 1, atomic=True, must=False, high_prec=False)
         add_data_requirement(
-            "atom_pref", 1, atomic=True, must=False, high_prec=False, repeat=3
+            "force",
+            3,
+            atomic=True,
+            must=False,
+            high_prec=False,
+            load=self.has_fr or self.has_fm,
+        )
+        add_data_requirement(
+            "virial", 9, atomic=False, must=False, high_prec=False, load=self.has_v
+        )
+        add_data_requirement(
+            "atom_ener", 1, atomic=True, must=False, high_prec=False, load=self.has_ae
+        )
+        add_data_requirement(
+            "atom_pref",
+            1,
+            atomic=True,
+            must=False,
+            high_prec=False,
+            repeat=3,
+            load=False,
         )
         if self.enable_atom_ener_coeff:
             add_data_requirement(
@@ -1,4 +1,13 @@
 # SPDX-License-Identifier: LGPL-3.0-or-later
+import logging
+import os
+from collections import (
+    defaultdict,
+    deque,
+)
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)
 from typing import (
     List,
     Optional,
@@ -7,12 +16,20 @@ from typing import (
 
 import numpy as np
 
+from deepmd.descriptor.se_a import (
+    DescrptSeA,
+)
 from deepmd.env import (
+    GLOBAL_ENER_FLOAT_PRECISION,
+    GLOBAL_NP_FLOAT_PRECISION,
     MODEL_VERSION,
     global_cvt_2_ener_float,
     op_module,
     tf,
 )
+from deepmd.fit.ener import (
+    EnerFitting,
+)
 from deepmd.utils.data_system import (
     DeepmdDataSystem,
 )
@@ -27,10 +44,30 @@ from .model import (
     StandardModel,
 )
 from .model_stat import (
+    get_stat_hash,
+    load_stat,
     make_stat_input,
+    make_stat_input_iter,
     merge_sys_stat,
+    save_stat,
 )
 
+log = logging.getLogger(__name__)
+
+# the attributes set by the data statistics
+DESCRPT_STAT_ATTRS = ("davg", "dstd")
+FITTING_STAT_ATTRS = (
+    "bias_atom_e",
+    "fparam_avg",
+    "fparam_std",
+    "fparam_inv_std",
+    "aparam_avg",
+    "aparam_std",
+    "aparam_inv_std",
+)
+# the data used by the statistics of EnerFitting
+ENER_FITTING_STAT_KEYS = ("energy", "natoms_vec", "real_natoms_vec", "fparam", "aparam")
+
 
 class EnerModel(StandardModel):
     """Energy model.
@@ -64,6 +101,9 @@ class EnerModel(StandardModel):
         spin
     data_stat_nsample
         The number of training samples in a system to compute and change the energy bias.
+    stat_cache_dir
+        The directory to save the data statistics, which are loaded instead of
+        computed if the data and the parameters they depend on are not changed.
     """
 
     model_type = "ener"
@@ -83,6 +123,7 @@ class EnerModel(StandardModel):
         srtab_add_bias: bool = True,
         spin: Optional[Spin] = None,
         data_bias_nsample: int = 10,
+        stat_cache_dir: Optional[str] = None,
         **kwargs,
     ) -> None:
         """Constructor."""
@@ -104,6 +145,31 @@ class EnerModel(StandardModel):
         )
         self.numb_fparam = self.fitting.get_numb_fparam()
         self.numb_aparam = self.fitting.get_numb_aparam()
+        self.stat_cache_dir = stat_cache_dir
+        if (
+            isinstance(descriptor, dict)
+            and isinstance(fitting_net, dict)
+            and not isinstance(type_embedding, TypeEmbedNet)
+            and not isinstance(spin, Spin)
+            and all(hasattr(dd, "dstd") for dd in self._get_stat_descrpts())
+        ):
+            # all parameters of the descriptor and the fitting, as any of them
+            # may change the statistics
+            self.stat_params = {
+                "descriptor": descriptor,
+                "fitting_net": fitting_net,
+                "type_embedding": type_embedding,
+                "type_map": type_map,
+                "data_stat_nbatch": data_stat_nbatch,
+                "data_stat_protect": data_stat_protect,
+                "spin": spin,
+                "precision": [
+                    np.dtype(GLOBAL_NP_FLOAT_PRECISION).name,
+                    np.dtype(GLOBAL_ENER_FLOAT_PRECISION).name,
+                ],
+            }
+        else:
+            self.stat_params = None
 
     def get_rcut(self):
         return self.rcut
@@ -123,13 +189,60 @@ class EnerModel(StandardModel):
         return self.numb_fparam
 
     def data_stat(self, data):
-        all_stat = make_stat_input(data, self.data_stat_nbatch, merge_sys=False)
-        m_all_stat = merge_sys_stat(all_stat)
-        self._compute_input_stat(
-            m_all_stat, protection=self.data_stat_protect, mixed_type=data.mixed_type
-        )
+        stat_hash = None
+        if self.stat_cache_dir is not None:
+            if self.stat_params is None:
+                log.warning(
+                    "the data statistics cannot be cached for the given descriptor or fitting"
+                )
+            else:
+                stat_hash = get_stat_hash(data, self.stat_params)
+                stat = load_stat(self.stat_cache_dir, stat_hash)
+                if stat is not None:
+                    log.info(f"load the data statistics {stat_hash}")
+                    self._set_stat(stat)
+                    return
+        if self._can_stream_stat(data):
+            all_stat = self._compute_input_stat_stream(
+                data, protection=self.data_stat_protect
+            )
+        else:
+            all_stat = make_stat_input(data, self.data_stat_nbatch, merge_sys=False)
+            m_all_stat = merge_sys_stat(all_stat)
+            self._compute_input_stat(
+                m_all_stat,
+                protection=self.data_stat_protect,
+                mixed_type=data.mixed_type,
+            )
         self._compute_output_stat(all_stat, mixed_type=data.mixed_type)
         # self.bias_atom_e = data.compute_energy_shift(self.rcond)
+        if stat_hash is not None:
+            save_stat(self.stat_cache_dir, stat_hash, self._get_stat())
+
+    def _get_stat_descrpts(self) -> list:
+        return getattr(self.descrpt, "descrpt_list", [self.descrpt])
+
+    def _get_stat(self) -> dict:
+        """Get the statistics set by :meth:`data_stat`."""
+        stat = {}
+        for ii, descrpt in enumerate(self._get_stat_descrpts()):
+            for attr in DESCRPT_STAT_ATTRS:
+                if getattr(descrpt, attr, None) is not None:
+                    stat[f"descrpt{ii}_{attr}"] = getattr(descrpt, attr)
+        for attr in FITTING_STAT_ATTRS:
+            if getattr(self.fitting, attr, None) is not None:
+                stat[f"fitting_{attr}"] = getattr(self.fitting, attr)
+        return stat
+
+    def _set_stat(self, stat: dict):
+        """Set the statistics given by :meth:`_get_stat`."""
+        for ii, descrpt in enumerate(self._get_stat_descrpts()):
+            for attr in DESCRPT_STAT_ATTRS:
+                if f"descrpt{ii}_{attr}" in stat:
+                    setattr(descrpt, attr, stat[f"descrpt{ii}_{attr}"])
+        for attr in FITTING_STAT_ATTRS:
+            if f"fitting_{attr}" in stat:
+                setattr(self.fitting, attr, stat[f"fitting_{attr}"])
 
     def _compute_input_stat(self, all_stat, protection=1e-2, mixed_type=False):
         if mixed_type:
@@ -154,6 +267,64 @@ class EnerModel(StandardModel):
             )
         self.fitting.compute_input_stats(all_stat, protection=protection)
 
+    def _can_stream_stat(self, data) -> bool:
+        """Whether the statistics can be computed system by system, for the
+        se_e2_a descriptor and the energy fitting.
+        """
+        return (
+            not data.mixed_type
+            and type(self.descrpt).compute_input_stats is DescrptSeA.compute_input_stats
+            and not self.descrpt.multi_task
+            and isinstance(self.fitting, EnerFitting)
+        )
+
+    def _compute_input_stat_stream(self, data, protection=1e-2):
+        """Compute the input statistics system by system.
+
+        The sums of the descriptor statistics are accumulated as the data of
+        each system are loaded, and the systems are computed in parallel
+        threads. Only the data of the systems being computed and the data
+        used by the fitting statistics are kept in the memory.
+
+        Returns
+        -------
+        all_stat
+            The data used by the fitting statistics, which can be accessed by
+            all_stat[key][sys_idx][batch_idx][frame_idx]
+        """
+        stat_dict = defaultdict(list)
+        all_stat = defaultdict(list)
+        nworkers = os.cpu_count() or 1
+        futures = deque()
+        with ThreadPoolExecutor(max_workers=nworkers) as executor:
+            for sys_stat in make_stat_input_iter(data, self.data_stat_nbatch):
+                futures.append(
+                    executor.submit(
+                        self.descrpt.compute_input_stats_sums,
+                        sys_stat["coord"],
+                        sys_stat["box"],
+                        sys_stat["type"],
+                        sys_stat["natoms_vec"],
+                        sys_stat["default_mesh"],
+                    )
+                )
+                for kk in ENER_FITTING_STAT_KEYS:
+                    if kk in sys_stat:
+                        all_stat[kk].append(sys_stat[kk])
+                del sys_stat
+                # at most nworkers systems are waiting to be computed
+                while len(futures) >= nworkers or (len(futures) and futures[0].done()):
+                    for kk, vv in futures.popleft().result().items():
+                        stat_dict[kk] += vv
+            while len(futures):
+                for kk, vv in futures.popleft().result().items():
+                    stat_dict[kk] += vv
+        self.descrpt.merge_input_stats(stat_dict)
+        self.fitting.compute_input_stats(
+            merge_sys_stat(all_stat), protection=protection
+        )
+        return all_stat
+
     def _compute_output_stat(self, all_stat, mixed_type=False):
         if mixed_type:
             self.fitting.compute_output_stats(all_stat, mixed_type=mixed_type)
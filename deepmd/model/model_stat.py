@@ -1,10 +1,39 @@
 # SPDX-License-Identifier: LGPL-3.0-or-later
+import hashlib
+import json
+import logging
+import os
 from collections import (
     defaultdict,
 )
+from typing import (
+    Dict,
+    Optional,
+)
 
 import numpy as np
 
+from deepmd.utils.data_manifest import (
+    _fingerprint,
+    _split,
+)
+from deepmd.utils.path import (
+    DPOSPath,
+    DPPath,
+)
+
+log = logging.getLogger(__name__)
+
+# the items of the sets that the data statistics read
+STAT_DATA_KEYS = (
+    "coord",
+    "box",
+    "energy",
+    "fparam",
+    "aparam",
+    "real_atom_types",
+)
+
 
 def _make_all_stat_ref(data, nbatches):
     all_stat = defaultdict(list)
@@ -40,6 +69,33 @@ def make_stat_input(data, nbatches, merge_sys=True):
             all_stat[key][batch_idx][frame_idx]
     """
     all_stat = defaultdict(list)
+    for sys_stat in make_stat_input_iter(data, nbatches):
+        for dd in sys_stat:
+            if merge_sys:
+                for bb in sys_stat[dd]:
+                    all_stat[dd].append(bb)
+            else:
+                all_stat[dd].append(sys_stat[dd])
+    return all_stat
+
+
+def make_stat_input_iter(data, nbatches):
+    """Pack data for statistics system by system, so that only the data of
+    the systems being used are kept in the memory.
+
+    Parameters
+    ----------
+    data
+        The data
+    nbatches : int
+        The number of batches
+
+    Yields
+    ------
+    sys_stat:
+        A dictionary of list storing data of a system for stat, which can be
+        accessed by sys_stat[key][batch_idx][frame_idx]
+    """
     for ii in range(data.get_nsystems()):
         sys_stat = defaultdict(list)
         for jj in range(nbatches):
@@ -48,13 +104,7 @@ def make_stat_input(data, nbatches, merge_sys=True):
                 if dd == "natoms_vec":
                     stat_data[dd] = stat_data[dd].astype(np.int32)
                 sys_stat[dd].append(stat_data[dd])
-        for dd in sys_stat:
-            if merge_sys:
-                for bb in sys_stat[dd]:
-                    all_stat[dd].append(bb)
-            else:
-                all_stat[dd].append(sys_stat[dd])
-    return all_stat
+        yield sys_stat
 
 
 def merge_sys_stat(all_stat):
@@ -66,3 +116,104 @@ def merge_sys_stat(all_stat):
             for bb in all_stat[dd][ii]:
                 ret[dd].append(bb)
     return ret
+
+
+def _data_fingerprint(data) -> list:
+    """Fingerprint of the data: modification time and size of the files that
+    the statistics read in each system, the batch sizes and the modifier.
+    """
+    fingerprint = []
+    for sys_path, data_sys, batch_size in zip(
+        data.system_dirs, data.data_systems, data.batch_size
+    ):
+        file_path = _split(sys_path)[0]
+        if isinstance(DPPath(str(sys_path)), DPOSPath):
+            paths = [
+                os.path.join(file_path, ff)
+                for ff in ("type.raw", "type_map.raw", "nopbc")
+            ]
+            for set_path in data_sys.dirs:
+                paths.extend(
+                    os.path.join(os.path.abspath(str(set_path)), kk + ".npy")
+                    for kk in STAT_DATA_KEYS
+                )
+        else:
+            # HDF5 or packed data file
+            paths = [file_path]
+        fingerprint.append([_split(sys_path), _fingerprint(paths), int(batch_size)])
+    modifier = data.data_systems[0].modifier
+    if modifier is not None and hasattr(modifier, "get_hash"):
+        fingerprint.append(modifier.get_hash())
+    return fingerprint
+
+
+def get_stat_hash(data, params: dict) -> str:
+    """Get the hash of the data and the parameters that the statistics depend on.
+
+    Parameters
+    ----------
+    data
+        The data
+    params : dict
+        The parameters that the statistics depend on
+
+    Returns
+    -------
+    str
+        the hash
+    """
+    key = json.dumps(
+        {"params": params, "data": _data_fingerprint(data)}, sort_keys=True, default=str
+    )
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def load_stat(stat_dir: str, stat_hash: str) -> Optional[Dict[str, np.ndarray]]:
+    """Load the statistics saved by :func:`save_stat`.
+
+    Parameters
+    ----------
+    stat_dir : str
+        The directory of the saved statistics
+    stat_hash : str
+        The hash of the statistics given by :func:`get_stat_hash`
+
+    Returns
+    -------
+    dict or None
+        the statistics, or None if they have not been saved
+    """
+    path = os.path.join(stat_dir, stat_hash + ".npz")
+    if not os.path.isfile(path):
+        return None
+    try:
+        with np.load(path) as f:
+            return dict(f)
+    except (OSError, ValueError) as e:
+        log.warning(f"cannot read the statistics {path}: {e}")
+        return None
+
+
+def save_stat(stat_dir: str, stat_hash: str, stat: Dict[str, np.ndarray]):
+    """Save the statistics.
+
+    Parameters
+    ----------
+    stat_dir : str
+        The directory of the saved statistics
+    stat_hash : str
+        The hash of the statistics given by :func:`get_stat_hash`
+    stat : dict
+        The statistics
+    """
+    path = os.path.join(stat_dir, stat_hash + ".npz")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(stat_dir, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **stat)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        log.warning(f"cannot save the statistics {path}: {e}")
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
@@ -5,10 +5,21 @@ import logging
 import os
 import platform
 import shutil
+import threading
 import time
+from collections import (
+    deque,
+)
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)
 from typing import (
+    Any,
+    Callable,
     Dict,
     List,
+    Optional,
+    Tuple,
 )
 
 import google.protobuf.message
@@ -80,6 +91,27 @@ def _is_subdir(path, directory):
     return not relative.startswith(os.pardir + os.sep)
 
 
+def _link_checkpoint(ckpt_prefix: str, save_ckpt: str):
+    """Make symlinks from the checkpoint files with the step to those without
+    the step to break nothing.
+    """
+    # get all checkpoint files
+    original_files = glob.glob(ckpt_prefix + ".*")
+    for ori_ff in original_files:
+        new_ff = save_ckpt + ori_ff[len(ckpt_prefix) :]
+        try:
+            # remove old one
+            os.remove(new_ff)
+        except OSError:
+            pass
+        if platform.system() != "Windows":
+            # by default one does not have access to create symlink on Windows
+            os.symlink(os.path.relpath(ori_ff, os.path.dirname(new_ff)), new_ff)
+        else:
+            shutil.copyfile(ori_ff, new_ff)
+    log.info("saved checkpoint %s" % save_ckpt)
+
+
 class DPTrainer:
     def __init__(self, jdata, run_opt, is_compress=False):
         self.run_opt = run_opt
@@ -159,6 +191,8 @@ class DPTrainer:
         self.disp_freq = tr_data.get("disp_freq", 1000)
         self.save_freq = tr_data.get("save_freq", 1000)
         self.save_ckpt = tr_data.get("save_ckpt", "model.ckpt")
+        self.max_ckpt_keep = tr_data.get("max_ckpt_keep", 5)
+        self.save_async = tr_data.get("save_async", False)
         self.display_in_training = tr_data.get("disp_training", True)
         self.timing_in_training = tr_data.get("time_training", True)
         self.profiling = self.run_opt.is_chief and tr_data.get("profiling", False)
@@ -167,6 +201,9 @@ class DPTrainer:
         self.tensorboard = self.run_opt.is_chief and tr_data.get("tensorboard", False)
         self.tensorboard_log_dir = tr_data.get("tensorboard_log_dir", "log")
         self.tensorboard_freq = tr_data.get("tensorboard_freq", 1)
+        self.batch_prefetch_size = tr_data.get("batch_prefetch_size", 0)
+        self.batch_prefetch_backend = tr_data.get("batch_prefetch_backend", "thread")
+        self.gradient_accumulation_steps = tr_data.get("gradient_accumulation_steps", 1)
         self.mixed_prec = tr_data.get("mixed_precision", None)
         if self.mixed_prec is not None:
             if (
@@ -187,19 +224,34 @@ class DPTrainer:
 
             if tr_data.get("validation_data", None) is not None:
                 self.valid_numb_batch = tr_data["validation_data"].get("numb_btch", 1)
+                self.valid_fixed_batches = tr_data["validation_data"].get(
+                    "fixed_batches", False
+                )
             else:
                 self.valid_numb_batch = 1
+                self.valid_fixed_batches = False
         else:
             self.numb_fparam_dict = self.model.get_numb_fparam()
             self.valid_numb_batch_dict = {}
+            self.valid_fixed_batches_dict = {}
             data_dict = tr_data.get("data_dict", None)
             for systems in data_dict:
                 if data_dict[systems].get("validation_data", None) is not None:
                     self.valid_numb_batch_dict[systems] = data_dict[systems][
                         "validation_data"
                     ].get("numb_btch", 1)
+                    self.valid_fixed_batches_dict[systems] = data_dict[systems][
+                        "validation_data"
+                    ].get("fixed_batches", False)
                 else:
                     self.valid_numb_batch_dict[systems] = 1
+                    self.valid_fixed_batches_dict[systems] = False
+        self.valid_async = tr_data.get("valid_async", False)
+        self._valid_executor = None
+        self._valid_future = None
+        self._valid_snapshot = None
+        # the validation batches sampled once if fixed_batches is set
+        self._fixed_valid_batches = {}
 
         # if init the graph with the frozen model
         self.frz_model = None
@@ -360,6 +412,7 @@ class DPTrainer:
 
     def _build_network(self, data, suffix=""):
         self.place_holders = {}
+        self._feed_tables = {}
         if self.is_compress:
             for kk in ["coord", "box"]:
                 self.place_holders[kk] = tf.placeholder(
@@ -407,7 +460,10 @@ class DPTrainer:
                     )
                 else:
                     optimizer = tf.train.AdamOptimizer(self.learning_rate)
-                optimizer = self.run_opt._HVD.DistributedOptimizer(optimizer)
+                # with gradient accumulation, the accumulated gradients are
+                # allreduced once per training step in _build_accumulation
+                if self.gradient_accumulation_steps == 1:
+                    optimizer = self.run_opt._HVD.DistributedOptimizer(optimizer)
             else:
                 if self.scale_lr_coef_dict[fitting_key] > 1.0:
                     log.info(
@@ -422,7 +478,10 @@ class DPTrainer:
                     optimizer = tf.train.AdamOptimizer(
                         learning_rate=self.learning_rate_dict[fitting_key]
                     )
-                optimizer = self.run_opt._HVD.DistributedOptimizer(optimizer)
+                # with gradient accumulation, the accumulated gradients are
+                # allreduced once per training step in _build_accumulation
+                if self.gradient_accumulation_steps == 1:
+                    optimizer = self.run_opt._HVD.DistributedOptimizer(optimizer)
         else:
             if fitting_key is None:
                 optimizer = tf.train.AdamOptimizer(learning_rate=self.learning_rate)
@@ -453,39 +512,119 @@ class DPTrainer:
 
         if not self.multi_task_mode:
             optimizer = self._build_optimizer()
-            apply_op = optimizer.minimize(
-                loss=self.l2_l,
-                global_step=self.global_step,
-                var_list=trainable_variables,
-                name="train_step",
-            )
+            if self.gradient_accumulation_steps > 1:
+                apply_op, self.accum_op = self._build_accumulation(
+                    optimizer, self.l2_l, trainable_variables, name="train_step"
+                )
+            else:
+                apply_op = optimizer.minimize(
+                    loss=self.l2_l,
+                    global_step=self.global_step,
+                    var_list=trainable_variables,
+                    name="train_step",
+                )
             train_ops = [apply_op] + self._extra_train_ops
             self.train_op = tf.group(*train_ops)
         else:
             self.train_op = {}
+            self.accum_op = {}
             for fitting_key in self.fitting:
                 optimizer = self._build_optimizer(fitting_key=fitting_key)
-                apply_op = optimizer.minimize(
-                    loss=self.l2_l[fitting_key],
-                    global_step=self.global_step,
-                    var_list=trainable_variables,
-                    name=f"train_step_{fitting_key}",
-                )
+                if self.gradient_accumulation_steps > 1:
+                    apply_op, self.accum_op[fitting_key] = self._build_accumulation(
+                        optimizer,
+                        self.l2_l[fitting_key],
+                        trainable_variables,
+                        name=f"train_step_{fitting_key}",
+                    )
+                else:
+                    apply_op = optimizer.minimize(
+                        loss=self.l2_l[fitting_key],
+                        global_step=self.global_step,
+                        var_list=trainable_variables,
+                        name=f"train_step_{fitting_key}",
+                    )
                 train_ops = [apply_op] + self._extra_train_ops
                 self.train_op[fitting_key] = tf.group(*train_ops)
         log.info("built training")
 
+    def _build_accumulation(self, optimizer, loss, var_list, name):
+        """Build the OPs of gradient accumulation.
+
+        The gradients of `gradient_accumulation_steps - 1` micro-batches are
+        added to the accumulators by the accumulation OP. The apply OP adds the
+        gradients of the last micro-batch, applies the averaged gradients and
+        resets the accumulators. In parallel training, the averaged gradients
+        are allreduced once before they are applied, so the optimizer should
+        not be wrapped by the distributed optimizer of Horovod.
+
+        Parameters
+        ----------
+        optimizer : tf.train.Optimizer
+            The optimizer
+        loss : tf.Tensor
+            The loss of a micro-batch
+        var_list : list of tf.Variable
+            The variables to be trained
+        name : str
+            The name of the apply OP
+
+        Returns
+        -------
+        tf.Operation
+            The apply OP
+        tf.Operation
+            The accumulation OP
+        """
+        grads_and_vars = [
+            (tf.convert_to_tensor(gg), vv)
+            for gg, vv in optimizer.compute_gradients(loss, var_list=var_list)
+            if gg is not None
+        ]
+        with tf.variable_scope(name + "_accumulation"):
+            accums = [
+                tf.Variable(
+                    tf.zeros(vv.shape, dtype=vv.dtype.base_dtype),
+                    trainable=False,
+                    # not saved in checkpoints
+                    collections=[tf.GraphKeys.LOCAL_VARIABLES],
+                )
+                for _, vv in grads_and_vars
+            ]
+        accum_op = tf.group(
+            *[aa.assign_add(gg) for aa, (gg, _) in zip(accums, grads_and_vars)]
+        )
+        with tf.control_dependencies([accum_op]):
+            avg_grads_and_vars = [
+                (aa.read_value() / self.gradient_accumulation_steps, vv)
+                for aa, (_, vv) in zip(accums, grads_and_vars)
+            ]
+        if self.run_opt.is_distrib:
+            avg_grads_and_vars = [
+                (self.run_opt._HVD.allreduce(gg), vv) for gg, vv in avg_grads_and_vars
+            ]
+        apply_op = optimizer.apply_gradients(
+            avg_grads_and_vars, global_step=self.global_step, name=name
+        )
+        with tf.control_dependencies([apply_op]):
+            reset_op = tf.group(*[aa.assign(tf.zeros_like(aa)) for aa in accums])
+        return reset_op, tf.group(accum_op, *self._extra_train_ops)
+
     def _init_session(self):
         config = get_tf_session_config()
         device, idx = self.run_opt.my_device.split(":", 1)
         if device == "gpu":
             config.gpu_options.visible_device_list = idx
         self.sess = tf.Session(config=config)
+        self.sess_config = config
 
         # Initializes or restore global variables
         init_op = tf.global_variables_initializer()
+        self.async_saver = None
         if self.run_opt.is_chief:
-            self.saver = tf.train.Saver(save_relative_paths=True)
+            self.saver = tf.train.Saver(
+                save_relative_paths=True, max_to_keep=self.max_ckpt_keep
+            )
             if self.run_opt.init_mode == "init_from_scratch":
                 log.info("initialize model from scratch")
                 run_sess(self.sess, init_op)
@@ -519,6 +658,9 @@ class DPTrainer:
             run_sess(self.sess, init_op)
             self.saver = None
 
+        # the accumulators of gradients
+        run_sess(self.sess, tf.local_variables_initializer())
+
         # Ensure variable consistency among tasks when training starts
         if self.run_opt.is_distrib:
             bcast_op = self.run_opt._HVD.broadcast_global_variables(0)
@@ -528,7 +670,33 @@ class DPTrainer:
                 log.info("receive global variables from task#0")
             run_sess(self.sess, bcast_op)
 
+        if self.save_async and self.saver is not None:
+            try:
+                self.async_saver = AsyncCheckpointSaver(
+                    self.sess, self.saver, max_to_keep=self.max_ckpt_keep
+                )
+            except google.protobuf.message.DecodeError as e:
+                raise GraphTooLargeError(
+                    "The graph size exceeds 2 GB, the hard limitation of protobuf."
+                    " Then a DecodeError was raised by protobuf. You should "
+                    "reduce the size of your model."
+                ) from e
+
     def train(self, train_data=None, valid_data=None):
+        try:
+            self._train(train_data, valid_data)
+        finally:
+            # the thread of the asynchronous validation is stopped even if the
+            # training fails
+            if self._valid_executor is not None:
+                self._valid_executor.shutdown()
+                self._valid_executor = None
+            self._valid_future = None
+            if self._valid_snapshot is not None:
+                self._valid_snapshot.close()
+                self._valid_snapshot = None
+
+    def _train(self, train_data=None, valid_data=None):
         # if valid_data is None:  # no validation set specified.
         #     valid_data = train_data  # using training set as validation set.
 
@@ -613,20 +781,28 @@ class DPTrainer:
 
         # dataset loader op
         if not self.multi_task_mode:
-            datasetloader = DatasetLoader(train_data)
+            datasetloader = DatasetLoader(
+                train_data,
+                prefetch_size=self.batch_prefetch_size,
+                prefetch_backend=self.batch_prefetch_backend,
+            )
             data_op = datasetloader.build()
         else:
             datasetloader = {}
             data_op = {}
             for fitting_key in self.fitting:
-                datasetloader[fitting_key] = DatasetLoader(train_data[fitting_key])
+                datasetloader[fitting_key] = DatasetLoader(
+                    train_data[fitting_key],
+                    prefetch_size=self.batch_prefetch_size,
+                    prefetch_backend=self.batch_prefetch_backend,
+                )
                 data_op[fitting_key] = datasetloader[fitting_key].build()
 
         while cur_batch < stop_batch:
             # first round validation:
             if is_first_step:
                 if not self.multi_task_mode:
-                    train_batch = train_data.get_batch()
+                    train_batch = datasetloader.get_batch()
                     batch_train_op = self.train_op
                 else:
                     fitting_idx = dp_random.choice(
@@ -634,7 +810,7 @@ class DPTrainer:
                         p=np.array(self.fitting_prob),
                     )
                     fitting_key = self.fitting_key_list[fitting_idx]
-                    train_batch = train_data[fitting_key].get_batch()
+                    train_batch = datasetloader[fitting_key].get_batch()
                     batch_train_op = self.train_op[fitting_key]
             else:
                 train_batch = next_datasetloader.get_data_dict(next_train_batch_list)
@@ -657,13 +833,8 @@ class DPTrainer:
             if self.display_in_training and is_first_step:
                 if self.run_opt.is_chief:
                     if not self.multi_task_mode:
-                        valid_batches = (
-                            [
-                                valid_data.get_batch()
-                                for ii in range(self.valid_numb_batch)
-                            ]
-                            if valid_data is not None
-                            else None
+                        valid_batches = self.get_valid_batches(
+                            valid_data, self.valid_numb_batch, self.valid_fixed_batches
                         )
                         self.valid_on_the_fly(
                             fp, [train_batch], valid_batches, print_header=True
@@ -675,17 +846,13 @@ class DPTrainer:
                         for fitting_key_ii in train_data:
                             # enumerate fitting key as fitting_key_ii
                             train_batches[fitting_key_ii] = [
-                                train_data[fitting_key_ii].get_batch()
+                                datasetloader[fitting_key_ii].get_batch()
                             ]
-                            valid_batches[fitting_key_ii] = (
-                                [
-                                    valid_data[fitting_key_ii].get_batch()
-                                    for ii in range(
-                                        self.valid_numb_batch_dict[fitting_key_ii]
-                                    )
-                                ]
-                                if fitting_key_ii in valid_data
-                                else None
+                            valid_batches[fitting_key_ii] = self.get_valid_batches(
+                                valid_data.get(fitting_key_ii),
+                                self.valid_numb_batch_dict[fitting_key_ii],
+                                self.valid_fixed_batches_dict[fitting_key_ii],
+                                fitting_key=fitting_key_ii,
                             )
                         self.valid_on_the_fly(
                             fp,
@@ -699,6 +866,25 @@ class DPTrainer:
             if self.timing_in_training:
                 tic = time.time()
             train_feed_dict = self.get_feed_dict(train_batch, is_training=True)
+            if self.gradient_accumulation_steps > 1:
+                # accumulate the gradients of the micro-batches before the last one
+                # and load the next micro-batch by the data OP in the same run
+                if not self.multi_task_mode:
+                    batch_accum_op = self.accum_op
+                    cur_datasetloader = datasetloader
+                    cur_data_op = data_op
+                else:
+                    batch_accum_op = self.accum_op[fitting_key]
+                    cur_datasetloader = datasetloader[fitting_key]
+                    cur_data_op = data_op[fitting_key]
+                for _ in range(self.gradient_accumulation_steps - 1):
+                    _, micro_batch_list = run_sess(
+                        self.sess,
+                        [batch_accum_op, cur_data_op],
+                        feed_dict=train_feed_dict,
+                    )
+                    train_batch = cur_datasetloader.get_data_dict(micro_batch_list)
+                    train_feed_dict = self.get_feed_dict(train_batch, is_training=True)
             # use tensorboard to visualize the training of deepmd-kit
             # it will takes some extra execution time to generate the tensorboard data
             if self.tensorboard and (cur_batch % self.tensorboard_freq == 0):
@@ -722,7 +908,8 @@ class DPTrainer:
                 toc = time.time()
             if self.timing_in_training:
                 train_time += toc - tic
-            cur_batch = run_sess(self.sess, self.global_step)
+            # each training step increases the global step by one
+            cur_batch += 1
             self.cur_batch = cur_batch
 
             # on-the-fly validation
@@ -731,13 +918,8 @@ class DPTrainer:
                     tic = time.time()
                 if self.run_opt.is_chief:
                     if not self.multi_task_mode:
-                        valid_batches = (
-                            [
-                                valid_data.get_batch()
-                                for ii in range(self.valid_numb_batch)
-                            ]
-                            if valid_data is not None
-                            else None
+                        valid_batches = self.get_valid_batches(
+                            valid_data, self.valid_numb_batch, self.valid_fixed_batches
                         )
                         self.valid_on_the_fly(fp, [train_batch], valid_batches)
                     else:
@@ -745,17 +927,13 @@ class DPTrainer:
                         valid_batches = {}
                         for fitting_key_ii in train_data:
                             train_batches[fitting_key_ii] = [
-                                train_data[fitting_key_ii].get_batch()
+                                datasetloader[fitting_key_ii].get_batch()
                             ]
-                            valid_batches[fitting_key_ii] = (
-                                [
-                                    valid_data[fitting_key_ii].get_batch()
-                                    for ii in range(
-                                        self.valid_numb_batch_dict[fitting_key_ii]
-                                    )
-                                ]
-                                if fitting_key_ii in valid_data
-                                else None
+                            valid_batches[fitting_key_ii] = self.get_valid_batches(
+                                valid_data.get(fitting_key_ii),
+                                self.valid_numb_batch_dict[fitting_key_ii],
+                                self.valid_fixed_batches_dict[fitting_key_ii],
+                                fitting_key=fitting_key_ii,
                             )
                         self.valid_on_the_fly(
                             fp, train_batches, valid_batches, fitting_key=fitting_key
@@ -779,10 +957,18 @@ class DPTrainer:
                     and self.saver is not None
                 ):
                     self.save_checkpoint(cur_batch)
+        if not self.multi_task_mode:
+            datasetloader.close()
+        else:
+            for loader in datasetloader.values():
+                loader.close()
         if (
             self.save_freq == 0 or cur_batch == 0 or cur_batch % self.save_freq != 0
         ) and self.saver is not None:
             self.save_checkpoint(cur_batch)
+        if self.async_saver is not None:
+            self.async_saver.close()
+        self.wait_validation()
         if self.run_opt.is_chief:
             fp.close()
         if self.timing_in_training and stop_batch // self.disp_freq > 0:
@@ -808,10 +994,21 @@ class DPTrainer:
             tfv2.profiler.experimental.stop()
 
     def save_checkpoint(self, cur_batch: int):
+        save_path = os.path.join(os.getcwd(), self.save_ckpt)
+        if self.async_saver is not None:
+            # the checkpoint is linked when it has been written
+            self.async_saver.save(
+                save_path,
+                cur_batch,
+                callback=lambda ckpt_prefix: _link_checkpoint(
+                    ckpt_prefix, self.save_ckpt
+                ),
+            )
+            return
         try:
             ckpt_prefix = self.saver.save(
                 self.sess,
-                os.path.join(os.getcwd(), self.save_ckpt),
+                save_path,
                 global_step=cur_batch,
             )
         except google.protobuf.message.DecodeError as e:
@@ -820,36 +1017,28 @@ class DPTrainer:
                 " Then a DecodeError was raised by protobuf. You should "
                 "reduce the size of your model."
             ) from e
-        # make symlinks from prefix with step to that without step to break nothing
-        # get all checkpoint files
-        original_files = glob.glob(ckpt_prefix + ".*")
-        for ori_ff in original_files:
-            new_ff = self.save_ckpt + ori_ff[len(ckpt_prefix) :]
-            try:
-                # remove old one
-                os.remove(new_ff)
-            except OSError:
-                pass
-            if platform.system() != "Windows":
-                # by default one does not have access to create symlink on Windows
-                os.symlink(os.path.relpath(ori_ff, os.path.dirname(new_ff)), new_ff)
-            else:
-                shutil.copyfile(ori_ff, new_ff)
-        log.info("saved checkpoint %s" % self.save_ckpt)
+        _link_checkpoint(ckpt_prefix, self.save_ckpt)
+
+    def _get_feed_table(self, keys: Tuple[str, ...]) -> List[Tuple[str, Any, bool]]:
+        """Get the placeholder of each key of the batches and whether the data
+        of the key is flattened when fed.
+        """
+        table = self._feed_tables.get(keys)
+        if table is None:
+            table = []
+            for kk in keys:
+                if kk == "find_type" or kk == "real_natoms_vec":
+                    continue
+                flatten = "find_" not in kk and kk not in ("natoms_vec", "default_mesh")
+                table.append((kk, self.place_holders[kk], flatten))
+            self._feed_tables[keys] = table
+        return table
 
     def get_feed_dict(self, batch, is_training):
-        feed_dict = {}
-        for kk in batch.keys():
-            if kk == "find_type" or kk == "type" or kk == "real_natoms_vec":
-                continue
-            if "find_" in kk:
-                feed_dict[self.place_holders[kk]] = batch[kk]
-            else:
-                feed_dict[self.place_holders[kk]] = np.reshape(batch[kk], [-1])
-        for ii in ["type"]:
-            feed_dict[self.place_holders[ii]] = np.reshape(batch[ii], [-1])
-        for ii in ["natoms_vec", "default_mesh"]:
-            feed_dict[self.place_holders[ii]] = batch[ii]
+        feed_dict = {
+            place_holder: np.reshape(batch[kk], [-1]) if flatten else batch[kk]
+            for kk, place_holder, flatten in self._get_feed_table(tuple(batch))
+        }
         feed_dict[self.place_holders["is_training"]] = is_training
         return feed_dict
 
@@ -865,15 +1054,102 @@ class DPTrainer:
     #         fp.write(print_str)
     #         fp.close ()
 
+    def get_valid_batches(
+        self, valid_data, numb_batch, fixed_batches=False, fitting_key=None
+    ):
+        """Sample the batches of a validation, or reuse the batches sampled in the
+        first validation if `fixed_batches` is set.
+
+        Parameters
+        ----------
+        valid_data : DeepmdDataSystem or None
+            The validation data.
+        numb_batch : int
+            The number of batches.
+        fixed_batches : bool, default=False
+            Whether to reuse the batches sampled in the first validation.
+        fitting_key : str, optional
+            The fitting key of the validation data in multi-task mode.
+
+        Returns
+        -------
+        list or None
+            The batches, or None if there is no validation data.
+        """
+        if valid_data is None:
+            return None
+        if fixed_batches and fitting_key in self._fixed_valid_batches:
+            return self._fixed_valid_batches[fitting_key]
+        batches = [valid_data.get_batch() for ii in range(numb_batch)]
+        if fixed_batches:
+            self._fixed_valid_batches[fitting_key] = batches
+        return batches
+
     def valid_on_the_fly(
         self, fp, train_batches, valid_batches, print_header=False, fitting_key=None
     ):
-        train_results = self.get_evaluation_results(train_batches)
-        valid_results = self.get_evaluation_results(valid_batches)
+        if self.valid_async and not print_header:
+            # the training continues during the validation, which evaluates
+            # a snapshot of the variables at the current step
+            self.wait_validation()
+            if self._valid_executor is None:
+                self._valid_executor = ThreadPoolExecutor(max_workers=1)
+                self._valid_snapshot = VariableSnapshot(self.sess, self.sess_config)
+            self._valid_future = self._valid_executor.submit(
+                self._valid_on_the_fly,
+                fp,
+                train_batches,
+                valid_batches,
+                self.cur_batch,
+                print_header=print_header,
+                fitting_key=fitting_key,
+                variables=self._valid_snapshot.copy(),
+            )
+        else:
+            self._valid_on_the_fly(
+                fp,
+                train_batches,
+                valid_batches,
+                self.cur_batch,
+                print_header=print_header,
+                fitting_key=fitting_key,
+            )
+
+    def wait_validation(self):
+        """Wait until the last asynchronous validation has finished.
+
+        Raises
+        ------
+        RuntimeError
+            If the last validation failed.
+        """
+        if self._valid_future is not None:
+            future, self._valid_future = self._valid_future, None
+            try:
+                future.result()
+            except Exception as e:
+                raise RuntimeError("Failed to validate the model") from e
+
+    def _valid_on_the_fly(
+        self,
+        fp,
+        train_batches,
+        valid_batches,
+        cur_batch,
+        print_header=False,
+        fitting_key=None,
+        variables=None,
+    ):
+        if variables is None:
+            sess = self.sess
+        else:
+            self._valid_snapshot.load(variables)
+            sess = self._valid_snapshot
+        train_results = self.get_evaluation_results(train_batches, sess=sess)
+        valid_results = self.get_evaluation_results(valid_batches, sess=sess)
 
-        cur_batch = self.cur_batch
         if not self.multi_task_mode:
-            current_lr = run_sess(self.sess, self.learning_rate)
+            current_lr = run_sess(sess, self.learning_rate)
         else:
             assert (
                 fitting_key is not None
@@ -883,7 +1159,7 @@ class DPTrainer:
             current_lr_dict = {}
             for fitting_key_ii in train_batches:
                 current_lr_dict[fitting_key_ii] = run_sess(
-                    self.sess, self.learning_rate_dict[fitting_key_ii]
+                    sess, self.learning_rate_dict[fitting_key_ii]
                 )
         if print_header:
             self.print_header(fp, train_results, valid_results, self.multi_task_mode)
@@ -1004,10 +1280,12 @@ class DPTrainer:
         }
         return single_results
 
-    def get_evaluation_results(self, batch_list):
+    def get_evaluation_results(self, batch_list, sess=None):
+        if sess is None:
+            sess = self.sess
         if not self.multi_task_mode:
             avg_results = self.eval_single_list(
-                batch_list, self.loss, self.sess, self.get_feed_dict
+                batch_list, self.loss, sess, self.get_feed_dict
             )
         else:
             avg_results = {}
@@ -1015,7 +1293,7 @@ class DPTrainer:
                 avg_results[fitting_key] = self.eval_single_list(
                     batch_list[fitting_key],
                     self.loss_dict[fitting_key],
-                    self.sess,
+                    sess,
                     self.get_feed_dict,
                     prefix=f"{fitting_key}_",
                 )
@@ -1153,6 +1431,16 @@ class DatasetLoader:
     ----------
     train_data : DeepmdDataSystem
         The training data.
+    prefetch_size : int, default=0
+        The number of batches loaded in advance in the background. 0 loads each
+        batch in the same session run as the training step that precedes it.
+    prefetch_backend : str, default=thread
+        The backend of prefetching. "thread" loads the batches in a background
+        thread. "tf.data" prefetches the batches with a `tf.data.Dataset`, so
+        the batches are loaded by the threads of TensorFlow. In both cases the
+        batches are drawn with generators seeded by the global random
+        generator in the main thread, so the batches do not depend on the
+        thread scheduling.
 
     Examples
     --------
@@ -1163,12 +1451,73 @@ class DatasetLoader:
     >>> data_dict = loader.get_data_dict(data_list)
     """
 
-    def __init__(self, train_data: DeepmdDataSystem):
+    def __init__(
+        self,
+        train_data: DeepmdDataSystem,
+        prefetch_size: int = 0,
+        prefetch_backend: str = "thread",
+    ):
+        if prefetch_backend not in ("thread", "tf.data"):
+            raise ValueError(f"Unknown prefetch backend {prefetch_backend}")
         self.train_data = train_data
+        self.prefetch_size = prefetch_size
+        self.prefetch_backend = prefetch_backend
         # get the keys of the data
         batch_data = self.train_data.get_batch()
-        self.data_keys = batch_data.keys()
+        self.data_keys = list(batch_data.keys())
         self.data_types = [tf.as_dtype(x.dtype) for x in batch_data.values()]
+        # the data system is not thread-safe
+        self._lock = threading.Lock()
+        self._executor = None
+        self._futures = deque()
+
+    def _load_batch(
+        self, rng: Optional[np.random.RandomState] = None
+    ) -> Dict[str, np.ndarray]:
+        with self._lock:
+            if rng is None:
+                return self.train_data.get_batch()
+            with dp_random.use_generator(rng):
+                return self.train_data.get_batch()
+
+    def _get_rng(self) -> np.random.RandomState:
+        # the seed is drawn in the main thread so that the sequence of
+        # random numbers does not depend on the thread scheduling
+        return np.random.RandomState(int(dp_random.random() * (2**32 - 1)))
+
+    def get_batch(self) -> Dict[str, np.ndarray]:
+        """Get a batch of the training data, which has been prefetched if the
+        thread backend is used.
+
+        Returns
+        -------
+        Dict[str, np.ndarray]
+            The batch of the training data.
+        """
+        if self.prefetch_size <= 0 or self.prefetch_backend != "thread":
+            return self._load_batch()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="deepmd_batch_prefetch"
+            )
+        # the batch taken and prefetch_size batches in advance
+        while len(self._futures) <= self.prefetch_size:
+            self._futures.append(
+                self._executor.submit(self._load_batch, self._get_rng())
+            )
+        try:
+            return self._futures.popleft().result()
+        except Exception as e:
+            raise RuntimeError("Failed to load the training data") from e
+
+    def close(self):
+        """Stop prefetching batches."""
+        for future in self._futures:
+            future.cancel()
+        self._futures.clear()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
 
     def build(self) -> List[tf.Tensor]:
         """Build the OP that loads the training data.
@@ -1178,14 +1527,26 @@ class DatasetLoader:
         List[tf.Tensor]
             Tensor of the loaded data.
         """
-        train_data = self.train_data
 
         def get_train_batch() -> List[np.ndarray]:
-            batch_data = train_data.get_batch()
+            batch_data = self.get_batch()
             # convert dict to list of arryas
             batch_data = tuple([batch_data[kk] for kk in self.data_keys])
             return batch_data
 
+        if self.prefetch_size > 0 and self.prefetch_backend == "tf.data":
+            # the batches are drawn in order by the threads of TensorFlow
+            rng = self._get_rng()
+
+            def generate_train_batch():
+                while True:
+                    batch_data = self._load_batch(rng)
+                    yield tuple([batch_data[kk] for kk in self.data_keys])
+
+            dataset = tf.data.Dataset.from_generator(
+                generate_train_batch, output_types=tuple(self.data_types)
+            ).prefetch(self.prefetch_size)
+            return list(tf.data.make_one_shot_iterator(dataset).get_next())
         return tf.py_func(get_train_batch, [], self.data_types, name="train_data")
 
     def get_data_dict(self, batch_list: List[np.ndarray]) -> Dict[str, np.ndarray]:
@@ -1202,3 +1563,203 @@ class DatasetLoader:
             The dict of the loaded data.
         """
         return dict(zip(self.data_keys, batch_list))
+
+
+class VariableSnapshot:
+    """Evaluate the training graph with a snapshot of the variables.
+
+    The training graph is copied into a separate graph and session. The
+    variables are copied to the host memory on the training thread, and then
+    loaded into the copy, so that an evaluation in a background thread sees
+    the variables of a single step while the training continues. Tensors and
+    operations of the training graph are mapped to the copy by their names,
+    so this object can be used in place of the training session to run them.
+
+    Parameters
+    ----------
+    sess : tf.Session
+        The training session.
+    config : tf.ConfigProto, optional
+        The configuration of the session of the copy.
+    """
+
+    def __init__(self, sess: tf.Session, config: Optional[tf.ConfigProto] = None):
+        self.sess = sess
+        self.variables = sess.graph.get_collection(tf.GraphKeys.GLOBAL_VARIABLES)
+        meta_graph_def = tf.train.export_meta_graph(graph=sess.graph)
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            tf.train.import_meta_graph(meta_graph_def)
+            var_list = {vv.op.name: vv for vv in tf.global_variables()}
+            self.place_holders = []
+            assign_ops = []
+            for vv in self.variables:
+                place_holder = tf.placeholder(vv.dtype.base_dtype, vv.shape)
+                self.place_holders.append(place_holder)
+                assign_ops.append(tf.assign(var_list[vv.op.name], place_holder))
+            self.assign_op = tf.group(*assign_ops)
+        self.snapshot_sess = tf.Session(graph=self.graph, config=config)
+
+    def copy(self) -> List[np.ndarray]:
+        """Copy the variables of the training session to the host memory.
+
+        Returns
+        -------
+        list of np.ndarray
+            The values of the variables.
+        """
+        return run_sess(self.sess, self.variables)
+
+    def load(self, values: List[np.ndarray]):
+        """Load the copied variables into the copy of the graph.
+
+        Parameters
+        ----------
+        values : list of np.ndarray
+            The values of the variables returned by :meth:`copy`.
+        """
+        run_sess(
+            self.snapshot_sess,
+            self.assign_op,
+            feed_dict=dict(zip(self.place_holders, values)),
+        )
+
+    def run(self, fetches, feed_dict=None, **kwargs):
+        """Run the tensors or operations of the training graph in the copy.
+
+        Parameters
+        ----------
+        fetches
+            The tensors or operations of the training graph, as `tf.Session.run`.
+        feed_dict : dict, optional
+            The feed dict keyed by the tensors of the training graph.
+        **kwargs
+            Other arguments of `tf.Session.run`.
+
+        Returns
+        -------
+        Any
+            The result of `tf.Session.run` in the copy.
+        """
+        fetches = tf.nest.map_structure(
+            lambda tt: self.graph.as_graph_element(tt.name), fetches
+        )
+        if feed_dict is not None:
+            feed_dict = {
+                self.graph.as_graph_element(kk.name): vv for kk, vv in feed_dict.items()
+            }
+        return self.snapshot_sess.run(fetches, feed_dict=feed_dict, **kwargs)
+
+    def close(self):
+        """Release the session of the copy."""
+        self.snapshot_sess.close()
+
+
+class AsyncCheckpointSaver:
+    """Save checkpoints in a background thread.
+
+    The variables are copied to the host memory on the training thread, and
+    then written to the checkpoint by a saver of a separate graph in a
+    background thread, so that the training continues while the checkpoint
+    is written. A checkpoint waits until the previous one has been written,
+    so at most one copy of the variables is kept in the memory.
+
+    Parameters
+    ----------
+    sess : tf.Session
+        The training session.
+    saver : tf.train.Saver
+        The saver of the training graph, whose meta graph is written with
+        each checkpoint.
+    max_to_keep : int, default=5
+        The maximum number of recent checkpoints to keep. The older
+        checkpoints are deleted.
+    """
+
+    def __init__(self, sess: tf.Session, saver: tf.train.Saver, max_to_keep: int = 5):
+        self.sess = sess
+        self.variables = tf.global_variables()
+        # the meta graph is not changed during the training
+        self.meta_graph_def = saver.export_meta_graph().SerializeToString()
+        graph = tf.Graph()
+        with graph.as_default():
+            self.place_holders = []
+            var_list = {}
+            for vv in self.variables:
+                place_holder = tf.placeholder(vv.dtype.base_dtype, vv.shape)
+                self.place_holders.append(place_holder)
+                var_list[vv.op.name] = tf.Variable(place_holder, trainable=False)
+            self.assign_op = tf.variables_initializer(list(var_list.values()))
+            self.saver = tf.train.Saver(
+                var_list=var_list, save_relative_paths=True, max_to_keep=max_to_keep
+            )
+        self.write_sess = tf.Session(graph=graph)
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._future = None
+
+    def save(
+        self,
+        save_path: str,
+        global_step: int,
+        callback: Optional[Callable[[str], None]] = None,
+    ):
+        """Save a checkpoint in the background.
+
+        Parameters
+        ----------
+        save_path : str
+            The prefix of the checkpoint.
+        global_step : int
+            The step appended to the prefix.
+        callback : Callable[[str], None], optional
+            Called with the prefix of the checkpoint when it has been written.
+        """
+        self.wait()
+        values = run_sess(self.sess, self.variables)
+        self._future = self._executor.submit(
+            self._write, values, save_path, global_step, callback
+        )
+
+    def _write(
+        self,
+        values: List[np.ndarray],
+        save_path: str,
+        global_step: int,
+        callback: Optional[Callable[[str], None]],
+    ):
+        run_sess(
+            self.write_sess,
+            self.assign_op,
+            feed_dict=dict(zip(self.place_holders, values)),
+        )
+        ckpt_prefix = self.saver.save(
+            self.write_sess,
+            save_path,
+            global_step=global_step,
+            write_meta_graph=False,
+        )
+        with open(ckpt_prefix + ".meta", "wb") as f:
+            f.write(self.meta_graph_def)
+        if callback is not None:
+            callback(ckpt_prefix)
+
+    def wait(self):
+        """Wait until the last checkpoint has been written.
+
+        Raises
+        ------
+        RuntimeError
+            If the last checkpoint failed to be written.
+        """
+        if self._future is not None:
+            future, self._future = self._future, None
+            try:
+                future.result()
+            except Exception as e:
+                raise RuntimeError("Failed to save the checkpoint") from e
+
+    def close(self):
+        """Wait for the last checkpoint and release the resources."""
+        self.wait()
+        self._executor.shutdown()
+        self.write_sess.close()
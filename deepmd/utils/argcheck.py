@@ -702,6 +702,16 @@ def modifier_dipole_charge():
     doc_sys_charge_map = f"The charge of real atoms. The list length should be the same as the {make_link('type_map', 'model/type_map')}"
     doc_ewald_h = "The grid spacing of the FFT grid. Unit is A"
     doc_ewald_beta = f"The splitting parameter of Ewald sum. Unit is A^{-1}"
+    doc_cache_dir = (
+        "The directory to save the corrections of the training data computed by the modifier, "
+        "which are reused by later jobs with the same dipole model, parameters and data. "
+        "If not set, the corrections are kept in memory."
+    )
+    doc_cache_size = (
+        "The number of the latest used training sets whose corrections are kept in memory if `cache_dir` is not set. "
+        "The corrections of the other sets are computed again when they are reloaded. "
+        "If not set, the corrections of all training sets are kept, so each of them is computed only once."
+    )
 
     return [
         Argument("model_name", str, optional=False, doc=doc_model_name),
@@ -709,6 +719,10 @@ def modifier_dipole_charge():
         Argument("sys_charge_map", list, optional=False, doc=doc_sys_charge_map),
         Argument("ewald_beta", float, optional=True, default=0.4, doc=doc_ewald_beta),
         Argument("ewald_h", float, optional=True, default=1.0, doc=doc_ewald_h),
+        Argument("cache_dir", [str, None], optional=True, doc=doc_cache_dir),
+        Argument(
+            "cache_size", [int, None], optional=True, default=None, doc=doc_cache_size
+        ),
     ]
 
 
@@ -758,6 +772,7 @@ def model_args(exclude_hybrid=False):
     doc_data_stat_nbatch = "The model determines the normalization from the statistics of the data. This key specifies the number of `frames` in each `system` used for statistics."
     doc_data_stat_protect = "Protect parameter for atomic energy regression."
     doc_data_bias_nsample = "The number of training samples in a system to compute and change the energy bias."
+    doc_stat_cache_dir = "The directory to save the data statistics of the energy model, i.e. the average and standard deviation of the descriptor and the energy bias and the statistics of the frame and atomic parameters of the fitting. The statistics are saved in a file named by the hash of the data files read by the statistics, the batch sizes, the modifier, the floating-point precision and the parameters of the model that the statistics may depend on (all parameters of the descriptor, the fitting and the type embedding, `type_map`, `data_stat_nbatch`, `data_stat_protect` and `spin`), and are loaded instead of computed if the hash matches."
     doc_type_embedding = "The type embedding."
     doc_modifier = "The modifier of model output."
     doc_use_srtab = "The table for the short-range pairwise interaction added on top of DP. The table is a text data file with (N_t + 1) * N_t / 2 + 1 columes. The first colume is the distance between atoms. The second to the last columes are energies for pairs of certain types. For example we have two atom types, 0 and 1. The columes from 2nd to 4th are for 0-0, 0-1 and 1-1 correspondingly."
@@ -800,6 +815,7 @@ def model_args(exclude_hybrid=False):
                 default=10,
                 doc=doc_data_bias_nsample,
             ),
+            Argument("stat_cache_dir", str, optional=True, doc=doc_stat_cache_dir),
             Argument("use_srtab", str, optional=True, doc=doc_use_srtab),
             Argument("smin_alpha", float, optional=True, doc=doc_smin_alpha),
             Argument("sw_rmin", float, optional=True, doc=doc_sw_rmin),
@@ -1366,6 +1382,7 @@ def training_data_args():  # ! added by Ziyao: new specification style for data
 - int: all {link_sys} use the same batch size.\n\n\
 - string "auto": automatically determines the batch size so that the batch_size times the number of atoms in the system is no less than 32.\n\n\
 - string "auto:N": automatically determines the batch size so that the batch_size times the number of atoms in the system is no less than N.\n\n\
+- string "max:N": automatically determines the batch size so that the batch_size times the number of atoms in the system is no more than N, i.e. a batch of any system has nearly the same number of atoms. A system with more than N atoms uses the batch size 1.\n\n\
 - string "mixed:N": the batch data will be sampled from all systems and merged into a mixed system with the batch size N. Only support the se_atten descriptor.\n\n\
 If MPI is used, the value should be considered as the batch size per task.'
     doc_auto_prob_style = 'Determine the probability of systems automatically. The method is assigned by this key and can be\n\n\
@@ -1377,6 +1394,50 @@ If MPI is used, the value should be considered as the batch size per task.'
         "Should be of the same length as `systems`, "
         "specifying the probability of each system."
     )
+    doc_prefetch_size = (
+        "The number of upcoming sets of each system that are loaded and shuffled "
+        "by a background thread while the current set is consumed. "
+        "At most `prefetch_size + 1` sets of a system are held in memory. "
+        "0 disables prefetching."
+    )
+    doc_use_mmap = (
+        "Memory-map the `npy` files of the training sets instead of reading them into memory. "
+        "Only the frames in each batch are read from the disk, and the page cache is shared "
+        "among the processes on the same node. "
+        "Items stored in a precision different from the one used in training are converted when they are read. "
+        "For HDF5 systems, the datasets are not read until a batch is taken, and only the frames in the batch are read. "
+        "Not supported together with a data modifier."
+    )
+    doc_stream_block_size = (
+        "Stream the training frames instead of loading whole sets, so that a set larger than the memory can be used. "
+        "Blocks of `stream_block_size` consecutive frames are read from the memory-mapped sets (see `use_mmap`) in a random order, "
+        "and batches are drawn from a shuffle buffer of `stream_buffer_size` frames. "
+        "A batch may mix frames from different sets; a label is used only if it is found for all frames in the batch. "
+        "0 disables streaming. Not supported together with a data modifier."
+    )
+    doc_stream_buffer_size = "The number of frames in the shuffle buffer of streaming. A larger buffer gives better randomness of the batches."
+    doc_shard_systems = (
+        "In parallel training, divide the systems into disjoint shards of nearly equal total probability, "
+        "one for each worker. Each worker only samples (and loads) the systems in its shard, "
+        "with the probabilities renormalized. "
+        "The global sampling distribution is only approximately kept: a system is sampled over all workers with its probability "
+        "divided by the number of workers times the total probability of its shard. "
+        "A warning is given if the total probability of a shard differs from its expected value by more than 10%. "
+        "The number of systems should be no less than the number of workers."
+    )
+    doc_shm_dir = (
+        "A node-local directory, e.g. `/dev/shm`, to share the training sets among the processes "
+        "(e.g. the MPI tasks of parallel training) on the same node. "
+        "Each item of a set is read by one process, saved in this directory, and memory-mapped by all processes, "
+        "so the memory of a set is used once per node. Each process still samples its own batches. "
+        "The saved files are reused by later jobs until the data files are changed, and should be removed manually. "
+        "Not supported together with a data modifier."
+    )
+    doc_hdf5_options = "Options to open HDF5 files of data systems, which are also used by the validation data."
+    doc_rdcc_nbytes = "Size of the raw data chunk cache of each dataset in bytes. The HDF5 default (1 MiB) is used if not set."
+    doc_rdcc_nslots = "Number of slots in the hash table of the raw data chunk cache. Should be a prime number about 100 times the number of chunks that fit in the cache. The HDF5 default is used if not set."
+    doc_swmr = "Open HDF5 files in the single-writer multiple-reader mode, so that files being written by another process can be read."
+    doc_driver = "The HDF5 file driver, e.g. `sec2`, `stdio` or `core`. The HDF5 default is used if not set."
 
     args = [
         Argument("systems", [list, str], optional=False, default=".", doc=doc_systems),
@@ -1406,6 +1467,39 @@ If MPI is used, the value should be considered as the batch size per task.'
             doc=doc_sys_probs,
             alias=["sys_weights"],
         ),
+        Argument("prefetch_size", int, optional=True, default=0, doc=doc_prefetch_size),
+        Argument("use_mmap", bool, optional=True, default=False, doc=doc_use_mmap),
+        Argument("shm_dir", [str, None], optional=True, default=None, doc=doc_shm_dir),
+        Argument(
+            "stream_block_size",
+            int,
+            optional=True,
+            default=0,
+            doc=doc_stream_block_size,
+        ),
+        Argument(
+            "stream_buffer_size",
+            int,
+            optional=True,
+            default=1024,
+            doc=doc_stream_buffer_size,
+        ),
+        Argument(
+            "shard_systems", bool, optional=True, default=False, doc=doc_shard_systems
+        ),
+        Argument(
+            "hdf5_options",
+            dict,
+            [
+                Argument("rdcc_nbytes", int, optional=True, doc=doc_rdcc_nbytes),
+                Argument("rdcc_nslots", int, optional=True, doc=doc_rdcc_nslots),
+                Argument("swmr", bool, optional=True, default=False, doc=doc_swmr),
+                Argument("driver", str, optional=True, doc=doc_driver),
+            ],
+            optional=True,
+            default={},
+            doc=doc_hdf5_options,
+        ),
     ]
 
     doc_training_data = "Configurations of training data."
@@ -1431,7 +1525,8 @@ def validation_data_args():  # ! added by Ziyao: new specification style for dat
 - list: the length of which is the same as the {link_sys}. The batch size of each system is given by the elements of the list.\n\n\
 - int: all {link_sys} use the same batch size.\n\n\
 - string "auto": automatically determines the batch size so that the batch_size times the number of atoms in the system is no less than 32.\n\n\
-- string "auto:N": automatically determines the batch size so that the batch_size times the number of atoms in the system is no less than N.'
+- string "auto:N": automatically determines the batch size so that the batch_size times the number of atoms in the system is no less than N.\n\n\
+- string "max:N": automatically determines the batch size so that the batch_size times the number of atoms in the system is no more than N, i.e. a batch of any system has nearly the same number of atoms. A system with more than N atoms uses the batch size 1.'
     doc_auto_prob_style = 'Determine the probability of systems automatically. The method is assigned by this key and can be\n\n\
 - "prob_uniform"  : the probability all the systems are equal, namely 1.0/self.get_nsystems()\n\n\
 - "prob_sys_size" : the probability of a system is proportional to the number of batches in the system\n\n\
@@ -1441,7 +1536,30 @@ def validation_data_args():  # ! added by Ziyao: new specification style for dat
         "Should be of the same length as `systems`, "
         "specifying the probability of each system."
     )
+    doc_prefetch_size = (
+        "The number of upcoming sets of each system that are loaded and shuffled "
+        "by a background thread while the current set is consumed. "
+        "At most `prefetch_size + 1` sets of a system are held in memory. "
+        "0 disables prefetching."
+    )
+    doc_use_mmap = (
+        "Memory-map the `npy` files of the training sets instead of reading them into memory. "
+        "Only the frames in each batch are read from the disk, and the page cache is shared "
+        "among the processes on the same node. "
+        "Items stored in a precision different from the one used in training are converted when they are read. "
+        "For HDF5 systems, the datasets are not read until a batch is taken, and only the frames in the batch are read. "
+        "Not supported together with a data modifier."
+    )
+    doc_shm_dir = (
+        "A node-local directory, e.g. `/dev/shm`, to share the training sets among the processes "
+        "(e.g. the MPI tasks of parallel training) on the same node. "
+        "Each item of a set is read by one process, saved in this directory, and memory-mapped by all processes, "
+        "so the memory of a set is used once per node. Each process still samples its own batches. "
+        "The saved files are reused by later jobs until the data files are changed, and should be removed manually. "
+        "Not supported together with a data modifier."
+    )
     doc_numb_btch = "An integer that specifies the number of batches to be sampled for each validation period."
+    doc_fixed_batches = "Sample the validation batches once in the first validation and reuse them in every validation, so that the validation errors of different steps are computed on the same frames."
 
     args = [
         Argument("systems", [list, str], optional=False, default=".", doc=doc_systems),
@@ -1471,6 +1589,9 @@ def validation_data_args():  # ! added by Ziyao: new specification style for dat
             doc=doc_sys_probs,
             alias=["sys_weights"],
         ),
+        Argument("prefetch_size", int, optional=True, default=0, doc=doc_prefetch_size),
+        Argument("use_mmap", bool, optional=True, default=False, doc=doc_use_mmap),
+        Argument("shm_dir", [str, None], optional=True, default=None, doc=doc_shm_dir),
         Argument(
             "numb_btch",
             int,
@@ -1481,6 +1602,9 @@ def validation_data_args():  # ! added by Ziyao: new specification style for dat
                 "numb_batch",
             ],
         ),
+        Argument(
+            "fixed_batches", bool, optional=True, default=False, doc=doc_fixed_batches
+        ),
     ]
 
     doc_validation_data = (
@@ -1533,6 +1657,8 @@ def training_args():  # ! modified by Ziyao: data configuration isolated.
     doc_disp_freq = "The frequency of printing learning curve."
     doc_save_freq = "The frequency of saving check point."
     doc_save_ckpt = "The file name of saving check point."
+    doc_max_ckpt_keep = "The maximum number of checkpoints to keep. The oldest checkpoints will be removed once the number of checkpoints exceeds max_ckpt_keep."
+    doc_save_async = "Save the checkpoints in a background thread. The variables are copied to the host memory, and the training continues while they are written to the disk. A checkpoint waits until the previous one has been written."
     doc_disp_training = "Displaying verbose information during training."
     doc_time_training = "Timing durining training."
     doc_profiling = "Profiling during training."
@@ -1541,6 +1667,36 @@ def training_args():  # ! modified by Ziyao: data configuration isolated.
     doc_tensorboard = "Enable tensorboard"
     doc_tensorboard_log_dir = "The log directory of tensorboard outputs"
     doc_tensorboard_freq = "The frequency of writing tensorboard events."
+    doc_neighbor_stat_sample = (
+        "Determine `sel: auto` from a sample of the frames of each system instead of all frames: "
+        "the fraction of the frames if less than 1, otherwise the number of frames per system. "
+        "The frames are sampled from each set in proportion to its number of frames. "
+        "The distribution of the statistics over the sampled frames is printed, "
+        "and the ratio of `sel: auto:ratio` gives the margin for the frames not sampled."
+    )
+    doc_batch_prefetch_size = (
+        "The number of training batches loaded in advance in the background, "
+        "so that the training steps do not wait for the batches to be assembled, the sets to be reloaded or the data modifier. "
+        "0 loads each batch together with the training step that precedes it. "
+        "With prefetching, the batches are drawn with random seeds taken in the main thread, "
+        "so they are reproducible by `seed` but differ from the batches without prefetching."
+    )
+    doc_gradient_accumulation_steps = (
+        "The number of micro-batches whose gradients are accumulated before the averaged gradients are applied in one training step, "
+        "so that the effective batch size is `gradient_accumulation_steps` times `batch_size` while only one batch is kept in the memory. "
+        "The training steps, i.e. `numb_steps`, `disp_freq`, `save_freq` and the learning rate, are counted in optimizer updates. "
+        "It should be at least 1."
+    )
+    doc_valid_async = (
+        "Run the on-the-fly validation in a background thread, so that the training continues while the validation batches are evaluated. "
+        "A validation waits until the previous one has finished. "
+        "The variables are copied at the printed step and evaluated in a copy of the graph, which takes the memory of another copy of the model."
+    )
+    doc_batch_prefetch_backend = (
+        "The backend of prefetching training batches. "
+        '"thread": the batches are loaded by a background thread. '
+        '"tf.data": the batches are prefetched by a `tf.data.Dataset` in the threads of TensorFlow.'
+    )
     doc_data_dict = (
         "The dictionary of multi DataSystems in multi-task mode. "
         "Each data_dict[fitting_key], with user-defined name `fitting_key` in `model/fitting_net_dict`, "
@@ -1574,6 +1730,8 @@ def training_args():  # ! modified by Ziyao: data configuration isolated.
         Argument(
             "save_ckpt", str, optional=True, default="model.ckpt", doc=doc_save_ckpt
         ),
+        Argument("max_ckpt_keep", int, optional=True, default=5, doc=doc_max_ckpt_keep),
+        Argument("save_async", bool, optional=True, default=False, doc=doc_save_async),
         Argument(
             "disp_training", bool, optional=True, default=True, doc=doc_disp_training
         ),
@@ -1608,6 +1766,37 @@ def training_args():  # ! modified by Ziyao: data configuration isolated.
         Argument(
             "tensorboard_freq", int, optional=True, default=1, doc=doc_tensorboard_freq
         ),
+        Argument(
+            "neighbor_stat_sample",
+            [int, float, None],
+            optional=True,
+            default=None,
+            doc=doc_neighbor_stat_sample,
+        ),
+        Argument(
+            "batch_prefetch_size",
+            int,
+            optional=True,
+            default=0,
+            doc=doc_batch_prefetch_size,
+        ),
+        Argument(
+            "batch_prefetch_backend",
+            str,
+            optional=True,
+            default="thread",
+            doc=doc_batch_prefetch_backend,
+        ),
+        Argument(
+            "valid_async", bool, optional=True, default=False, doc=doc_valid_async
+        ),
+        Argument(
+            "gradient_accumulation_steps",
+            int,
+            optional=True,
+            default=1,
+            doc=doc_gradient_accumulation_steps,
+        ),
         Argument("data_dict", dict, optional=True, doc=doc_data_dict),
         Argument("fitting_weight", dict, optional=True, doc=doc_fitting_weight),
     ]
@@ -1880,6 +2069,11 @@ def normalize(data):
     base = Argument("base", dict, gen_args())
     data = base.normalize_value(data, trim_pattern="_*")
     base.check_value(data, strict=True)
+    if data["training"]["gradient_accumulation_steps"] < 1:
+        raise ValueError(
+            "training/gradient_accumulation_steps should be at least 1, but got %d"
+            % data["training"]["gradient_accumulation_steps"]
+        )
 
     return data
 
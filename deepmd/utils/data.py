@@ -1,12 +1,25 @@
 #!/usr/bin/env python3
 
 # SPDX-License-Identifier: LGPL-3.0-or-later
+import collections
+import hashlib
 import logging
+import os
+import posixpath
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)
+from functools import (
+    partial,
+)
 from typing import (
+    Dict,
     List,
     Optional,
+    Union,
 )
 
+import h5py
 import numpy as np
 
 from deepmd.env import (
@@ -14,9 +27,16 @@ from deepmd.env import (
     GLOBAL_NP_FLOAT_PRECISION,
 )
 from deepmd.utils import random as dp_random
+from deepmd.utils.data_manifest import (
+    get_data_manifest,
+)
 from deepmd.utils.path import (
+    DPPackPath,
     DPPath,
 )
+from deepmd.utils.shared_array import (
+    load_shared_array,
+)
 
 log = logging.getLogger(__name__)
 
@@ -42,6 +62,29 @@ class DeepmdData:
             Data modifier that has the method `modify_data`
     trn_all_set
             Use all sets as training dataset. Otherwise, if the number of sets is more than 1, the last set is left for test.
+    prefetch_size
+            Number of upcoming training sets that are loaded, casted and shuffled by a
+            background thread while the current set is consumed. At most
+            `prefetch_size + 1` sets are held in memory. 0 disables prefetching.
+    use_mmap
+            Memory-map the training sets instead of reading them into memory.
+            Only the frames picked by `get_batch` are read from the disk. For
+            HDF5 systems, the datasets are kept unread instead. Items stored
+            with a data type different from the requested one are converted
+            when they are read. Not supported together with `modifier`.
+    shm_dir
+            A node-local directory, e.g. `/dev/shm`, to share the training sets
+            among the processes on the same node. Each item of a set is read
+            once, saved in the directory, and memory-mapped by all processes.
+            Not supported together with `modifier`.
+    stream_block_size
+            Stream the training frames instead of loading whole sets, which
+            allows sets larger than the memory. Blocks of `stream_block_size`
+            consecutive frames are read from the memory-mapped sets in a random
+            order, and batches are drawn from a shuffle buffer. 0 disables
+            streaming. Not supported together with `modifier`.
+    stream_buffer_size
+            The number of frames in the shuffle buffer of streaming.
     """
 
     def __init__(
@@ -53,10 +96,29 @@ class DeepmdData:
         optional_type_map: bool = True,
         modifier=None,
         trn_all_set: bool = False,
+        prefetch_size: int = 0,
+        use_mmap: bool = False,
+        shm_dir: Optional[str] = None,
+        stream_block_size: int = 0,
+        stream_buffer_size: int = 1024,
     ):
         """Constructor."""
         root = DPPath(sys_path)
-        self.dirs = root.glob(set_prefix + ".*")
+        # metadata recorded in the packed data file or the data manifest
+        self.set_prefix = set_prefix
+        info = self._get_system_info(root, set_prefix)
+        # number of frames of each set
+        self._nframes = {}
+        if info is not None:
+            self.dirs = []
+            for set_name, set_info in info["sets"].items():
+                set_name = posixpath.basename(set_name)
+                if set_name.startswith(set_prefix + "."):
+                    set_path = root / set_name
+                    self.dirs.append(set_path)
+                    self._nframes[str(set_path)] = set_info["nframes"]
+        else:
+            self.dirs = root.glob(set_prefix + ".*")
         if not len(self.dirs):
             raise FileNotFoundError(f"No {set_prefix}.* is found in {sys_path}")
         self.dirs.sort()
@@ -65,21 +127,38 @@ class DeepmdData:
             "if one of the set is of mixed_type format, "
             "then all of the sets in this system should be of mixed_type format!"
         )
-        self.mixed_type = self._check_mode(self.dirs[0])
-        for set_item in self.dirs[1:]:
-            assert self._check_mode(set_item) == self.mixed_type, error_format_msg
+        if info is not None:
+            modes = [
+                "real_atom_types" in set_info["keys"]
+                for set_name, set_info in info["sets"].items()
+                if posixpath.basename(set_name).startswith(set_prefix + ".")
+            ]
+        else:
+            modes = [self._check_mode(set_item) for set_item in self.dirs]
+        self.mixed_type = modes[0]
+        for mode in modes[1:]:
+            assert mode == self.mixed_type, error_format_msg
         # load atom type
-        self.atom_type = self._load_type(root)
+        if info is not None:
+            self.atom_type = np.array(info["atom_types"], dtype=np.int32)
+        else:
+            self.atom_type = self._load_type(root)
         self.natoms = len(self.atom_type)
         # load atom type map
-        self.type_map = self._load_type_map(root)
+        if info is not None:
+            self.type_map = info["type_map"]
+        else:
+            self.type_map = self._load_type_map(root)
         assert (
             optional_type_map or self.type_map is not None
         ), f"System {sys_path} must have type_map.raw in this mode! "
         if self.type_map is not None:
             assert len(self.type_map) >= max(self.atom_type) + 1
         # check pbc
-        self.pbc = self._check_pbc(root)
+        if info is not None:
+            self.pbc = info["pbc"]
+        else:
+            self.pbc = self._check_pbc(root)
         # enforce type_map if necessary
         self.enforce_type_map = False
         if type_map is not None and self.type_map is not None and len(type_map):
@@ -124,6 +203,37 @@ class DeepmdData:
         self.shuffle_test = shuffle_test
         # set modifier
         self.modifier = modifier
+        # prefetch of training sets
+        self.prefetch_size = prefetch_size
+        self._prefetch_executor = None
+        self._prefetch_queue = collections.deque()
+        # memory-mapped training sets
+        if use_mmap and modifier is not None:
+            log.warning(
+                "use_mmap is not supported with a data modifier and will be ignored"
+            )
+            use_mmap = False
+        self.use_mmap = use_mmap
+        # sets shared by the processes on the same node
+        if shm_dir is not None and modifier is not None:
+            log.warning(
+                "shm_dir is not supported with a data modifier and will be ignored"
+            )
+            shm_dir = None
+        self.shm_dir = shm_dir
+        # streamed training frames
+        if stream_block_size > 0 and modifier is not None:
+            log.warning(
+                "streaming is not supported with a data modifier and will be ignored"
+            )
+            stream_block_size = 0
+        self.stream_block_size = stream_block_size
+        self.stream_buffer_size = stream_buffer_size
+        if self.stream_block_size > 0:
+            # the frames are read from the memory-mapped sets
+            self.use_mmap = True
+            self.shm_dir = None
+        self._reset_stream()
 
     def add(
         self,
@@ -136,6 +246,7 @@ class DeepmdData:
         repeat: int = 1,
         default: float = 0.0,
         dtype: Optional[np.dtype] = None,
+        load: bool = True,
     ):
         """Add a data item that to be loaded.
 
@@ -162,6 +273,9 @@ class DeepmdData:
             default value of data
         dtype : np.dtype, optional
             the dtype of data, overwrites `high_prec` if provided
+        load : bool, default=True
+            If False, the data file is never read and the default value is
+            used, as if the file does not exist
         """
         self.data_dict[key] = {
             "ndof": ndof,
@@ -173,6 +287,7 @@ class DeepmdData:
             "reduce": None,
             "default": default,
             "dtype": dtype,
+            "load": load,
         }
         return self
 
@@ -211,36 +326,16 @@ class DeepmdData:
     def check_batch_size(self, batch_size):
         """Check if the system can get a batch of data with `batch_size` frames."""
         for ii in self.train_dirs:
-            if self.data_dict["coord"]["high_prec"]:
-                tmpe = (
-                    (ii / "coord.npy").load_numpy().astype(GLOBAL_ENER_FLOAT_PRECISION)
-                )
-            else:
-                tmpe = (ii / "coord.npy").load_numpy().astype(GLOBAL_NP_FLOAT_PRECISION)
-            if tmpe.ndim == 1:
-                tmpe = tmpe.reshape([1, -1])
-            if tmpe.shape[0] < batch_size:
-                return ii, tmpe.shape[0]
+            nframes = self._get_nframes(ii)
+            if nframes < batch_size:
+                return ii, nframes
         return None
 
     def check_test_size(self, test_size):
         """Check if the system can get a test dataset with `test_size` frames."""
-        if self.data_dict["coord"]["high_prec"]:
-            tmpe = (
-                (self.test_dir / "coord.npy")
-                .load_numpy()
-                .astype(GLOBAL_ENER_FLOAT_PRECISION)
-            )
-        else:
-            tmpe = (
-                (self.test_dir / "coord.npy")
-                .load_numpy()
-                .astype(GLOBAL_NP_FLOAT_PRECISION)
-            )
-        if tmpe.ndim == 1:
-            tmpe = tmpe.reshape([1, -1])
-        if tmpe.shape[0] < test_size:
-            return self.test_dir, tmpe.shape[0]
+        nframes = self._get_nframes(self.test_dir)
+        if nframes < test_size:
+            return self.test_dir, nframes
         else:
             return None
 
@@ -252,20 +347,28 @@ class DeepmdData:
         batch_size
             size of the batch
         """
+        if self.stream_block_size > 0:
+            return self._get_batch_stream(batch_size)
         if hasattr(self, "batch_set"):
-            set_size = self.batch_set["coord"].shape[0]
+            set_size = self._get_batch_set_size()
         else:
             set_size = 0
         if self.iterator + batch_size > set_size:
-            self._load_batch_set(self.train_dirs[self.set_count % self.get_numb_set()])
+            set_name = self.train_dirs[self.set_count % self.get_numb_set()]
+            if self.prefetch_size > 0 and self.get_numb_set() > 1:
+                self._load_batch_set_prefetch()
+            else:
+                self._load_batch_set(set_name)
             self.set_count += 1
-            set_size = self.batch_set["coord"].shape[0]
-            if self.modifier is not None:
-                self.modifier.modify_data(self.batch_set, self)
+            set_size = self._get_batch_set_size()
+            if self.modifier is not None and not self._batch_set_modified:
+                # the corrections of each set are computed once and cached
+                self.modifier.modify_data(self.batch_set, self, cache_key=str(set_name))
+                self._batch_set_modified = True
         iterator_1 = self.iterator + batch_size
         if iterator_1 >= set_size:
             iterator_1 = set_size
-        idx = np.arange(self.iterator, iterator_1)
+        idx = self.batch_idx[self.iterator : iterator_1]
         self.iterator += batch_size
         ret = self._get_subdata(self.batch_set, idx)
         return ret
@@ -281,15 +384,17 @@ class DeepmdData:
         if not hasattr(self, "test_set"):
             self._load_test_set(self.test_dir, self.shuffle_test)
         if ntests == -1:
-            idx = None
+            idx = self.test_idx
         else:
-            ntests_ = (
-                ntests
-                if ntests < self.test_set["type"].shape[0]
-                else self.test_set["type"].shape[0]
-            )
-            # print('ntest', self.test_set['type'].shape[0], ntests, ntests_)
-            idx = np.arange(ntests_)
+            if self.test_idx is not None:
+                test_size = self.test_idx.size
+            else:
+                test_size = self.test_set["type"].shape[0]
+            ntests_ = ntests if ntests < test_size else test_size
+            if self.test_idx is not None:
+                idx = self.test_idx[:ntests_]
+            else:
+                idx = np.arange(ntests_)
         ret = self._get_subdata(self.test_set, idx=idx)
         if self.modifier is not None:
             self.modifier.modify_data(ret, self)
@@ -316,8 +421,7 @@ class DeepmdData:
 
     def get_numb_batch(self, batch_size: int, set_idx: int) -> int:
         """Get the number of batches in a set."""
-        data = self._load_set(self.train_dirs[set_idx])
-        ret = data["coord"].shape[0] // batch_size
+        ret = self._get_nframes(self.train_dirs[set_idx]) // batch_size
         if ret == 0:
             ret = 1
         return ret
@@ -395,6 +499,8 @@ class DeepmdData:
             dd = data[ii]
             if "find_" in ii:
                 new_data[ii] = dd
+            elif isinstance(dd, (np.memmap, h5py.Dataset)):
+                new_data[ii] = self._read_mmap_data(ii, dd, idx)
             else:
                 if idx is not None:
                     new_data[ii] = dd[idx]
@@ -402,52 +508,217 @@ class DeepmdData:
                     new_data[ii] = dd
         return new_data
 
+    def _read_mmap_data(
+        self, key: str, data: Union[np.memmap, h5py.Dataset], idx=None
+    ) -> np.ndarray:
+        """Read the frames `idx` of a memory-mapped item or an HDF5 dataset,
+        and reorder the atoms of an atomic item as done in `_load_data`.
+        """
+        if isinstance(data, h5py.Dataset):
+            if idx is not None:
+                # h5py only selects increasing indices without duplicates
+                uniq_idx, inv_idx = np.unique(idx, return_inverse=True)
+                data = data[uniq_idx][inv_idx]
+            else:
+                data = data[()]
+        elif idx is not None:
+            data = data[idx]
+        else:
+            data = np.array(data)
+        if key in self.data_dict:
+            data = data.astype(self._get_item_dtype(key), copy=False)
+            if self.data_dict[key]["atomic"]:
+                natoms, idx_map = self._get_natoms_idx_map(
+                    self.data_dict[key]["type_sel"]
+                )
+                nframes = data.shape[0]
+                data = data.reshape([nframes, natoms, -1])
+                data = data[:, idx_map, :].reshape([nframes, -1])
+        return data
+
+    def _get_item_dtype(self, key: str) -> np.dtype:
+        """Get the data type of an item as loaded by `_load_data`."""
+        if self.data_dict[key]["dtype"] is not None:
+            return self.data_dict[key]["dtype"]
+        elif self.data_dict[key]["high_prec"]:
+            return GLOBAL_ENER_FLOAT_PRECISION
+        else:
+            return GLOBAL_NP_FLOAT_PRECISION
+
+    def _get_batch_set_size(self) -> int:
+        return self.batch_idx.size
+
     def _load_batch_set(self, set_name: DPPath):
         if not hasattr(self, "batch_set") or self.get_numb_set() > 1:
-            self.batch_set = self._load_set(set_name)
-        self.batch_set, _ = self._shuffle_data(self.batch_set)
+            self.batch_set = self._load_set(set_name, lazy=self.use_mmap)
+            self._batch_set_modified = False
+        # the set is not copied; get_batch gathers the frames by the shuffled indexes
+        self.batch_idx = self._shuffle_idx(self.batch_set)
         self.reset_get_batch()
 
+    def _load_batch_set_prefetch(self):
+        """Swap in the training set `set_count` loaded by the prefetch thread,
+        and schedule the loading of the following `prefetch_size` sets.
+        """
+        if self._prefetch_executor is None:
+            self._prefetch_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="deepmd_data_prefetch"
+            )
+        if not len(self._prefetch_queue):
+            self._submit_prefetch(self.set_count)
+        self.batch_set, self.batch_idx = self._prefetch_queue.popleft().result()
+        self._batch_set_modified = False
+        self.reset_get_batch()
+        next_count = self.set_count + len(self._prefetch_queue) + 1
+        while len(self._prefetch_queue) < self.prefetch_size:
+            self._submit_prefetch(next_count)
+            next_count += 1
+
+    def _submit_prefetch(self, set_count: int):
+        # the seed is drawn in the main thread so that the sequence of
+        # random numbers does not depend on the thread scheduling
+        rng = np.random.RandomState(int(dp_random.random() * (2**32 - 1)))
+        set_name = self.train_dirs[set_count % self.get_numb_set()]
+        self._prefetch_queue.append(
+            self._prefetch_executor.submit(self._prefetch_set, set_name, rng)
+        )
+
+    def _prefetch_set(self, set_name: DPPath, rng: np.random.RandomState):
+        data = self._load_set(set_name, lazy=self.use_mmap)
+        return data, self._shuffle_idx(data, rng=rng)
+
     def reset_get_batch(self):
         self.iterator = 0
+        self._reset_stream()
+
+    def _reset_stream(self):
+        # memory-mapped training sets
+        self._stream_sets = {}
+        # blocks of the current epoch in the order of reading
+        self._stream_blocks = collections.deque()
+        # frames of the block being read, and the number of frames taken
+        self._stream_block = None
+        self._stream_cursor = 0
+        # shuffle buffer
+        self._stream_buffer = None
+
+    def _get_batch_stream(self, batch_size: int) -> dict:
+        """Get a batch from the shuffle buffer of the streamed frames.
+
+        The frames of the batch are drawn from random slots of the buffer,
+        and the slots are refilled with the following frames of the stream.
+        """
+        if self._stream_buffer is None:
+            self._stream_buffer = self._read_stream_frames(
+                max(self.stream_buffer_size, batch_size)
+            )
+        buffer_size = self._stream_buffer["type"].shape[0]
+        slots = dp_random.choice(buffer_size, size=batch_size, replace=False)
+        ret = {}
+        for kk, vv in self._stream_buffer.items():
+            if "find_" in kk:
+                # the item is found only if it is found for all frames
+                ret[kk] = np.float32(vv[slots].min())
+            else:
+                ret[kk] = vv[slots]
+        new_frames = self._read_stream_frames(batch_size)
+        for kk, vv in self._stream_buffer.items():
+            vv[slots] = new_frames[kk]
+        return ret
+
+    def _read_stream_frames(self, nframes: int) -> dict:
+        """Read the following `nframes` frames of the stream."""
+        frames = []
+        while nframes > 0:
+            if self._stream_block is None:
+                block_size = 0
+            else:
+                block_size = self._stream_block["type"].shape[0]
+            if self._stream_cursor >= block_size:
+                self._stream_block = self._read_stream_block()
+                self._stream_cursor = 0
+                continue
+            nn = min(nframes, block_size - self._stream_cursor)
+            frames.append(
+                {
+                    kk: vv[self._stream_cursor : self._stream_cursor + nn]
+                    for kk, vv in self._stream_block.items()
+                }
+            )
+            self._stream_cursor += nn
+            nframes -= nn
+        return {kk: np.concatenate([ff[kk] for ff in frames]) for kk in frames[0]}
+
+    def _read_stream_block(self) -> dict:
+        """Read the next block of the stream. The blocks of all training sets
+        are shuffled at the beginning of each epoch.
+        """
+        if not self._stream_blocks:
+            blocks = [
+                (ii, start)
+                for ii, set_name in enumerate(self.train_dirs)
+                for start in range(
+                    0, self._get_nframes(set_name), self.stream_block_size
+                )
+            ]
+            order = np.arange(len(blocks))
+            dp_random.shuffle(order)
+            self._stream_blocks.extend(blocks[ii] for ii in order)
+        set_idx, start = self._stream_blocks.popleft()
+        set_name = self.train_dirs[set_idx]
+        if set_idx not in self._stream_sets:
+            self._stream_sets[set_idx] = self._load_set(set_name, lazy=True)
+        end = min(start + self.stream_block_size, self._get_nframes(set_name))
+        block = self._get_subdata(self._stream_sets[set_idx], np.arange(start, end))
+        for kk in block:
+            if "find_" in kk:
+                # frames from different sets may be mixed in a batch
+                block[kk] = np.full(end - start, block[kk], dtype=np.float32)
+        return block
 
     def _load_test_set(self, set_name: DPPath, shuffle_test):
         self.test_set = self._load_set(set_name)
         if shuffle_test:
-            self.test_set, _ = self._shuffle_data(self.test_set)
+            self.test_idx = self._shuffle_idx(self.test_set)
+        else:
+            self.test_idx = None
 
-    def _shuffle_data(self, data):
-        ret = {}
-        nframes = data["coord"].shape[0]
-        idx = np.arange(nframes)
-        # the training times of each frame
-        idx = np.repeat(idx, np.reshape(data["numb_copy"], (nframes,)))
-        dp_random.shuffle(idx)
-        for kk in data:
-            if (
-                type(data[kk]) == np.ndarray
-                and len(data[kk].shape) == 2
-                and data[kk].shape[0] == nframes
-                and "find_" not in kk
-            ):
-                ret[kk] = data[kk][idx]
-            else:
-                ret[kk] = data[kk]
-        return ret, idx
+    def _shuffle_idx(self, data, rng=None) -> np.ndarray:
+        """Get the shuffled indexes of the frames in a set.
 
-    def _load_set(self, set_name: DPPath):
+        The frames are not copied. `numb_copy` is used as the integer
+        weight of each frame, i.e. the number of times the index of the
+        frame appears in the returned indexes.
+        """
+        if rng is None:
+            rng = dp_random
+        nframes = data["coord"].shape[0]
+        numb_copy = np.reshape(data["numb_copy"], (nframes,))
+        if np.all(numb_copy == 1):
+            idx = np.arange(nframes)
+        else:
+            # the training times of each frame
+            idx = np.repeat(np.arange(nframes), numb_copy)
+        rng.shuffle(idx)
+        return idx
+
+    def _get_nframes(self, set_name: DPPath) -> int:
+        """Get the number of frames in a set from the shape of the coordinates,
+        without loading them.
+        """
+        key = str(set_name)
+        if key not in self._nframes:
+            if not isinstance(set_name, DPPath):
+                set_name = DPPath(set_name)
+            shape = (set_name / "coord.npy").load_shape()
+            self._nframes[key] = 1 if len(shape) == 1 else shape[0]
+        return self._nframes[key]
+
+    def _load_set(self, set_name: DPPath, lazy: bool = False):
         # get nframes
         if not isinstance(set_name, DPPath):
             set_name = DPPath(set_name)
-        path = set_name / "coord.npy"
-        if self.data_dict["coord"]["high_prec"]:
-            coord = path.load_numpy().astype(GLOBAL_ENER_FLOAT_PRECISION)
-        else:
-            coord = path.load_numpy().astype(GLOBAL_NP_FLOAT_PRECISION)
-        if coord.ndim == 1:
-            coord = coord.reshape([1, -1])
-        nframes = coord.shape[0]
-        assert coord.shape[1] == self.data_dict["coord"]["ndof"] * self.natoms
+        nframes = self._get_nframes(set_name)
         # load keys
         data = {}
         for kk in self.data_dict.keys():
@@ -464,13 +735,15 @@ class DeepmdData:
                     repeat=self.data_dict[kk]["repeat"],
                     default=self.data_dict[kk]["default"],
                     dtype=self.data_dict[kk]["dtype"],
+                    load=self.data_dict[kk]["load"],
+                    lazy=lazy,
                 )
         for kk in self.data_dict.keys():
             if self.data_dict[kk]["reduce"] is not None:
                 k_in = self.data_dict[kk]["reduce"]
                 ndof = self.data_dict[kk]["ndof"]
                 data["find_" + kk] = data["find_" + k_in]
-                tmp_in = data[k_in].astype(GLOBAL_ENER_FLOAT_PRECISION)
+                tmp_in = np.asarray(data[k_in], dtype=GLOBAL_ENER_FLOAT_PRECISION)
                 data[kk] = np.sum(
                     np.reshape(tmp_in, [nframes, self.natoms, ndof]), axis=1
                 )
@@ -513,10 +786,57 @@ class DeepmdData:
                 axis=-1,
             )
         else:
-            data["type"] = np.tile(self.atom_type[self.idx_map], (nframes, 1))
+            # a read-only view, which takes no memory for each frame
+            data["type"] = np.broadcast_to(
+                self.atom_type[self.idx_map], (nframes, self.natoms)
+            )
 
         return data
 
+    def _load_frames(
+        self, set_name: DPPath, keys: List[str], idx: Optional[np.ndarray] = None
+    ) -> Dict[str, np.ndarray]:
+        """Load the frames `idx` of some items of a set.
+
+        Unlike `_load_set`, the files are memory-mapped regardless of `use_mmap`,
+        so that only the rows of the frames are read. An item without a file
+        takes its default value.
+        """
+        if not isinstance(set_name, DPPath):
+            set_name = DPPath(set_name)
+        nframes = self._get_nframes(set_name) if idx is None else len(idx)
+        data = {}
+        for kk in keys:
+            if kk == "type" and not self.mixed_type:
+                data[kk] = np.broadcast_to(
+                    self.atom_type[self.idx_map], (nframes, self.natoms)
+                )
+                continue
+            path = set_name / ("real_atom_types.npy" if kk == "type" else (kk + ".npy"))
+            if path.is_file():
+                dd = path.load_numpy(mmap_mode="r")
+                if len(dd.shape) == 1:
+                    # a set of a single frame
+                    dd = np.array(dd).reshape([1, -1])
+                data[kk] = self._read_mmap_data(kk, dd, idx)
+            elif self.data_dict[kk]["must"]:
+                raise RuntimeError("%s not found!" % path)
+            else:
+                ndof = self.data_dict[kk]["ndof"] * self.data_dict[kk]["repeat"]
+                if self.data_dict[kk]["atomic"]:
+                    ndof *= self._get_natoms_idx_map(self.data_dict[kk]["type_sel"])[0]
+                data[kk] = np.full(
+                    [nframes, ndof],
+                    self.data_dict[kk]["default"],
+                    dtype=self._get_item_dtype(kk),
+                )
+        if "type" in data and self.mixed_type:
+            real_type = data["type"].astype(np.int32).reshape([nframes, self.natoms])
+            if self.enforce_type_map:
+                real_type = self.type_idx_map[real_type].astype(np.int32)
+            data["type"] = real_type
+        return data
+
     def _load_data(
         self,
         set_name,
@@ -530,16 +850,11 @@ class DeepmdData:
         type_sel=None,
         default: float = 0.0,
         dtype: Optional[np.dtype] = None,
+        load: bool = True,
+        lazy: bool = False,
     ):
         if atomic:
-            natoms = self.natoms
-            idx_map = self.idx_map
-            # if type_sel, then revise natoms and idx_map
-            if type_sel is not None:
-                natoms = 0
-                for jj in type_sel:
-                    natoms += np.sum(self.atom_type == jj)
-                idx_map = self._idx_map_sel(self.atom_type, type_sel)
+            natoms, _ = self._get_natoms_idx_map(type_sel)
             ndof = ndof_ * natoms
         else:
             ndof = ndof_
@@ -550,29 +865,118 @@ class DeepmdData:
         else:
             dtype = GLOBAL_NP_FLOAT_PRECISION
         path = set_name / (key + ".npy")
-        if path.is_file():
-            data = path.load_numpy().astype(dtype)
-            try:  # YWolfeee: deal with data shape error
-                if atomic:
-                    data = data.reshape([nframes, natoms, -1])
-                    data = data[:, idx_map, :]
-                    data = data.reshape([nframes, -1])
-                data = np.reshape(data, [nframes, ndof])
-            except ValueError as err_message:
-                explanation = "This error may occur when your label mismatch it's name, i.e. you might store global tensor in `atomic_tensor.npy` or atomic tensor in `tensor.npy`."
-                log.error(str(err_message))
-                log.error(explanation)
-                raise ValueError(str(err_message) + ". " + explanation)
-            if repeat != 1:
-                data = np.repeat(data, repeat).reshape([nframes, -1])
+        if load and path.is_file():
+            read_args = (path, nframes, ndof, atomic, type_sel, repeat, dtype)
+            if self.shm_dir is not None:
+                # read once and shared by all processes on the node
+                data = load_shared_array(
+                    self.shm_dir,
+                    self._get_shared_name(*read_args),
+                    partial(self._read_data, *read_args),
+                )
+            else:
+                data = self._read_data(*read_args, lazy=lazy)
             return np.float32(1.0), data
-        elif must:
+        elif must and load:
             raise RuntimeError("%s not found!" % path)
-        else:
+        elif self.modifier is not None:
+            # the modifier may modify the data in place
             data = np.full([nframes, ndof], default, dtype=dtype)
             if repeat != 1:
                 data = np.repeat(data, repeat).reshape([nframes, -1])
             return np.float32(0.0), data
+        else:
+            # a read-only view of the default value, which takes no memory
+            data = np.broadcast_to(
+                np.array(default, dtype=dtype), [nframes, ndof * repeat]
+            )
+            return np.float32(0.0), data
+
+    def _read_data(
+        self,
+        path: DPPath,
+        nframes: int,
+        ndof: int,
+        atomic: bool,
+        type_sel: Optional[List[int]],
+        repeat: int,
+        dtype: np.dtype,
+        lazy: bool = False,
+    ):
+        """Read an item from a file, and reorder the atoms of an atomic item."""
+        if atomic:
+            natoms, idx_map = self._get_natoms_idx_map(type_sel)
+        if self.use_mmap:
+            data = path.load_numpy(mmap_mode="r")
+            # keep the data on the disk, which is converted to dtype when read
+            lazy = lazy and repeat == 1
+            if isinstance(data, h5py.Dataset):
+                # a dataset cannot be reshaped without being read
+                lazy = lazy and data.shape == (nframes, ndof)
+            if not lazy:
+                data = np.array(data, dtype=dtype)
+        else:
+            data = path.load_numpy().astype(dtype, copy=False)
+            lazy = False
+        try:  # YWolfeee: deal with data shape error
+            if atomic and not lazy:
+                data = data.reshape([nframes, natoms, -1])
+                data = data[:, idx_map, :]
+                data = data.reshape([nframes, -1])
+            if not isinstance(data, h5py.Dataset):
+                data = np.reshape(data, [nframes, ndof])
+        except ValueError as err_message:
+            explanation = "This error may occur when your label mismatch it's name, i.e. you might store global tensor in `atomic_tensor.npy` or atomic tensor in `tensor.npy`."
+            log.error(str(err_message))
+            log.error(explanation)
+            raise ValueError(str(err_message) + ". " + explanation)
+        if repeat != 1:
+            data = np.repeat(data, repeat).reshape([nframes, -1])
+        return data
+
+    def _get_shared_name(
+        self,
+        path: DPPath,
+        nframes: int,
+        ndof: int,
+        atomic: bool,
+        type_sel: Optional[List[int]],
+        repeat: int,
+        dtype: np.dtype,
+    ) -> str:
+        """Unique name of an item shared by the processes, which changes with
+        the file and the way it is read.
+        """
+        st = os.stat(str(path).split("#")[0])
+        h = hashlib.sha1()
+        h.update(
+            repr(
+                (
+                    os.path.abspath(str(path)),
+                    st.st_mtime_ns,
+                    st.st_size,
+                    nframes,
+                    ndof,
+                    repeat,
+                    np.dtype(dtype).str,
+                )
+            ).encode()
+        )
+        if atomic:
+            h.update(self._get_natoms_idx_map(type_sel)[1].tobytes())
+        return h.hexdigest()
+
+    def _get_natoms_idx_map(self, type_sel: Optional[List[int]] = None):
+        """Get the number of atoms and the index map of an atomic item."""
+        natoms = self.natoms
+        idx_map = self.idx_map
+        # if type_sel, then revise natoms and idx_map
+        if type_sel is not None:
+            natoms = 0
+            for jj in type_sel:
+                natoms += np.sum(self.atom_type == jj)
+            idx_map = self._idx_map_sel(self.atom_type, type_sel)
+        return natoms, idx_map
 
     def _load_type(self, sys_path: DPPath):
         atom_type = (sys_path / "type.raw").load_txt(dtype=np.int32, ndmin=1)
@@ -602,5 +1006,16 @@ class DeepmdData:
             pbc = False
         return pbc
 
+    def _get_system_info(self, sys_path: DPPath, set_prefix: str) -> Optional[dict]:
+        """Get the metadata of the system from the index of the packed data
+        file or the data manifest, if any.
+        """
+        if isinstance(sys_path, DPPackPath):
+            return sys_path.get_system_info()
+        manifest = get_data_manifest()
+        if manifest is not None:
+            return manifest.get_system(str(sys_path), set_prefix)
+        return None
+
     def _check_mode(self, set_path: DPPath):
         return (set_path / "real_atom_types.npy").is_file()
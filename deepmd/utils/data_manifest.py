@@ -0,0 +1,306 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+"""Persistent manifest of data systems.
+
+The manifest records the systems found under a directory (or in an HDF5 or
+packed data file) and the metadata of each system, i.e. the number of atoms,
+atom types, type map, periodicity and the number of frames and keys of each
+set, in the same form as the index of a packed data file (see
+:mod:`deepmd.utils.data_pack`). Each record is stored together with the
+modification time and size of the files and directories it is derived from,
+and is reused as long as they are not changed. Thus, a job that is restarted
+or repeated on the same data only stats these files instead of walking the
+directories and reading the data.
+
+The neighbor statistics of each system are also recorded in the manifest
+(see :class:`deepmd.utils.neighbor_stat.NeighborStat`), so that they are not
+computed again for the same data.
+
+The manifest is enabled by setting the environment variable
+`DP_DATA_MANIFEST` to the path of the manifest file.
+"""
+import atexit
+import json
+import logging
+import os
+import posixpath
+import threading
+from functools import (
+    lru_cache,
+)
+from typing import (
+    Dict,
+    List,
+    Optional,
+)
+
+import numpy as np
+
+from deepmd.utils.path import (
+    DPOSPath,
+    DPPath,
+)
+
+log = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 2
+
+
+def _split(path: str) -> List[str]:
+    """Split a DP path into the absolute file path and the path inside the file."""
+    s = str(path).split("#")
+    s[0] = os.path.abspath(s[0])
+    return s
+
+
+def _stat(path: str) -> Optional[List[int]]:
+    """Fingerprint of a file or directory: modification time and size."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _fingerprint(paths: List[str]) -> Dict[str, List[int]]:
+    return {pp: _stat(pp) for pp in paths}
+
+
+def _is_valid(fingerprint: Dict[str, List[int]]) -> bool:
+    return all(_stat(pp) == vv for pp, vv in fingerprint.items())
+
+
+def _system_info(sys_path: DPPath, set_prefix: str) -> Dict:
+    """Read the metadata of a system, without reading the data of its sets."""
+    atom_types = (sys_path / "type.raw").load_txt(dtype=np.int32, ndmin=1)
+    type_map = None
+    if (sys_path / "type_map.raw").is_file():
+        type_map = (sys_path / "type_map.raw").load_txt(dtype=str, ndmin=1).tolist()
+    sets = {}
+    for set_path in sorted(sys_path.glob(set_prefix + ".*")):
+        keys = [
+            posixpath.basename(str(pp).replace(os.sep, "/"))[: -len(".npy")]
+            for pp in set_path.glob("*.npy")
+        ]
+        shape = (set_path / "coord.npy").load_shape()
+        set_name = posixpath.basename(str(set_path).rstrip("/").replace(os.sep, "/"))
+        sets[set_name] = {
+            "nframes": 1 if len(shape) == 1 else int(shape[0]),
+            "keys": sorted(keys),
+        }
+    return {
+        "natoms": int(atom_types.size),
+        "atom_types": atom_types.tolist(),
+        "type_map": type_map,
+        "pbc": not (sys_path / "nopbc").is_file(),
+        "sets": sets,
+    }
+
+
+class DataManifest:
+    """Persistent manifest of data systems.
+
+    Parameters
+    ----------
+    path : str
+        path to the manifest file, which is created if it does not exist
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.roots = {}
+        self.systems = {}
+        if os.path.isfile(path):
+            try:
+                with open(path) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                log.warning(f"cannot read the data manifest {path}, rebuild it")
+            else:
+                if manifest.get("version") == MANIFEST_VERSION:
+                    self.roots = manifest["roots"]
+                    self.systems = manifest["systems"]
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def expand_sys_str(self, root_dir: str) -> List[str]:
+        """Recursively iterate over directories taking those that contain
+        `type.raw` file, using the record in the manifest if it is valid.
+
+        Parameters
+        ----------
+        root_dir : str
+            starting directory, or HDF5 or packed data file
+
+        Returns
+        -------
+        List[str]
+            list of string pointing to system directories, sorted by the paths
+            as done by :func:`deepmd.common.expand_sys_str`
+        """
+        root = DPPath(root_dir)
+        root_str = str(root)
+        key = "#".join(_split(root_str))
+        record = self.roots.get(key)
+        if record is None or not _is_valid(record["fingerprint"]):
+            record = self._walk(root)
+            with self._lock:
+                self.roots[key] = record
+                self._dirty = True
+        if isinstance(root, DPOSPath):
+            systems = [
+                os.path.normpath(os.path.join(root_str, ss)) for ss in record["systems"]
+            ]
+        else:
+            systems = [root_str + ss for ss in record["systems"]]
+        return sorted(systems)
+
+    def _walk(self, root: DPPath) -> Dict:
+        root_str = str(root)
+        if isinstance(root, DPOSPath):
+            # any change of systems changes the mtime of their parent directory
+            dirs = []
+            systems = []
+            for dirpath, dirnames, _ in os.walk(root_str):
+                dirs.append(dirpath)
+                for dd in dirnames:
+                    if os.path.isfile(os.path.join(dirpath, dd, "type.raw")):
+                        systems.append(os.path.join(dirpath, dd))
+            if os.path.isfile(os.path.join(root_str, "type.raw")):
+                systems.append(root_str)
+            systems = [os.path.relpath(ss, root_str) for ss in systems]
+            fingerprint = _fingerprint([os.path.abspath(dd) for dd in dirs])
+        else:
+            systems = [str(dd) for dd in root.rglob("*") if (dd / "type.raw").is_file()]
+            if (root / "type.raw").is_file():
+                systems.append(root_str)
+            systems = [ss[len(root_str) :] for ss in systems]
+            fingerprint = _fingerprint([_split(root_str)[0]])
+        return {"systems": systems, "fingerprint": fingerprint}
+
+    def get_system(self, sys_path: str, set_prefix: str = "set") -> Dict:
+        """Get the metadata of a system, using the record in the manifest if
+        it is valid.
+
+        Parameters
+        ----------
+        sys_path : str
+            path to the system
+        set_prefix : str, default=set
+            prefix of the set directories
+
+        Returns
+        -------
+        dict
+            natoms, atom_types, type_map, pbc and the number of frames and keys
+            of each set
+        """
+        key = "#".join(_split(sys_path))
+        record = self.systems.get(key)
+        if (
+            record is None
+            or record["set_prefix"] != set_prefix
+            or not _is_valid(record["fingerprint"])
+        ):
+            sys_path = DPPath(sys_path)
+            record = _system_info(sys_path, set_prefix)
+            record["set_prefix"] = set_prefix
+            if isinstance(sys_path, DPOSPath):
+                paths = [key, os.path.join(key, "type.raw")]
+                if record["type_map"] is not None:
+                    paths.append(os.path.join(key, "type_map.raw"))
+                for ss in record["sets"]:
+                    paths.append(os.path.join(key, ss))
+                    paths.append(os.path.join(key, ss, "coord.npy"))
+                    paths.append(os.path.join(key, ss, "box.npy"))
+            else:
+                paths = [_split(key)[0]]
+            record["fingerprint"] = _fingerprint(paths)
+            with self._lock:
+                self.systems[key] = record
+                self._dirty = True
+        return record
+
+    def get_neighbor_stat(
+        self, sys_path: str, set_prefix: str, key: str
+    ) -> Optional[list]:
+        """Get the neighbor statistics of a system recorded in the manifest.
+
+        Parameters
+        ----------
+        sys_path : str
+            path to the system
+        set_prefix : str
+            prefix of the set directories
+        key : str
+            the parameters of the statistics, e.g. the cutoff radius and type map
+
+        Returns
+        -------
+        list or None
+            the min distance and the max number of neighbors of each type, or
+            None if they are not recorded or the system has been changed
+        """
+        record = self.get_system(sys_path, set_prefix)
+        return record.get("neighbor_stat", {}).get(key)
+
+    def set_neighbor_stat(self, sys_path: str, set_prefix: str, key: str, stat: list):
+        """Record the neighbor statistics of a system in the manifest.
+
+        Parameters
+        ----------
+        sys_path : str
+            path to the system
+        set_prefix : str
+            prefix of the set directories
+        key : str
+            the parameters of the statistics, e.g. the cutoff radius and type map
+        stat : list
+            the min distance and the max number of neighbors of each type
+        """
+        record = self.get_system(sys_path, set_prefix)
+        with self._lock:
+            record.setdefault("neighbor_stat", {})[key] = stat
+            self._dirty = True
+
+    def save(self):
+        """Write the manifest file if it has been changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            manifest = json.dumps(
+                {
+                    "version": MANIFEST_VERSION,
+                    "roots": self.roots,
+                    "systems": self.systems,
+                }
+            )
+            self._dirty = False
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(manifest)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.warning(f"cannot write the data manifest {self.path}: {e}")
+
+
+@lru_cache(None)
+def _get_data_manifest(path: str) -> DataManifest:
+    manifest = DataManifest(path)
+    # records added by any command are kept
+    atexit.register(manifest.save)
+    return manifest
+
+
+def get_data_manifest() -> Optional[DataManifest]:
+    """Get the data manifest set by the environment variable `DP_DATA_MANIFEST`.
+
+    Returns
+    -------
+    DataManifest or None
+        the data manifest, or None if the environment variable is not set
+    """
+    path = os.environ.get("DP_DATA_MANIFEST")
+    if not path:
+        return None
+    return _get_data_manifest(os.path.abspath(path))
@@ -0,0 +1,171 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+"""Pack data systems into a single file.
+
+The packed data file is read by :class:`deepmd.utils.path.DPPackPath`.
+Its layout is
+
+- a head, see :data:`deepmd.utils.path.PACK_HEAD`, recording the magic bytes
+  and the offset and size of the index;
+- the arrays of all systems, each of which starts at an offset aligned to
+  `alignment` bytes;
+- the index in the JSON format.
+
+The index records the offset, data type and shape of each array, together with
+the number of atoms, atom types, type map, periodicity and the number of frames
+and keys of each set of each system. Thus the metadata of all systems are
+obtained by reading the index only.
+"""
+import json
+import logging
+import os
+from typing import (
+    BinaryIO,
+    Dict,
+    List,
+)
+
+import numpy as np
+
+from deepmd.common import (
+    expand_sys_str,
+)
+from deepmd.utils.path import (
+    PACK_HEAD,
+    PACK_MAGIC,
+    DPPath,
+)
+
+log = logging.getLogger(__name__)
+
+
+def _basename(path: DPPath) -> str:
+    return str(path).rstrip("/").replace(os.sep, "/").split("/")[-1]
+
+
+def _relative_name(path: str, root: str) -> str:
+    """Name of a system in the packed file, relative to the root."""
+    rel = path[len(root) :].replace(os.sep, "/").lstrip("#/")
+    return "/" + rel
+
+
+class _PackWriter:
+    """Write arrays at aligned offsets and record them in the index.
+
+    Parameters
+    ----------
+    f : BinaryIO
+        the output file
+    alignment : int
+        the alignment of arrays in bytes
+    """
+
+    def __init__(self, f: BinaryIO, alignment: int):
+        self.f = f
+        self.alignment = alignment
+        self.files = {}
+
+    def write(self, name: str, arr: np.ndarray):
+        arr = np.ascontiguousarray(arr)
+        if arr.dtype.hasobject:
+            raise ValueError(f"cannot pack the array {name} of object type")
+        offset = -(-self.f.tell() // self.alignment) * self.alignment
+        self.f.seek(offset)
+        self.f.write(arr.tobytes())
+        self.files[name] = {
+            "offset": offset,
+            "dtype": arr.dtype.str,
+            "shape": list(arr.shape),
+        }
+
+
+def _connect(name: str, key: str) -> str:
+    if name.endswith("/"):
+        return f"{name}{key}"
+    return f"{name}/{key}"
+
+
+def _pack_system(
+    writer: _PackWriter, sys_path: DPPath, name: str, set_prefix: str
+) -> Dict:
+    atom_types = (sys_path / "type.raw").load_txt(dtype=np.int32, ndmin=1)
+    writer.write(_connect(name, "type.raw"), atom_types)
+    type_map = None
+    if (sys_path / "type_map.raw").is_file():
+        type_map = (sys_path / "type_map.raw").load_txt(dtype=str, ndmin=1).tolist()
+        writer.write(_connect(name, "type_map.raw"), np.array(type_map, dtype=str))
+    pbc = True
+    if (sys_path / "nopbc").is_file():
+        pbc = False
+        writer.write(_connect(name, "nopbc"), np.zeros(0, dtype=np.int8))
+    sets = {}
+    for set_path in sorted(sys_path.glob(set_prefix + ".*")):
+        set_name = _connect(name, _basename(set_path))
+        keys = []
+        nframes = None
+        for npy_path in sorted(set_path.glob("*.npy")):
+            key = _basename(npy_path)
+            arr = npy_path.load_numpy()
+            writer.write(_connect(set_name, key), arr)
+            keys.append(key[: -len(".npy")])
+            if key == "coord.npy":
+                nframes = 1 if arr.ndim == 1 else arr.shape[0]
+        sets[set_name] = {"nframes": nframes, "keys": keys}
+    return {
+        "natoms": int(atom_types.size),
+        "atom_types": atom_types.tolist(),
+        "type_map": type_map,
+        "pbc": pbc,
+        "sets": sets,
+    }
+
+
+def pack_systems(
+    root_dir: str,
+    output: str,
+    set_prefix: str = "set",
+    alignment: int = 4096,
+) -> List[str]:
+    """Pack all data systems found in a directory into a single file.
+
+    Parameters
+    ----------
+    root_dir : str
+        the directory (or HDF5 file) that is recursively searched for systems
+    output : str
+        the packed data file
+    set_prefix : str, default=set
+        prefix of the set directories
+    alignment : int, default=4096
+        the alignment of arrays in bytes
+
+    Returns
+    -------
+    List[str]
+        paths of the packed systems, which can be used as the data systems
+    """
+    root = str(DPPath(root_dir))
+    all_sys = expand_sys_str(root_dir)
+    if not len(all_sys):
+        raise RuntimeError("Did not find valid system")
+    systems = {}
+    with open(output, "wb") as f:
+        f.write(PACK_HEAD.pack(PACK_MAGIC, 0, 0))
+        writer = _PackWriter(f, alignment)
+        for sys_str in sorted(all_sys):
+            name = _relative_name(sys_str, root)
+            log.info(f"pack system {sys_str} as {output}#{name}")
+            systems[name] = _pack_system(writer, DPPath(sys_str), name, set_prefix)
+        index = json.dumps(
+            {
+                "version": 1,
+                "alignment": alignment,
+                "files": writer.files,
+                "systems": systems,
+            }
+        ).encode()
+        f.seek(0, os.SEEK_END)
+        index_offset = f.tell()
+        f.write(index)
+        f.seek(0)
+        f.write(PACK_HEAD.pack(PACK_MAGIC, index_offset, len(index)))
+    return [f"{output}#{name}" for name in systems]
@@ -2,8 +2,12 @@
 import collections
 import logging
 import warnings
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)
 from functools import (
     lru_cache,
+    partial,
 )
 from typing import (
     List,
@@ -22,6 +26,9 @@ from deepmd.utils import random as dp_random
 from deepmd.utils.data import (
     DeepmdData,
 )
+from deepmd.utils.data_manifest import (
+    get_data_manifest,
+)
 
 log = logging.getLogger(__name__)
 
@@ -46,6 +53,11 @@ class DeepmdDataSystem:
         trn_all_set=False,
         sys_probs=None,
         auto_prob_style="prob_sys_size",
+        prefetch_size: int = 0,
+        use_mmap: bool = False,
+        shm_dir: Optional[str] = None,
+        stream_block_size: int = 0,
+        stream_buffer_size: int = 1024,
     ):
         """Constructor.
 
@@ -85,24 +97,45 @@ class DeepmdDataSystem:
                                 where `stt_idx` is the starting index of the system, `end_idx` is then ending (not including) index of the system,
                                 the probabilities of the systems in this block sums up to `weight`, and the relatively probabilities within this block is proportional
         to the number of batches in the system.
+        prefetch_size : int
+            Number of upcoming training sets of each system loaded in a background thread.
+            0 disables prefetching.
+        use_mmap : bool
+            Memory-map the training sets instead of reading them into memory.
+            HDF5 datasets are read partially by the frames in use.
+        shm_dir : str, optional
+            A node-local directory to share the training sets among the
+            processes on the same node.
+        stream_block_size : int
+            Stream the training frames in blocks of this size instead of
+            loading whole sets. 0 disables streaming.
+        stream_buffer_size : int
+            The number of frames in the shuffle buffer of streaming.
         """
         # init data
         self.rcut = rcut
         self.system_dirs = systems
         self.nsystems = len(self.system_dirs)
-        self.data_systems = []
-        for ii in self.system_dirs:
-            self.data_systems.append(
-                DeepmdData(
-                    ii,
-                    set_prefix=set_prefix,
-                    shuffle_test=shuffle_test,
-                    type_map=type_map,
-                    optional_type_map=optional_type_map,
-                    modifier=modifier,
-                    trn_all_set=trn_all_set,
-                )
-            )
+        # systems are initialized in threads, as it is bound by the metadata I/O
+        make_data = partial(
+            DeepmdData,
+            set_prefix=set_prefix,
+            shuffle_test=shuffle_test,
+            type_map=type_map,
+            optional_type_map=optional_type_map,
+            modifier=modifier,
+            trn_all_set=trn_all_set,
+            prefetch_size=prefetch_size,
+            use_mmap=use_mmap,
+            shm_dir=shm_dir,
+            stream_block_size=stream_block_size,
+            stream_buffer_size=stream_buffer_size,
+        )
+        with ThreadPoolExecutor() as executor:
+            self.data_systems = list(executor.map(make_data, self.system_dirs))
+        manifest = get_data_manifest()
+        if manifest is not None:
+            manifest.save()
         # check mix_type format
         error_format_msg = (
             "if one of the system is of mixed_type format, "
@@ -130,6 +163,15 @@ class DeepmdDataSystem:
                 if len(words) == 2:
                     rule = int(words[1])
                 self.batch_size = self._make_auto_bs(rule)
+            elif "max" == words[0]:
+                is_auto_bs = True
+                if len(words) == 2:
+                    rule = int(words[1])
+                else:
+                    raise RuntimeError(
+                        "atom budget must be specified for max batch size"
+                    )
+                self.batch_size = self._make_max_bs(rule)
             elif "mixed" == words[0]:
                 self.mixed_type = True
                 self.mixed_systems = True
@@ -154,18 +196,20 @@ class DeepmdDataSystem:
         self.sys_ntypes = max(ntypes)
         self.natoms = []
         self.natoms_vec = []
-        self.nbatches = []
         type_map_list = []
         for ii in range(self.nsystems):
             self.natoms.append(self.data_systems[ii].get_natoms())
             self.natoms_vec.append(
                 self.data_systems[ii].get_natoms_vec(self.sys_ntypes).astype(int)
             )
-            self.nbatches.append(
-                self.data_systems[ii].get_sys_numb_batch(self.batch_size[ii])
-            )
             type_map_list.append(self.data_systems[ii].get_type_map())
         self.type_map = self._check_type_map_consistency(type_map_list)
+        with ThreadPoolExecutor() as executor:
+            self.nbatches = list(
+                executor.map(
+                    DeepmdData.get_sys_numb_batch, self.data_systems, self.batch_size
+                )
+            )
 
         # ! altered by Marián Rynik
         # test size
@@ -275,6 +319,7 @@ class DeepmdDataSystem:
                 type_sel=adict[kk]["type_sel"],
                 repeat=adict[kk]["repeat"],
                 default=adict[kk]["default"],
+                load=adict[kk].get("load", True),
             )
 
     def add(
@@ -287,6 +332,7 @@ class DeepmdDataSystem:
         type_sel: Optional[List[int]] = None,
         repeat: int = 1,
         default: float = 0.0,
+        load: bool = True,
     ):
         """Add a data item that to be loaded.
 
@@ -311,6 +357,8 @@ class DeepmdDataSystem:
             The data will be repeated `repeat` times.
         default, default=0.
             Default value of data
+        load, default=True
+            If False, the data file is never read and the default value is used
         """
         for ii in self.data_systems:
             ii.add(
@@ -322,6 +370,7 @@ class DeepmdDataSystem:
                 repeat=repeat,
                 type_sel=type_sel,
                 default=default,
+                load=load,
             )
 
     def reduce(self, key_out, key_in):
@@ -355,6 +404,65 @@ class DeepmdDataSystem:
             probs = self._process_sys_probs(sys_probs)
         self.sys_probs = probs
 
+    def set_shard(self, rank: int, size: int, max_shard_imbalance: float = 0.1):
+        """Sample only from the systems owned by a worker of data-parallel
+        training.
+
+        The systems are divided into `size` disjoint shards of nearly equal
+        total probability, and the probabilities of the systems in the shard
+        of `rank` are renormalized. Each worker only loads the data of its own
+        systems. As each worker samples a batch per step, a system `i` owned
+        by the shard `k` is sampled over all workers with the probability
+        `p_i / (size * P_k)`, where `P_k` is the total probability of the
+        shard. The global sampling distribution is thus only approximately
+        kept, and a warning is given if the total probability of any shard
+        differs from `1 / size` by more than `max_shard_imbalance` relatively.
+
+        Parameters
+        ----------
+        rank : int
+            the rank of the worker
+        size : int
+            the number of workers
+        max_shard_imbalance : float, default=0.1
+            the relative difference between the total probability of a shard
+            and `1 / size` above which a warning is given
+        """
+        if size > self.nsystems:
+            raise RuntimeError(
+                "cannot shard %d system(s) among %d workers" % (self.nsystems, size)
+            )
+        probs = np.array(self.sys_probs, dtype=float)
+        # greedily assign the system with the largest probability to the
+        # shard with the least total probability
+        owner = np.empty(self.nsystems, dtype=int)
+        shard_probs = np.zeros(size)
+        for ii in np.argsort(-probs, kind="stable"):
+            owner[ii] = np.argmin(shard_probs)
+            shard_probs[owner[ii]] += probs[ii]
+        if not np.all(shard_probs > 0):
+            raise RuntimeError("some workers own no system with positive probability")
+        log.info(
+            "rank %d samples %d of %d system(s); the total probability of a shard ranges from %.3f to %.3f (%.3f expected)"
+            % (
+                rank,
+                np.count_nonzero(owner == rank),
+                self.nsystems,
+                shard_probs.min(),
+                shard_probs.max(),
+                1.0 / size,
+            )
+        )
+        imbalance = np.max(np.abs(shard_probs * size - 1.0))
+        if imbalance > max_shard_imbalance:
+            log.warning(
+                "the total probability of a shard differs from %.3f by up to %.0f%%, "
+                "so the systems are not sampled with their probabilities over all workers; "
+                "consider more systems or disabling shard_systems"
+                % (1.0 / size, imbalance * 100)
+            )
+        self.sys_probs = np.where(owner == rank, probs / shard_probs[rank], 0.0)
+
     def _get_sys_probs(self, sys_probs, auto_prob_style):  # depreciated
         if sys_probs is None:
             if auto_prob_style == "prob_uniform":
@@ -434,13 +542,21 @@ class DeepmdDataSystem:
         """
         # mixed systems have a global batch size
         batch_size = self.batch_size[0]
+        # draw the systems of all frames at once, and take the frames of
+        # each system in one batch
+        sys_idx = dp_random.choice(
+            np.arange(self.nsystems), p=self.sys_probs, size=batch_size
+        )
+        self.pick_idx = sys_idx[-1]
         batch_data = []
-        for _ in range(batch_size):
-            self.pick_idx = dp_random.choice(np.arange(self.nsystems), p=self.sys_probs)
-            bb_data = self.data_systems[self.pick_idx].get_batch(1)
-            bb_data["natoms_vec"] = self.natoms_vec[self.pick_idx]
-            bb_data["default_mesh"] = self.default_mesh[self.pick_idx]
-            batch_data.append(bb_data)
+        for ii, nframes in zip(*np.unique(sys_idx, return_counts=True)):
+            while nframes > 0:
+                # a set may have fewer frames than requested
+                bb_data = self.data_systems[ii].get_batch(nframes)
+                bb_data["natoms_vec"] = self.natoms_vec[ii]
+                bb_data["default_mesh"] = self.default_mesh[ii]
+                batch_data.append(bb_data)
+                nframes -= bb_data["type"].shape[0]
         b_data = self._merge_batch_data(batch_data)
         return b_data
 
@@ -450,7 +566,8 @@ class DeepmdDataSystem:
         Parameters
         ----------
         batch_data : list of dict
-            A list of batch data from different systems.
+            A list of batch data from different systems. Each may have
+            more than one frame.
 
         Returns
         -------
@@ -459,20 +576,28 @@ class DeepmdDataSystem:
         """
         b_data = {}
         max_natoms = max(bb["natoms_vec"][0] for bb in batch_data)
+        nframes = np.array([bb["type"].shape[0] for bb in batch_data])
+        # start and end of the frames of each batch data
+        end = np.cumsum(nframes)
+        start = end - nframes
         # natoms_vec
         natoms_vec = np.zeros(2 + self.get_ntypes(), dtype=int)
         natoms_vec[0:3] = max_natoms
         b_data["natoms_vec"] = natoms_vec
         # real_natoms_vec
-        real_natoms_vec = np.vstack([bb["natoms_vec"] for bb in batch_data])
+        real_natoms_vec = np.repeat(
+            np.vstack([bb["natoms_vec"] for bb in batch_data]), nframes, axis=0
+        )
         b_data["real_natoms_vec"] = real_natoms_vec
         # type
-        type_vec = np.full((len(batch_data), max_natoms), -1, dtype=int)
+        type_vec = np.full((end[-1], max_natoms), -1, dtype=int)
         for ii, bb in enumerate(batch_data):
-            type_vec[ii, : bb["type"].shape[1]] = bb["type"][0]
+            type_vec[start[ii] : end[ii], : bb["type"].shape[1]] = bb["type"]
         b_data["type"] = type_vec
         # default_mesh
-        default_mesh = np.mean([bb["default_mesh"] for bb in batch_data], axis=0)
+        default_mesh = np.average(
+            [bb["default_mesh"] for bb in batch_data], axis=0, weights=nframes
+        )
         b_data["default_mesh"] = default_mesh
         # other data
         data_dict = self.get_data_dict(0)
@@ -484,11 +609,11 @@ class DeepmdDataSystem:
                 b_data[kk] = np.concatenate([bb[kk] for bb in batch_data], axis=0)
             else:
                 b_data[kk] = np.zeros(
-                    (len(batch_data), max_natoms * vv["ndof"] * vv["repeat"]),
+                    (end[-1], max_natoms * vv["ndof"] * vv["repeat"]),
                     dtype=batch_data[0][kk].dtype,
                 )
                 for ii, bb in enumerate(batch_data):
-                    b_data[kk][ii, : bb[kk].shape[1]] = bb[kk][0]
+                    b_data[kk][start[ii] : end[ii], : bb[kk].shape[1]] = bb[kk]
         return b_data
 
     # ! altered by Marián Rynik
@@ -596,6 +721,20 @@ class DeepmdDataSystem:
             bs.append(bsi)
         return bs
 
+    def _make_max_bs(self, rule):
+        bs = []
+        for ii, data_sys in enumerate(self.data_systems):
+            ni = data_sys.get_natoms()
+            bsi = rule // ni
+            if bsi == 0:
+                log.warning(
+                    "system %s has %d atoms, more than the atom budget %d of a batch"
+                    % (self.system_dirs[ii], ni, rule)
+                )
+                bsi = 1
+            bs.append(bsi)
+        return bs
+
     # ! added by Marián Rynik
     def _make_auto_ts(self, percent):
         ts = []
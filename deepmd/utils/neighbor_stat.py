@@ -1,8 +1,14 @@
 # SPDX-License-Identifier: LGPL-3.0-or-later
+import json
 import logging
 import math
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)
 from typing import (
+    Dict,
     List,
+    Optional,
     Tuple,
 )
 
@@ -10,10 +16,14 @@ import numpy as np
 
 from deepmd.env import (
     GLOBAL_NP_FLOAT_PRECISION,
+    GLOBAL_TF_FLOAT_PRECISION,
     default_tf_session_config,
     op_module,
     tf,
 )
+from deepmd.utils.data_manifest import (
+    get_data_manifest,
+)
 from deepmd.utils.data_system import (
     DeepmdDataSystem,
 )
@@ -29,6 +39,10 @@ class NeighborStat:
 
     It loads data from DeepmdData object, and measures the data info, including neareest nbor distance between atoms, max nbor size of atoms and the output data range of the environment matrix.
 
+    The statistics are computed in one process: the OP is mapped over chunks
+    of frames, the chunks are run in parallel by the threads of one session,
+    and the next set is read in a background thread.
+
     Parameters
     ----------
     ntypes
@@ -37,6 +51,13 @@ class NeighborStat:
             The cut-off radius
     one_type : bool, optional, default=False
         Treat all types as a single type.
+    chunk_size : int, optional, default=64
+        The number of frames fed to the OP together.
+    sample : float, optional
+        Only use a sample of the frames of each system: the fraction of the
+        frames if less than 1, otherwise the number of frames. The frames are
+        sampled from each set in proportion to its number of frames. All frames
+        are used if None.
     """
 
     def __init__(
@@ -44,11 +65,17 @@ class NeighborStat:
         ntypes: int,
         rcut: float,
         one_type: bool = False,
+        chunk_size: int = 64,
+        sample: Optional[float] = None,
     ) -> None:
         """Constructor."""
+        if sample is not None and sample <= 0:
+            raise ValueError("sample should be positive")
         self.rcut = rcut
+        self.sample = sample
         self.ntypes = ntypes
         self.one_type = one_type
+        self.chunk_size = chunk_size
         sub_graph = tf.Graph()
 
         def builder():
@@ -73,16 +100,44 @@ class NeighborStat:
                 t_type = tf.clip_by_value(t_type, -1, 0)
                 t_natoms = tf.tile(t_natoms[0:1], [3])
 
-            _max_nbor_size, _min_nbor_dist = op_module.neighbor_stat(
-                place_holders["coord"],
-                t_type,
-                t_natoms,
-                place_holders["box"],
-                place_holders["default_mesh"],
-                rcut=self.rcut,
+            def frame_stat(frame):
+                # the OP only takes the first frame
+                coord, atype, box = frame
+                _max_nbor_size, _min_nbor_dist = op_module.neighbor_stat(
+                    tf.reshape(coord, [1, -1]),
+                    tf.reshape(atype, [1, -1]),
+                    t_natoms,
+                    tf.reshape(box, [1, 9]),
+                    place_holders["default_mesh"],
+                    rcut=self.rcut,
+                )
+                # inf if there is no neighbor
+                return (
+                    tf.reduce_max(_max_nbor_size, axis=0),
+                    tf.reduce_min(
+                        tf.concat(
+                            [
+                                _min_nbor_dist,
+                                tf.constant([np.inf], GLOBAL_TF_FLOAT_PRECISION),
+                            ],
+                            axis=0,
+                        )
+                    ),
+                )
+
+            _max_nbor_size, _min_nbor_dist = tf.map_fn(
+                frame_stat,
+                (place_holders["coord"], t_type, place_holders["box"]),
+                dtype=(tf.int32, GLOBAL_TF_FLOAT_PRECISION),
             )
+            place_holders["sys_idx"] = tf.placeholder(tf.int32, [])
             place_holders["dir"] = tf.placeholder(tf.string)
-            return place_holders, (_max_nbor_size, _min_nbor_dist, place_holders["dir"])
+            return place_holders, (
+                _max_nbor_size,
+                _min_nbor_dist,
+                place_holders["sys_idx"],
+                place_holders["dir"],
+            )
 
         with sub_graph.as_default():
             self.p = ParallelOp(builder, config=default_tf_session_config)
@@ -92,6 +147,10 @@ class NeighborStat:
     def get_stat(self, data: DeepmdDataSystem) -> Tuple[float, List[int]]:
         """Get the data statistics of the training data, including nearest nbor distance between atoms, max nbor size of atoms.
 
+        The statistics of each system are cached in the data manifest (see
+        :mod:`deepmd.utils.data_manifest`), if it is enabled, and reused as
+        long as the data is not changed.
+
         Parameters
         ----------
         data
@@ -104,50 +163,154 @@ class NeighborStat:
         max_nbor_size
             A list with ntypes integers, denotes the actual achieved max sel
         """
-        self.min_nbor_dist = 100.0
-        self.max_nbor_size = [0]
-        if not self.one_type:
-            self.max_nbor_size *= self.ntypes
+        nmax = 1 if self.one_type else self.ntypes
+        manifest = get_data_manifest()
+        cache_key = json.dumps(
+            [
+                self.rcut,
+                self.ntypes,
+                self.one_type,
+                data.get_type_map() or None,
+                self.sample,
+            ]
+        )
+        # min_nbor_dist and max_nbor_size of each system
+        sys_stat = [None] * len(data.system_dirs)
+        if manifest is not None:
+            for ii, sys_dir in enumerate(data.system_dirs):
+                sys_stat[ii] = manifest.get_neighbor_stat(
+                    sys_dir, data.data_systems[ii].set_prefix, cache_key
+                )
+        todo = [ii for ii in range(len(sys_stat)) if sys_stat[ii] is None]
+        for ii in todo:
+            sys_stat[ii] = [np.inf, [0] * nmax]
+
+        def load(ii, jj, idx):
+            # only the rows of the frames used are read
+            data_set = data.data_systems[ii]._load_frames(
+                jj, ["coord", "type", "box"], idx
+            )
+            return ii, jj, data_set
 
         def feed():
-            for ii in range(len(data.system_dirs)):
-                for jj in data.data_systems[ii].dirs:
-                    data_set = data.data_systems[ii]._load_set(jj)
-                    for kk in range(np.array(data_set["type"]).shape[0]):
+            sets = []
+            for ii in todo:
+                frames = self._sample_frames(data.data_systems[ii])
+                sets.extend(
+                    (ii, jj, frames[str(jj)]) for jj in data.data_systems[ii].dirs
+                )
+            # the next set is read in the background while a set is computed
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                if len(sets):
+                    future = executor.submit(load, *sets[0])
+                for nn in range(len(sets)):
+                    ii, jj, data_set = future.result()
+                    if nn + 1 < len(sets):
+                        future = executor.submit(load, *sets[nn + 1])
+                    nframes = data_set["type"].shape[0]
+                    for kk in range(0, nframes, self.chunk_size):
                         yield {
-                            "coord": np.array(data_set["coord"])[kk].reshape(
-                                [-1, data.natoms[ii] * 3]
-                            ),
-                            "type": np.array(data_set["type"])[kk].reshape(
+                            "coord": data_set["coord"][
+                                kk : kk + self.chunk_size
+                            ].reshape([-1, data.natoms[ii] * 3]),
+                            "type": data_set["type"][kk : kk + self.chunk_size].reshape(
                                 [-1, data.natoms[ii]]
                             ),
                             "natoms_vec": np.array(data.natoms_vec[ii]),
-                            "box": np.array(data_set["box"])[kk].reshape([-1, 9]),
+                            "box": data_set["box"][kk : kk + self.chunk_size].reshape(
+                                [-1, 9]
+                            ),
                             "default_mesh": np.array(data.default_mesh[ii]),
+                            "sys_idx": ii,
                             "dir": str(jj),
                         }
 
-        for mn, dt, jj in self.p.generate(self.sub_sess, feed()):
-            if dt.size != 0:
-                dt = np.min(dt)
-            else:
-                dt = self.rcut
+        # the OP is not run if all systems are cached
+        results = self.p.generate(self.sub_sess, feed()) if len(todo) else []
+        # statistics of each frame
+        frame_stat = []
+        for mn, dt, ii, jj in results:
+            if np.any(np.isinf(dt)):
                 log.warning(
                     "Atoms with no neighbors found in %s. Please make sure it's what you expected."
-                    % jj
+                    % jj.decode()
+                )
+                dt = np.where(np.isinf(dt), self.rcut, dt)
+            if self.sample is not None:
+                frame_stat.append((mn, dt))
+            dt = np.min(dt)
+            if math.isclose(dt, 0.0, rel_tol=1e-6):
+                # it's unexpected that the distance between two atoms is zero
+                # zero distance will cause nan (#874)
+                raise RuntimeError(
+                    "Some atoms are overlapping in %s. Please check your"
+                    " training data to remove duplicated atoms." % jj.decode()
+                )
+            sys_stat[ii][0] = min(sys_stat[ii][0], float(dt))
+            sys_stat[ii][1] = np.maximum(np.max(mn, axis=0), sys_stat[ii][1]).tolist()
+        if manifest is not None:
+            for ii in todo:
+                manifest.set_neighbor_stat(
+                    data.system_dirs[ii],
+                    data.data_systems[ii].set_prefix,
+                    cache_key,
+                    sys_stat[ii],
                 )
-            if dt < self.min_nbor_dist:
-                if math.isclose(dt, 0.0, rel_tol=1e-6):
-                    # it's unexpected that the distance between two atoms is zero
-                    # zero distance will cause nan (#874)
-                    raise RuntimeError(
-                        "Some atoms are overlapping in %s. Please check your"
-                        " training data to remove duplicated atoms." % jj
-                    )
-                self.min_nbor_dist = dt
-            var = np.max(mn, axis=0)
-            self.max_nbor_size = np.maximum(var, self.max_nbor_size)
 
+        self.min_nbor_dist = min([100.0] + [ss[0] for ss in sys_stat])
+        self.max_nbor_size = np.max([[0] * nmax] + [ss[1] for ss in sys_stat], axis=0)
         log.info("training data with min nbor dist: " + str(self.min_nbor_dist))
         log.info("training data with max nbor size: " + str(self.max_nbor_size))
+        if self.sample is not None and len(frame_stat):
+            self._log_tail(frame_stat)
         return self.min_nbor_dist, self.max_nbor_size
+
+    def _sample_frames(self, data_sys) -> Dict[str, Optional[np.ndarray]]:
+        """Get the indexes of the frames used in each set of a system.
+
+        The number of frames is allocated to the sets in proportion to their
+        numbers of frames, with at least one frame per set. None means all
+        frames of the set are used.
+        """
+        if self.sample is None:
+            return {str(jj): None for jj in data_sys.dirs}
+        nframes = [data_sys._get_nframes(jj) for jj in data_sys.dirs]
+        total = sum(nframes)
+        if self.sample < 1:
+            nsample = math.ceil(self.sample * total)
+        else:
+            nsample = min(int(self.sample), total)
+        # the frames are the same in every run for the same data
+        rng = np.random.RandomState(0)
+        frames = {}
+        for jj, nn in zip(data_sys.dirs, nframes):
+            nn_sample = min(max(round(nsample * nn / total), 1), nn)
+            if nn_sample == nn:
+                frames[str(jj)] = None
+            else:
+                frames[str(jj)] = np.sort(rng.choice(nn, nn_sample, replace=False))
+        return frames
+
+    def _log_tail(self, frame_stat: List[Tuple[np.ndarray, np.ndarray]]):
+        """Log the distribution of the statistics over the sampled frames."""
+        max_nbor_size = np.concatenate([mn for mn, _ in frame_stat])
+        min_nbor_dist = np.concatenate([dt for _, dt in frame_stat])
+        nsample = min_nbor_dist.size
+        quantiles = [50, 90, 99, 100]
+        log.info(
+            "neighbor statistics of %d sampled frames, at quantiles %s of the frames:"
+            % (nsample, quantiles)
+        )
+        log.info(
+            "max nbor size: %s"
+            % np.percentile(max_nbor_size, quantiles, axis=0).astype(int).T.tolist()
+        )
+        log.info(
+            "min nbor dist: %s"
+            % np.percentile(min_nbor_dist, [100 - qq for qq in quantiles]).tolist()
+        )
+        # the order statistics of a random sample
+        log.info(
+            "the max nbor size of a frame exceeds that of the sample "
+            "with a probability of at most %.2g" % (1.0 / (nsample + 1))
+        )
@@ -1,5 +1,9 @@
 # SPDX-License-Identifier: LGPL-3.0-or-later
+import json
 import os
+import posixpath
+import stat
+import struct
 from abc import (
     ABC,
     abstractmethod,
@@ -11,16 +15,55 @@ from pathlib import (
     Path,
 )
 from typing import (
+    Dict,
     List,
     Optional,
+    Set,
+    Tuple,
 )
 
 import h5py
 import numpy as np
 from wcmatch.glob import (
+    GLOBSTAR,
     globfilter,
 )
 
+PACK_MAGIC = b"DPPACK01"
+"""Magic bytes at the beginning of a packed data file."""
+PACK_HEAD = struct.Struct("<8sQQ")
+"""Head of a packed data file: magic, offset and size of the JSON index."""
+
+
+def is_pack_file(path: str, st: Optional[os.stat_result] = None) -> bool:
+    """Check if a file is a packed data file.
+
+    The result is cached by the identity, modification time and size of the
+    file, so that the file is read only once however many paths are created.
+
+    Parameters
+    ----------
+    path : str
+        path to the file
+    st : os.stat_result, optional
+        the status of the file, if it has been got
+
+    Returns
+    -------
+    bool
+        whether the file starts with :data:`PACK_MAGIC`
+    """
+    if st is None:
+        st = os.stat(path)
+    return _is_pack_file(path, st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+@lru_cache(None)
+def _is_pack_file(path: str, dev: int, ino: int, mtime_ns: int, size: int) -> bool:
+    # the status of the file is a part of the key of the cache
+    with open(path, "rb") as f:
+        return f.read(len(PACK_MAGIC)) == PACK_MAGIC
+
 
 class DPPath(ABC):
     """The path class to data system (DeepmdData).
@@ -33,9 +76,16 @@ class DPPath(ABC):
 
     def __new__(cls, path: str):
         if cls is DPPath:
-            if os.path.isdir(path):
+            file_path = path.split("#")[0]
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                st = None
+            if st is not None and stat.S_ISDIR(st.st_mode) and file_path == path:
                 return super().__new__(DPOSPath)
-            elif os.path.isfile(path.split("#")[0]):
+            elif st is not None and stat.S_ISREG(st.st_mode):
+                if is_pack_file(file_path, st):
+                    return super().__new__(DPPackPath)
                 # assume h5 if it is not dir
                 # TODO: check if it is a real h5? or just check suffix?
                 return super().__new__(DPH5Path)
@@ -43,15 +93,32 @@ class DPPath(ABC):
         return super().__new__(cls)
 
     @abstractmethod
-    def load_numpy(self) -> np.ndarray:
+    def load_numpy(self, mmap_mode: Optional[str] = None) -> np.ndarray:
         """Load NumPy array.
 
+        Parameters
+        ----------
+        mmap_mode : str, optional
+            If not None, memory-map the file with the given mode (see
+            :func:`numpy.load`), or defer reading it, if the backend
+            supports it
+
         Returns
         -------
         np.ndarray
             loaded NumPy array
         """
 
+    @abstractmethod
+    def load_shape(self) -> Tuple[int, ...]:
+        """Get the shape of the NumPy array without loading it.
+
+        Returns
+        -------
+        tuple of int
+            shape of the array
+        """
+
     @abstractmethod
     def load_txt(self, **kwargs) -> np.ndarray:
         """Load NumPy array from text.
@@ -139,15 +206,37 @@ class DPOSPath(DPPath):
         else:
             self.path = Path(path)
 
-    def load_numpy(self) -> np.ndarray:
+    def load_numpy(self, mmap_mode: Optional[str] = None) -> np.ndarray:
         """Load NumPy array.
 
+        Parameters
+        ----------
+        mmap_mode : str, optional
+            If not None, memory-map the file with the given mode (see
+            :func:`numpy.load`), so that the data stays on the disk
+
         Returns
         -------
         np.ndarray
             loaded NumPy array
         """
-        return np.load(str(self.path))
+        return np.load(str(self.path), mmap_mode=mmap_mode)
+
+    def load_shape(self) -> Tuple[int, ...]:
+        """Get the shape of the NumPy array from the header of the `npy` file.
+
+        Returns
+        -------
+        tuple of int
+            shape of the array
+        """
+        with open(self.path, "rb") as f:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, _, _ = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, _, _ = np.lib.format.read_array_header_2_0(f)
+        return shape
 
     def load_txt(self, **kwargs) -> np.ndarray:
         """Load NumPy array from text.
@@ -228,6 +317,10 @@ class DPH5Path(DPPath):
         path
     """
 
+    file_options: Dict = {}
+    """Keyword arguments passed to :class:`h5py.File` when a file is opened,
+    set by :meth:`set_file_options`."""
+
     def __init__(self, path: str) -> None:
         super().__init__()
         # we use "#" to split path
@@ -251,18 +344,74 @@ class DPH5Path(DPPath):
         # this method has cache to avoid duplicated
         # loading from different DPH5Path
         # However the file will be never closed?
-        return h5py.File(path, "r")
+        return h5py.File(path, "r", **cls.file_options)
+
+    @classmethod
+    def set_file_options(
+        cls,
+        rdcc_nbytes: Optional[int] = None,
+        rdcc_nslots: Optional[int] = None,
+        swmr: bool = False,
+        driver: Optional[str] = None,
+    ):
+        """Set the options to open HDF5 files.
+
+        Files opened before are not affected unless the options are changed,
+        in which case they are opened again by new paths.
 
-    def load_numpy(self) -> np.ndarray:
+        Parameters
+        ----------
+        rdcc_nbytes : int, optional
+            size of the raw data chunk cache of each dataset in bytes
+        rdcc_nslots : int, optional
+            number of slots in the hash table of the raw data chunk cache
+        swmr : bool, default=False
+            open files in the single-writer multiple-reader mode, so that
+            files being written can be read
+        driver : str, optional
+            the HDF5 file driver, e.g. `sec2`, `stdio` or `core`
+        """
+        options = {}
+        if rdcc_nbytes is not None:
+            options["rdcc_nbytes"] = rdcc_nbytes
+        if rdcc_nslots is not None:
+            options["rdcc_nslots"] = rdcc_nslots
+        if swmr:
+            options["swmr"] = True
+        if driver is not None:
+            options["driver"] = driver
+        if options != cls.file_options:
+            cls.file_options = options
+            cls._load_h5py.cache_clear()
+
+    def load_numpy(self, mmap_mode: Optional[str] = None) -> np.ndarray:
         """Load NumPy array.
 
+        Parameters
+        ----------
+        mmap_mode : str, optional
+            If not None, the dataset is returned without being read, so
+            that only the frames in use are read later
+
         Returns
         -------
-        np.ndarray
-            loaded NumPy array
+        np.ndarray or h5py.Dataset
+            loaded NumPy array, or the dataset if `mmap_mode` is given
         """
+        if mmap_mode is not None:
+            return self.root[self.name]
         return self.root[self.name][:]
 
+    def load_shape(self) -> Tuple[int, ...]:
+        """Get the shape of the dataset without reading it.
+
+        Returns
+        -------
+        tuple of int
+            shape of the dataset
+        """
+        return self.root[self.name].shape
+
     def load_txt(self, dtype: Optional[np.dtype] = None, **kwargs) -> np.ndarray:
         """Load NumPy array from text.
 
@@ -289,8 +438,12 @@ class DPH5Path(DPPath):
         List[DPPath]
             list of paths
         """
-        # got paths starts with current path first, which is faster
-        subpaths = [ii for ii in self._keys if ii.startswith(self.name)]
+        if "/" in pattern:
+            # got paths starts with current path first, which is faster
+            subpaths = [ii for ii in self._keys if ii.startswith(self.name)]
+        else:
+            # a pattern without "/" only matches the children of this group
+            subpaths = self._children.get(self.name.rstrip("/") or "/", [])
         return [
             type(self)(f"{self.root_path}#{pp}")
             for pp in globfilter(subpaths, self._connect_path(pattern))
@@ -325,15 +478,40 @@ class DPH5Path(DPPath):
         file.visit(lambda x: l.append("/" + x))
         return l
 
+    @property
+    def _key_set(self) -> Set[str]:
+        """Set of all groups and datasets, for constant-time lookup."""
+        return self._file_key_set(self.root)
+
+    @classmethod
+    @lru_cache(None)
+    def _file_key_set(cls, file: h5py.File) -> Set[str]:
+        """Set of all groups and datasets."""
+        return set(cls._file_keys(file))
+
+    @property
+    def _children(self) -> Dict[str, List[str]]:
+        """Children of each group."""
+        return self._file_children(self.root)
+
+    @classmethod
+    @lru_cache(None)
+    def _file_children(cls, file: h5py.File) -> Dict[str, List[str]]:
+        """Children of each group, in the order of walking."""
+        children = {}
+        for key in cls._file_keys(file):
+            children.setdefault(posixpath.dirname(key), []).append(key)
+        return children
+
     def is_file(self) -> bool:
         """Check if self is file."""
-        if self.name not in self._keys:
+        if self.name not in self._key_set:
             return False
         return isinstance(self.root[self.name], h5py.Dataset)
 
     def is_dir(self) -> bool:
         """Check if self is directory."""
-        if self.name not in self._keys:
+        if self.name not in self._key_set:
             return False
         return isinstance(self.root[self.name], h5py.Group)
 
@@ -356,3 +534,201 @@ class DPH5Path(DPPath):
     def __str__(self) -> str:
         """Returns path of self."""
         return f"{self.root_path}#{self.name}"
+
+
+class DPPackPath(DPPath):
+    """The path class to data system (DeepmdData) for packed data files.
+
+    A packed data file, written by :func:`deepmd.utils.data_pack.pack_systems`,
+    stores many systems in one file. Arrays are stored contiguously at aligned
+    offsets, and an index records the offset, data type and shape of each array,
+    as well as the metadata of each system. Only the index is read to walk
+    the tree, and arrays can be memory-mapped for random frame access.
+
+    Notes
+    -----
+    OS - packed file relationship:
+        directory - entry in the index without data
+        file - array
+
+    Parameters
+    ----------
+    path : str
+        path
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        # the same "#" separator as DPH5Path
+        s = path.split("#")
+        self.root_path = s[0]
+        self.index = self._load_index(s[0])
+        self.name = s[1] if len(s) > 1 else "/"
+
+    @classmethod
+    @lru_cache(None)
+    def _load_index(cls, path: str) -> dict:
+        """Load the index of a packed data file.
+
+        Parameters
+        ----------
+        path : str
+            path to the packed data file
+        """
+        with open(path, "rb") as f:
+            magic, offset, size = PACK_HEAD.unpack(f.read(PACK_HEAD.size))
+            if magic != PACK_MAGIC:
+                raise OSError(f"{path} is not a packed data file")
+            f.seek(offset)
+            index = json.loads(f.read(size).decode())
+        # index of directories and their children
+        children = {"/": set()}
+        for name in index["files"]:
+            child = name
+            while child != "/":
+                parent = posixpath.dirname(child)
+                siblings = children.setdefault(parent, set())
+                if child in siblings:
+                    # the ancestors have been added
+                    break
+                siblings.add(child)
+                child = parent
+        index["children"] = {kk: sorted(vv) for kk, vv in children.items()}
+        return index
+
+    def load_numpy(self, mmap_mode: Optional[str] = None) -> np.ndarray:
+        """Load NumPy array.
+
+        Parameters
+        ----------
+        mmap_mode : str, optional
+            If not None, memory-map the array with the given mode
+            (see :class:`numpy.memmap`)
+
+        Returns
+        -------
+        np.ndarray
+            loaded NumPy array
+        """
+        info = self.index["files"][self.name]
+        dtype = np.dtype(info["dtype"])
+        shape = tuple(info["shape"])
+        count = int(np.prod(shape))
+        if mmap_mode is not None and count > 0:
+            return np.memmap(
+                self.root_path,
+                dtype=dtype,
+                mode=mmap_mode,
+                offset=info["offset"],
+                shape=shape,
+            )
+        with open(self.root_path, "rb") as f:
+            f.seek(info["offset"])
+            return np.fromfile(f, dtype=dtype, count=count).reshape(shape)
+
+    def load_shape(self) -> Tuple[int, ...]:
+        """Get the shape of the array from the index.
+
+        Returns
+        -------
+        tuple of int
+            shape of the array
+        """
+        return tuple(self.index["files"][self.name]["shape"])
+
+    def load_txt(self, dtype: Optional[np.dtype] = None, **kwargs) -> np.ndarray:
+        """Load NumPy array from text.
+
+        Returns
+        -------
+        np.ndarray
+            loaded NumPy array
+        """
+        arr = self.load_numpy()
+        if dtype:
+            arr = arr.astype(dtype)
+        return arr
+
+    def glob(self, pattern: str) -> List["DPPath"]:
+        """Search path using the glob pattern.
+
+        Parameters
+        ----------
+        pattern : str
+            glob pattern
+
+        Returns
+        -------
+        List[DPPath]
+            list of paths
+        """
+        if "/" in pattern or "**" in pattern:
+            subpaths = [
+                ii
+                for ii in self.index["files"].keys() | self.index["children"].keys()
+                if ii.startswith(self.name)
+            ]
+            flags = GLOBSTAR
+        else:
+            # only children of this directory can match
+            subpaths = self.index["children"].get(self.name, [])
+            flags = 0
+        return [
+            type(self)(f"{self.root_path}#{pp}")
+            for pp in globfilter(subpaths, self._connect_path(pattern), flags=flags)
+        ]
+
+    def rglob(self, pattern: str) -> List["DPPath"]:
+        """This is like calling :meth:`DPPath.glob()` with `**/` added in front
+        of the given relative pattern.
+
+        Parameters
+        ----------
+        pattern : str
+            glob pattern
+
+        Returns
+        -------
+        List[DPPath]
+            list of paths
+        """
+        return self.glob("**/" + pattern)
+
+    def is_file(self) -> bool:
+        """Check if self is file."""
+        return self.name in self.index["files"]
+
+    def is_dir(self) -> bool:
+        """Check if self is directory."""
+        return self.name in self.index["children"]
+
+    def get_system_info(self) -> Optional[Dict]:
+        """Get the metadata of the system recorded in the index.
+
+        Returns
+        -------
+        dict or None
+            natoms, atom_types, type_map, pbc and the number of frames and
+            keys of each set; None if self is not a system
+        """
+        return self.index["systems"].get(self.name, None)
+
+    def __truediv__(self, key: str) -> "DPPath":
+        """Used for / operator."""
+        return type(self)(f"{self.root_path}#{self._connect_path(key)}")
+
+    def _connect_path(self, path: str) -> str:
+        """Connect self with path."""
+        if self.name.endswith("/"):
+            return f"{self.name}{path}"
+        return f"{self.name}/{path}"
+
+    def __lt__(self, other: "DPPackPath") -> bool:
+        """Whether this DPPath is less than other for sorting."""
+        if self.root_path == other.root_path:
+            return self.name < other.name
+        return self.root_path < other.root_path
+
+    def __str__(self) -> str:
+        """Returns path of self."""
+        return f"{self.root_path}#{self.name}"
@@ -1,4 +1,8 @@
 # SPDX-License-Identifier: LGPL-3.0-or-later
+import threading
+from contextlib import (
+    contextmanager,
+)
 from typing import (
     Optional,
 )
@@ -6,9 +10,18 @@ from typing import (
 import numpy as np
 
 _RANDOM_GENERATOR = np.random.RandomState()
+# the generators used by the current threads instead of the global one
+_THREAD_LOCAL = threading.local()
+
+
+def _get_generator() -> np.random.RandomState:
+    generator = getattr(_THREAD_LOCAL, "generator", None)
+    return _RANDOM_GENERATOR if generator is None else generator
 
 
-def choice(a: np.ndarray, p: Optional[np.ndarray] = None):
+def choice(
+    a: np.ndarray, p: Optional[np.ndarray] = None, size=None, replace: bool = True
+):
     """Generates a random sample from a given 1-D array.
 
     Parameters
@@ -17,13 +30,17 @@ def choice(a: np.ndarray, p: Optional[np.ndarray] = None):
         A random sample is generated from its elements.
     p : np.ndarray
         The probabilities associated with each entry in a.
+    size
+        Output shape. A single value is returned if None.
+    replace : bool, default=True
+        Whether the sample is with or without replacement.
 
     Returns
     -------
     np.ndarray
         arrays with results and their shapes
     """
-    return _RANDOM_GENERATOR.choice(a, p=p)
+    return _get_generator().choice(a, size=size, replace=replace, p=p)
 
 
 def random(size=None):
@@ -39,7 +56,7 @@ def random(size=None):
     np.ndarray
         Arrays with results and their shapes.
     """
-    return _RANDOM_GENERATOR.random_sample(size)
+    return _get_generator().random_sample(size)
 
 
 def seed(val: Optional[int] = None):
@@ -61,7 +78,28 @@ def shuffle(x: np.ndarray):
     x : np.ndarray
         The array or list to be shuffled.
     """
-    _RANDOM_GENERATOR.shuffle(x)
+    _get_generator().shuffle(x)
+
+
+@contextmanager
+def use_generator(generator: np.random.RandomState):
+    """Use the given generator instead of the global one in the current thread.
+
+    A background thread can draw random numbers from its own generator, whose
+    seed is drawn from the global generator by the main thread, so that the
+    sequence of the global generator does not depend on the thread scheduling.
+
+    Parameters
+    ----------
+    generator : np.random.RandomState
+        The generator.
+    """
+    previous = getattr(_THREAD_LOCAL, "generator", None)
+    _THREAD_LOCAL.generator = generator
+    try:
+        yield
+    finally:
+        _THREAD_LOCAL.generator = previous
 
 
-__all__ = ["choice", "random", "seed", "shuffle"]
+__all__ = ["choice", "random", "seed", "shuffle", "use_generator"]
@@ -0,0 +1,82 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+"""Arrays shared by the processes on the same node.
+
+An array is saved once to a node-local directory, e.g. `/dev/shm`, and all
+processes memory-map the saved file. The pages of the file are shared by the
+processes, so the memory of the array is used once per node instead of once
+per process. The first process that needs an array holds a lock file while it
+loads and saves the array; the other processes wait for the saved file.
+"""
+import logging
+import os
+import time
+from typing import (
+    Callable,
+)
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+def load_shared_array(
+    directory: str,
+    name: str,
+    load: Callable[[], np.ndarray],
+    timeout: float = 600.0,
+) -> np.ndarray:
+    """Load an array shared by the processes on the same node.
+
+    Parameters
+    ----------
+    directory : str
+        the node-local directory to save shared arrays
+    name : str
+        the unique name of the array, which should change with the content
+    load : Callable[[], np.ndarray]
+        the function to load the array if it has not been saved
+    timeout : float, default=600.0
+        a lock file older than `timeout` seconds is considered left by a
+        process that has been killed, in which case the array is loaded
+        without being shared
+
+    Returns
+    -------
+    np.ndarray
+        the read-only array memory-mapped from the saved file
+    """
+    path = os.path.join(directory, name + ".npy")
+    lock_path = path + ".lock"
+    while True:
+        if os.path.isfile(path):
+            return np.asarray(np.load(path, mmap_mode="r"))
+        os.makedirs(directory, exist_ok=True)
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            # another process is saving the array
+            try:
+                age = time.time() - os.stat(lock_path).st_mtime
+            except FileNotFoundError:
+                continue
+            if age > timeout:
+                log.warning(f"{lock_path} seems stale; {name} is not shared")
+                return load()
+            time.sleep(0.05)
+            continue
+        try:
+            arr = load()
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    np.save(f, arr)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                # e.g. no space left on the device
+                log.warning(f"cannot save {path}: {e}; {name} is not shared")
+                if os.path.isfile(tmp_path):
+                    os.remove(tmp_path)
+                return arr
+        finally:
+            os.close(fd)
+            os.remove(lock_path)
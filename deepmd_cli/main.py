@@ -518,6 +518,52 @@ def main_parser() -> argparse.ArgumentParser:
         default=False,
         help="treat all types as a single type. Used with se_atten descriptor.",
     )
+    parser_neighbor_stat.add_argument(
+        "--sample",
+        type=float,
+        default=None,
+        help="only use a sample of the frames of each system: the fraction of the frames if less than 1, otherwise the number of frames",
+    )
+
+    # pack data
+    parser_pack_data = subparsers.add_parser(
+        "pack-data",
+        parents=[parser_log],
+        help="Pack data systems into a single file",
+        formatter_class=RawTextArgumentDefaultsHelpFormatter,
+        epilog=textwrap.dedent(
+            """\
+        examples:
+            dp pack-data -s data -o data.dpk
+        """
+        ),
+    )
+    parser_pack_data.add_argument(
+        "-s",
+        "--system",
+        default=".",
+        type=str,
+        help="The system dir. Recursively detect systems in this directory",
+    )
+    parser_pack_data.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        required=True,
+        help="The packed data file",
+    )
+    parser_pack_data.add_argument(
+        "--set-prefix",
+        default="set",
+        type=str,
+        help="The prefix of the set directories",
+    )
+    parser_pack_data.add_argument(
+        "--alignment",
+        default=4096,
+        type=int,
+        help="The alignment of arrays in the packed file in bytes",
+    )
 
     # --version
     parser.add_argument(
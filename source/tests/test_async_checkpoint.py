@@ -0,0 +1,54 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from deepmd.env import (
+    tf,
+)
+from deepmd.train.trainer import (
+    AsyncCheckpointSaver,
+)
+
+
+class TestAsyncCheckpointSaver(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            self.var = tf.Variable(np.arange(6.0).reshape(2, 3), name="layer_0/matrix")
+            self.add_op = tf.assign_add(self.var, tf.ones([2, 3], dtype=tf.float64))
+            self.saver = tf.train.Saver(save_relative_paths=True, max_to_keep=2)
+            self.sess = tf.Session(graph=self.graph)
+            self.sess.run(tf.global_variables_initializer())
+
+    def tearDown(self):
+        self.sess.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_save(self):
+        save_path = os.path.join(self.tmp_dir, "model.ckpt")
+        saved = []
+        with self.graph.as_default():
+            saver = AsyncCheckpointSaver(self.sess, self.saver, max_to_keep=2)
+        for step in range(3):
+            saver.save(save_path, step, callback=saved.append)
+            # the variable is changed while the checkpoint is written
+            self.sess.run(self.add_op)
+        saver.close()
+        self.assertEqual(saved, [f"{save_path}-{step}" for step in range(3)])
+        # old checkpoints are removed
+        self.assertFalse(os.path.isfile(f"{save_path}-0.index"))
+        self.assertTrue(os.path.isfile(f"{save_path}-2.meta"))
+        ckpt = tf.train.latest_checkpoint(self.tmp_dir)
+        self.assertEqual(ckpt, f"{save_path}-2")
+        # restore the checkpoint in the training graph
+        with tf.Graph().as_default():
+            restorer = tf.train.import_meta_graph(ckpt + ".meta")
+            with tf.Session() as sess:
+                restorer.restore(sess, ckpt)
+                value = sess.run("layer_0/matrix:0")
+        np.testing.assert_allclose(value, np.arange(6.0).reshape(2, 3) + 2)
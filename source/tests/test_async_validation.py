@@ -0,0 +1,147 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import unittest
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)
+from unittest import (
+    mock,
+)
+
+import numpy as np
+
+from deepmd.env import (
+    tf,
+)
+from deepmd.train.trainer import (
+    DPTrainer,
+    VariableSnapshot,
+)
+
+
+class ValidData:
+    def __init__(self):
+        self.nbatch = 0
+
+    def get_batch(self):
+        self.nbatch += 1
+        return {"batch": self.nbatch}
+
+
+class TestAsyncValidation(unittest.TestCase):
+    def setUp(self):
+        # only the states of the validation are needed
+        self.trainer = DPTrainer.__new__(DPTrainer)
+        self.trainer._valid_executor = None
+        self.trainer._valid_future = None
+        self.trainer._valid_snapshot = None
+        self.trainer.sess = None
+        self.trainer.sess_config = None
+        # the graph is not copied without a session
+        patcher = mock.patch("deepmd.train.trainer.VariableSnapshot")
+        self.snapshot = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.trainer._fixed_valid_batches = {}
+        self.trainer.valid_async = True
+        self.trainer.cur_batch = 0
+
+    def test_get_valid_batches(self):
+        valid_data = ValidData()
+        # new batches in each validation
+        batches = self.trainer.get_valid_batches(valid_data, 2)
+        self.assertEqual(batches, [{"batch": 1}, {"batch": 2}])
+        batches = self.trainer.get_valid_batches(valid_data, 2)
+        self.assertEqual(batches, [{"batch": 3}, {"batch": 4}])
+        # the batches of the first validation are reused
+        fixed = self.trainer.get_valid_batches(valid_data, 2, fixed_batches=True)
+        self.assertEqual(fixed, [{"batch": 5}, {"batch": 6}])
+        self.assertIs(
+            self.trainer.get_valid_batches(valid_data, 2, fixed_batches=True), fixed
+        )
+        self.assertEqual(valid_data.nbatch, 6)
+        self.assertIsNone(self.trainer.get_valid_batches(None, 2, fixed_batches=True))
+
+    def test_get_valid_batches_multi_task(self):
+        valid_data = {"water": ValidData(), "ice": ValidData()}
+        fixed = {
+            kk: self.trainer.get_valid_batches(
+                valid_data[kk], 1, fixed_batches=True, fitting_key=kk
+            )
+            for kk in valid_data
+        }
+        self.assertEqual(fixed["water"], [{"batch": 1}])
+        self.assertEqual(fixed["ice"], [{"batch": 1}])
+        # the batches are kept for each fitting
+        for kk in valid_data:
+            self.assertIs(
+                self.trainer.get_valid_batches(
+                    valid_data[kk], 1, fixed_batches=True, fitting_key=kk
+                ),
+                fixed[kk],
+            )
+            self.assertEqual(valid_data[kk].nbatch, 1)
+
+    def test_wait_validation(self):
+        with mock.patch.object(
+            DPTrainer, "_valid_on_the_fly", side_effect=ValueError("foo")
+        ):
+            self.trainer.valid_on_the_fly(None, [], [])
+            with self.assertRaises(RuntimeError) as cm:
+                self.trainer.wait_validation()
+        self.assertIsInstance(cm.exception.__cause__, ValueError)
+        # the failure is raised only once
+        self.trainer.wait_validation()
+        self.trainer._valid_executor.shutdown()
+
+    def _test_shutdown(self, fail):
+        executors = []
+
+        def train(train_data, valid_data):
+            self.trainer.valid_on_the_fly(None, [], [])
+            executors.append(self.trainer._valid_executor)
+            if fail:
+                raise ValueError("foo")
+
+        with mock.patch.object(DPTrainer, "_valid_on_the_fly"), mock.patch.object(
+            DPTrainer, "_train", side_effect=train
+        ):
+            if fail:
+                with self.assertRaises(ValueError):
+                    self.trainer.train()
+            else:
+                self.trainer.train()
+        self.assertIsNone(self.trainer._valid_executor)
+        self.assertIsNone(self.trainer._valid_future)
+        self.assertIsNone(self.trainer._valid_snapshot)
+        self.snapshot.return_value.close.assert_called_once()
+        # the executor is shut down
+        self.assertIsInstance(executors[0], ThreadPoolExecutor)
+        with self.assertRaises(RuntimeError):
+            executors[0].submit(print)
+
+    def test_shutdown(self):
+        self._test_shutdown(fail=False)
+
+    def test_shutdown_failure(self):
+        self._test_shutdown(fail=True)
+
+
+class TestVariableSnapshot(tf.test.TestCase):
+    def test_snapshot(self):
+        graph = tf.Graph()
+        with graph.as_default():
+            w = tf.Variable(np.float64(1.0), name="w")
+            x = tf.placeholder(tf.float64, name="x")
+            y = tf.multiply(w, x, name="y")
+            update = tf.assign_add(w, np.float64(1.0))
+            sess = tf.Session(graph=graph)
+            sess.run(tf.global_variables_initializer())
+        snapshot = VariableSnapshot(sess)
+        values = snapshot.copy()
+        # the training continues after the snapshot is taken
+        sess.run(update)
+        snapshot.load(values)
+        self.assertEqual(snapshot.run(y, feed_dict={x: 2.0}), 2.0)
+        self.assertEqual(snapshot.run([y, w], feed_dict={x: 3.0}), [3.0, 1.0])
+        self.assertEqual(sess.run(y, feed_dict={x: 2.0}), 4.0)
+        snapshot.close()
+        sess.close()
@@ -8,11 +8,15 @@ from pathlib import (
 from deepmd.common import (
     GLOBAL_TF_FLOAT_PRECISION,
     cast_precision,
+    data_requirement,
     expand_sys_str,
 )
 from deepmd.env import (
     tf,
 )
+from deepmd.loss import (
+    EnerStdLoss,
+)
 
 
 # compute relative path
@@ -61,7 +65,7 @@ class TestCommonExpandSysDir(unittest.TestCase):
 
     def test_expand(self):
         ret = expand_sys_str("test_sys")
-        ret.sort()
+        # sorted by the paths
         self.assertEqual(ret, self.expected_out)
 
 
@@ -91,3 +95,26 @@ class TestCastPrecision(unittest.TestCase):
         self.assertEqual(y.dtype, tf.int64)
         self.assertIsInstance(z, bool)
         return x, y, z
+
+
+class TestDataRequirement(unittest.TestCase):
+    """This class tests `deepmd.common.add_data_requirement`."""
+
+    def setUp(self):
+        data_requirement.clear()
+
+    def tearDown(self):
+        data_requirement.clear()
+
+    def test_load(self):
+        # e.g. the losses of two tasks in the multi-task training
+        EnerStdLoss(1e-3, start_pref_f=1000, limit_pref_f=1)
+        self.assertTrue(data_requirement["force"]["load"])
+        self.assertFalse(data_requirement["virial"]["load"])
+        EnerStdLoss(
+            1e-3, start_pref_f=0, limit_pref_f=0, start_pref_v=1, limit_pref_v=1
+        )
+        # a later loss does not skip the force required by the first one
+        self.assertTrue(data_requirement["force"]["load"])
+        self.assertTrue(data_requirement["virial"]["load"])
+        self.assertFalse(data_requirement["atom_ener"]["load"])
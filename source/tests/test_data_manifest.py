@@ -0,0 +1,107 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import os
+import shutil
+import unittest
+from unittest import (
+    mock,
+)
+
+import numpy as np
+
+from deepmd.common import (
+    expand_sys_str,
+)
+from deepmd.utils.data import (
+    DeepmdData,
+)
+from deepmd.utils.data_manifest import (
+    DataManifest,
+    get_data_manifest,
+)
+
+
+class TestDataManifest(unittest.TestCase):
+    def setUp(self):
+        self.data_name = "test_data_manifest"
+        self.manifest_name = "test_data_manifest.json"
+        self.natoms = 3
+        for ss, nframes in (("sys0", 5), (os.path.join("sub", "sys1"), 4)):
+            set_dir = os.path.join(self.data_name, ss, "set.000")
+            os.makedirs(set_dir, exist_ok=True)
+            np.savetxt(
+                os.path.join(self.data_name, ss, "type.raw"),
+                np.array([1, 0, 1]),
+                fmt="%d",
+            )
+            np.save(
+                os.path.join(set_dir, "coord.npy"),
+                np.random.random([nframes, self.natoms * 3]),
+            )
+            np.save(os.path.join(set_dir, "box.npy"), np.random.random([nframes, 9]))
+        open(os.path.join(self.data_name, "sys0", "nopbc"), "w").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_name)
+        if os.path.isfile(self.manifest_name):
+            os.remove(self.manifest_name)
+
+    def test_expand_sys_str(self):
+        manifest = DataManifest(self.manifest_name)
+        systems = manifest.expand_sys_str(self.data_name)
+        self.assertEqual(
+            systems,
+            [
+                os.path.join(self.data_name, "sub", "sys1"),
+                os.path.join(self.data_name, "sys0"),
+            ],
+        )
+        # the same order as without the manifest
+        with mock.patch.dict(os.environ, {"DP_DATA_MANIFEST": ""}):
+            self.assertEqual(expand_sys_str(self.data_name), systems)
+        manifest.save()
+        manifest = DataManifest(self.manifest_name)
+        self.assertEqual(len(manifest.roots), 1)
+        self.assertEqual(manifest.expand_sys_str(self.data_name), systems)
+        self.assertFalse(manifest._dirty)
+        # a new system is found
+        shutil.copytree(
+            os.path.join(self.data_name, "sys0"), os.path.join(self.data_name, "sys2")
+        )
+        self.assertEqual(len(manifest.expand_sys_str(self.data_name)), 3)
+        self.assertTrue(manifest._dirty)
+
+    def test_get_system(self):
+        manifest = DataManifest(self.manifest_name)
+        sys_path = os.path.join(self.data_name, "sys0")
+        info = manifest.get_system(sys_path)
+        self.assertEqual(info["natoms"], self.natoms)
+        self.assertEqual(info["atom_types"], [1, 0, 1])
+        self.assertIsNone(info["type_map"])
+        self.assertFalse(info["pbc"])
+        self.assertEqual(
+            info["sets"], {"set.000": {"nframes": 5, "keys": ["box", "coord"]}}
+        )
+        manifest.save()
+        manifest = DataManifest(self.manifest_name)
+        self.assertEqual(manifest.get_system(sys_path), info)
+        self.assertFalse(manifest._dirty)
+        # the set is changed
+        np.save(
+            os.path.join(sys_path, "set.000", "coord.npy"),
+            np.random.random([2, self.natoms * 3]),
+        )
+        self.assertEqual(manifest.get_system(sys_path)["sets"]["set.000"]["nframes"], 2)
+
+    def test_deepmd_data(self):
+        sys_path = os.path.join(self.data_name, "sys0")
+        with mock.patch.dict(os.environ, {"DP_DATA_MANIFEST": self.manifest_name}):
+            dd = DeepmdData(sys_path)
+            get_data_manifest().save()
+        self.assertTrue(os.path.isfile(self.manifest_name))
+        self.assertEqual(dd.train_dirs, [os.path.join(sys_path, "set.000")])
+        self.assertEqual(dd.idx_map.tolist(), [1, 0, 2])
+        self.assertFalse(dd.pbc)
+        self.assertFalse(dd.mixed_type)
+        self.assertEqual(dd.get_numb_batch(2, 0), 2)
+        data = dd.get_batch(5)
+        self.assertEqual(data["coord"].shape, (5, self.natoms * 3))
@@ -1,5 +1,9 @@
 # SPDX-License-Identifier: LGPL-3.0-or-later
 import os
+import types
+from collections import (
+    OrderedDict,
+)
 
 import numpy as np
 from common import (
@@ -164,3 +168,37 @@ class TestDataModifier(tf.test.TestCase):
         np.testing.assert_almost_equal(
             t_esti.ravel(), vv.ravel(), places, err_msg="virial component failed"
         )
+
+
+class TestCorrectionCache(tf.test.TestCase):
+    def _get_corrections(self, cache_size, sets):
+        evaluated = []
+
+        def eval(coord, box, atype):
+            evaluated.append(coord[0, 0])
+            return coord, box, atype
+
+        modifier = types.SimpleNamespace(
+            eval=eval, cache_dir=None, cache_size=cache_size, _corrections=OrderedDict()
+        )
+        box = np.eye(3).reshape([1, 9])
+        atype = np.zeros(1, dtype=int)
+        for ii in sets:
+            coord = np.full([1, 3], float(ii))
+            ret = DipoleChargeModifier._get_corrections(
+                modifier, coord, box, atype, f"set.{ii:03d}"
+            )
+            np.testing.assert_equal(ret[0], coord)
+        return evaluated, list(modifier._corrections)
+
+    def test_lru(self):
+        evaluated, cached = self._get_corrections(2, (0, 1, 0, 2, 0, 1))
+        # set.001 is dropped by set.002, as set.000 is used more recently
+        self.assertEqual(evaluated, [0.0, 1.0, 2.0, 1.0])
+        self.assertEqual(cached, ["set.000", "set.001"])
+
+    def test_unbounded(self):
+        # by default, each set is computed once in all epochs
+        evaluated, cached = self._get_corrections(None, (0, 1, 2, 3) * 3)
+        self.assertEqual(evaluated, [0.0, 1.0, 2.0, 3.0])
+        self.assertEqual(cached, ["set.000", "set.001", "set.002", "set.003"])
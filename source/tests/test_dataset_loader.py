@@ -0,0 +1,89 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import unittest
+
+import numpy as np
+
+from deepmd.train.trainer import (
+    DatasetLoader,
+)
+from deepmd.utils import random as dp_random
+
+
+class CountingData:
+    """Data system that returns batches in order."""
+
+    def __init__(self, fail_at=None):
+        self.count = 0
+        self.fail_at = fail_at
+
+    def get_batch(self):
+        if self.count == self.fail_at:
+            raise OSError("cannot read the data")
+        self.count += 1
+        return {
+            "coord": np.full([2, 6], self.count, dtype=np.float64),
+            "find_coord": np.float32(1.0),
+        }
+
+
+class RandomData:
+    """Data system that draws batches with the global random generator."""
+
+    def get_batch(self):
+        return {
+            "coord": dp_random.random([2, 6]),
+            "find_coord": np.float32(1.0),
+        }
+
+
+class TestDatasetLoader(unittest.TestCase):
+    def test_no_prefetch(self):
+        data = CountingData()
+        loader = DatasetLoader(data)
+        self.assertEqual(loader.data_keys, ["coord", "find_coord"])
+        self.assertEqual(loader.get_batch()["coord"][0, 0], 2)
+        self.assertEqual(data.count, 2)
+
+    def test_prefetch_thread(self):
+        data = CountingData()
+        loader = DatasetLoader(data, prefetch_size=3)
+        try:
+            for ii in range(10):
+                batch = loader.get_batch()
+                # the batches are taken in order
+                self.assertEqual(batch["coord"][0, 0], ii + 2)
+            # at most prefetch_size batches are loaded in advance
+            self.assertLessEqual(data.count, 1 + 10 + 3)
+        finally:
+            loader.close()
+
+    def test_prefetch_seed(self):
+        runs = []
+        for _ in range(2):
+            dp_random.seed(1)
+            loader = DatasetLoader(RandomData(), prefetch_size=3)
+            batches = []
+            try:
+                for ii in range(5):
+                    batches.append(loader.get_batch()["coord"])
+                    # the main thread draws random numbers at the same time
+                    dp_random.random()
+            finally:
+                loader.close()
+            runs.append(batches)
+        # the batches do not depend on the thread scheduling
+        np.testing.assert_equal(runs[0], runs[1])
+
+    def test_prefetch_error(self):
+        loader = DatasetLoader(CountingData(fail_at=3), prefetch_size=2)
+        try:
+            loader.get_batch()
+            loader.get_batch()
+            with self.assertRaises(RuntimeError):
+                loader.get_batch()
+        finally:
+            loader.close()
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            DatasetLoader(CountingData(), prefetch_size=1, prefetch_backend="foo")
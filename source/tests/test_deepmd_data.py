@@ -3,7 +3,11 @@ import copy
 import os
 import shutil
 import unittest
+from unittest import (
+    mock,
+)
 
+import h5py
 import numpy as np
 from common import (
     tests_path,
@@ -15,6 +19,16 @@ from deepmd.env import (
 from deepmd.utils.data import (
     DeepmdData,
 )
+from deepmd.utils.data_pack import (
+    pack_systems,
+)
+from deepmd.utils.path import (
+    DPH5Path,
+    DPPackPath,
+    DPPath,
+    _is_pack_file,
+    is_pack_file,
+)
 
 if GLOBAL_NP_FLOAT_PRECISION == np.float32:
     places = 6
@@ -150,6 +164,18 @@ class TestData(unittest.TestCase):
         self.assertEqual(dd.test_dir, "test_data/set.tar")
         self.assertEqual(dd.train_dirs, ["test_data/set.bar", "test_data/set.foo"])
 
+    def test_numb_batch(self):
+        dd = DeepmdData(self.data_name)
+        self.assertEqual(
+            (DPPath(self.data_name) / "set.tar" / "coord.npy").load_shape(),
+            (2, 3 * self.natoms),
+        )
+        self.assertEqual(dd.get_numb_batch(2, 0), self.nframes // 2)
+        self.assertEqual(dd.get_sys_numb_batch(2), 2 * (self.nframes // 2))
+        self.assertEqual(dd.check_batch_size(6), ("test_data/set.bar", self.nframes))
+        self.assertEqual(dd.check_test_size(3), ("test_data/set.tar", 2))
+        self.assertIsNone(dd.check_test_size(2))
+
     def test_init_type_map(self):
         dd = DeepmdData(self.data_name, type_map=["bar", "foo", "tar"])
         self.assertEqual(dd.idx_map[0], 0)
@@ -191,10 +217,16 @@ class TestData(unittest.TestCase):
         )
         data = dd._load_set(os.path.join(self.data_name, "set.foo"))
         data_bk = copy.deepcopy(data)
-        data, idx = dd._shuffle_data(data)
-        self._comp_np_mat2(data_bk["coord"][idx, :], data["coord"])
-        self._comp_np_mat2(data_bk["test_atomic"][idx, :], data["test_atomic"])
-        self._comp_np_mat2(data_bk["test_frame"][idx, :], data["test_frame"])
+        idx = dd._shuffle_idx(data)
+        np.testing.assert_equal(np.sort(idx), np.arange(self.nframes))
+        # the set is not modified by shuffling
+        self._comp_np_mat2(data_bk["coord"], data["coord"])
+        self._comp_np_mat2(data_bk["test_atomic"], data["test_atomic"])
+        self._comp_np_mat2(data_bk["test_frame"], data["test_frame"])
+        sub = dd._get_subdata(data, idx)
+        self._comp_np_mat2(data_bk["coord"][idx, :], sub["coord"])
+        self._comp_np_mat2(data_bk["test_atomic"][idx, :], sub["test_atomic"])
+        self._comp_np_mat2(data_bk["test_frame"][idx, :], sub["test_frame"])
 
     def test_shuffle_with_numb_copy(self):
         path = os.path.join(self.data_name, "set.foo", "numb_copy.npy")
@@ -206,12 +238,9 @@ class TestData(unittest.TestCase):
             .add("test_frame", 5, atomic=False, must=True)
         )
         data = dd._load_set(os.path.join(self.data_name, "set.foo"))
-        data_bk = copy.deepcopy(data)
-        data, idx = dd._shuffle_data(data)
+        idx = dd._shuffle_idx(data)
         assert idx.size == np.sum(prob)
-        self._comp_np_mat2(data_bk["coord"][idx, :], data["coord"])
-        self._comp_np_mat2(data_bk["test_atomic"][idx, :], data["test_atomic"])
-        self._comp_np_mat2(data_bk["test_frame"][idx, :], data["test_frame"])
+        np.testing.assert_equal(np.bincount(idx, minlength=self.nframes), prob)
 
     def test_reduce(self):
         dd = DeepmdData(self.data_name).add("test_atomic", 7, atomic=True, must=True)
@@ -238,6 +267,53 @@ class TestData(unittest.TestCase):
         with self.assertRaises(RuntimeError):
             data = dd._load_set(os.path.join(self.data_name, "set.foo"))
 
+    def test_load_skipped(self):
+        dd = (
+            DeepmdData(self.data_name)
+            .add("test_frame", 5, atomic=False, must=True, load=False)
+            .add("test_null", 2, atomic=True, must=False, repeat=3, default=1.0)
+        )
+        data = dd._load_set(os.path.join(self.data_name, "set.foo"))
+        self.assertEqual(data["find_test_frame"], 0)
+        self.assertEqual(data["find_test_null"], 0)
+        self._comp_np_mat2(data["test_frame"], np.zeros([self.nframes, 5]))
+        self._comp_np_mat2(
+            data["test_null"], np.ones([self.nframes, 2 * self.natoms * 3])
+        )
+        # no memory is allocated for the placeholders
+        self.assertEqual(data["test_null"].strides, (0, 0))
+        batch = dd.get_batch(2)
+        self._comp_np_mat2(batch["test_null"], np.ones([2, 2 * self.natoms * 3]))
+
+    def test_load_frames(self):
+        dd = (
+            DeepmdData(self.data_name)
+            .add("test_atomic", 7, atomic=True, must=True)
+            .add("test_null", 2, atomic=True, must=False, repeat=3, default=1.0)
+        )
+        idx = np.array([3, 0, 3])
+        with mock.patch.object(np, "load", wraps=np.load) as mock_load:
+            data = dd._load_frames(
+                os.path.join(self.data_name, "set.foo"),
+                ["coord", "type", "box", "test_atomic", "test_null"],
+                idx,
+            )
+        # only the frames are read from the memory-mapped files, without use_mmap
+        for call in mock_load.call_args_list:
+            self.assertEqual(call.kwargs["mmap_mode"], "r")
+        for kk in data:
+            self.assertNotIsInstance(data[kk], np.memmap)
+        self._comp_np_mat2(data["coord"], self.coord[idx])
+        self._comp_np_mat2(data["box"], self.box[idx])
+        self._comp_np_mat2(data["test_atomic"], self.test_atomic[idx])
+        self._comp_np_mat2(data["test_null"], np.ones([3, 2 * self.natoms * 3]))
+        np.testing.assert_equal(data["type"], np.tile([0, 1], [3, 1]))
+        # all frames
+        data = dd._load_frames(os.path.join(self.data_name, "set.tar"), ["coord"])
+        self._comp_np_mat2(data["coord"], self.coord_tar)
+        with self.assertRaises(RuntimeError):
+            dd._load_frames(os.path.join(self.data_name, "set.bar"), ["test_atomic"])
+
     def test_avg(self):
         dd = DeepmdData(self.data_name).add("test_frame", 5, atomic=False, must=True)
         favg = dd.avg("test_frame")
@@ -275,6 +351,108 @@ class TestData(unittest.TestCase):
         data = dd.get_batch(5)
         self._comp_np_mat2(np.sort(data["coord"], axis=0), np.sort(self.coord, axis=0))
 
+    def test_get_batch_prefetch(self):
+        dd = DeepmdData(self.data_name, prefetch_size=1)
+        data = dd.get_batch(5)
+        self._comp_np_mat2(
+            np.sort(data["coord"], axis=0), np.sort(self.coord_bar, axis=0)
+        )
+        data = dd.get_batch(5)
+        self._comp_np_mat2(np.sort(data["coord"], axis=0), np.sort(self.coord, axis=0))
+        data = dd.get_batch(5)
+        self._comp_np_mat2(
+            np.sort(data["coord"], axis=0), np.sort(self.coord_bar, axis=0)
+        )
+        self.assertLessEqual(len(dd._prefetch_queue), 1)
+
+    def test_get_batch_mmap(self):
+        dd = (
+            DeepmdData(self.data_name, use_mmap=True)
+            .add("test_atomic", 7, atomic=True, must=False)
+            .add("test_frame", 5, atomic=False, must=False)
+        )
+        data = dd.get_batch(5)
+        self.assertIsInstance(dd.batch_set["coord"], np.memmap)
+        self.assertNotIsInstance(data["coord"], np.memmap)
+        self._comp_np_mat2(
+            np.sort(data["coord"], axis=0), np.sort(self.coord_bar, axis=0)
+        )
+        self._comp_np_mat2(
+            np.sort(data["test_frame"], axis=0), np.sort(self.test_frame_bar, axis=0)
+        )
+        data = dd.get_batch(5)
+        idx = np.argsort(data["test_frame"][:, 0])
+        self._comp_np_mat2(
+            data["coord"][idx], self.coord[np.argsort(self.test_frame[:, 0])]
+        )
+        self._comp_np_mat2(
+            data["test_atomic"][idx],
+            self.test_atomic[np.argsort(self.test_frame[:, 0])],
+        )
+
+    def test_get_batch_shm(self):
+        shm_dir = "test_data_shm"
+        try:
+            dds = [
+                DeepmdData(self.data_name, shm_dir=shm_dir).add(
+                    "test_atomic", 7, atomic=True, must=False
+                )
+                for _ in range(2)
+            ]
+            for dd in dds:
+                dd.get_batch(5)
+            # box and coord of set.bar are shared
+            self.assertEqual(len(os.listdir(shm_dir)), 2)
+            for dd in dds:
+                self.assertFalse(dd.batch_set["coord"].flags.writeable)
+            self._comp_np_mat2(dds[0].batch_set["coord"], dds[1].batch_set["coord"])
+            data = dds[0].get_batch(5)
+            idx = np.argsort(data["test_atomic"][:, 0])
+            ref_idx = np.argsort(self.test_atomic[:, 0])
+            self._comp_np_mat2(data["coord"][idx], self.coord[ref_idx])
+        finally:
+            shutil.rmtree(shm_dir)
+
+    def test_get_batch_modifier(self):
+        class Modifier:
+            def __init__(self):
+                self.cache_keys = []
+
+            def modify_data(self, data, data_sys, cache_key=None):
+                self.cache_keys.append(cache_key)
+                data["test_frame"] -= 1.0
+
+        # a single training set is not reloaded and is modified only once
+        shutil.rmtree(os.path.join(self.data_name, "set.bar"))
+        modifier = Modifier()
+        dd = DeepmdData(self.data_name, modifier=modifier).add(
+            "test_frame", 5, atomic=False, must=False
+        )
+        for _ in range(3):
+            data = dd.get_batch(5)
+            self._comp_np_mat2(
+                np.sort(data["test_frame"], axis=0),
+                np.sort(self.test_frame - 1.0, axis=0),
+            )
+        self.assertEqual(modifier.cache_keys, [os.path.join(self.data_name, "set.foo")])
+
+    def test_get_batch_stream(self):
+        dd = DeepmdData(self.data_name, stream_block_size=2, stream_buffer_size=4).add(
+            "test_frame", 5, atomic=False, must=False
+        )
+        ref_coord = np.concatenate([self.coord_bar, self.coord])
+        ref_frame = np.concatenate([self.test_frame_bar, self.test_frame])
+        for _ in range(6):
+            data = dd.get_batch(3)
+            self.assertEqual(data["coord"].shape, (3, self.natoms * 3))
+            self.assertEqual(data["test_frame"].shape, (3, 5))
+            self.assertEqual(data["find_test_frame"], 1.0)
+            # frames are kept together with their labels
+            for coord, frame in zip(data["coord"], data["test_frame"]):
+                idx = np.argmin(np.abs(ref_frame[:, 0] - frame[0]))
+                self._comp_np_mat2(coord, ref_coord[idx])
+                self._comp_np_mat2(frame, ref_frame[idx])
+
     def test_get_test(self):
         dd = DeepmdData(self.data_name)
         data = dd.get_test()
@@ -293,6 +471,101 @@ class TestData(unittest.TestCase):
         np.testing.assert_almost_equal(first, second, places)
 
 
+class TestPackData(unittest.TestCase):
+    def setUp(self):
+        self.data_name = "test_data_pack"
+        self.pack_name = "test_data.dpk"
+        self.nframes = 5
+        self.natoms = 3
+        self.coord = {}
+        self.force = {}
+        for ss in ("sys0", os.path.join("sub", "sys1")):
+            set_dir = os.path.join(self.data_name, ss, "set.000")
+            os.makedirs(set_dir, exist_ok=True)
+            np.savetxt(
+                os.path.join(self.data_name, ss, "type.raw"),
+                np.array([1, 0, 1]),
+                fmt="%d",
+            )
+            np.savetxt(
+                os.path.join(self.data_name, ss, "type_map.raw"),
+                np.array(["foo", "bar"]),
+                fmt="%s",
+            )
+            self.coord[ss] = np.random.random([self.nframes, self.natoms * 3])
+            self.force[ss] = np.random.random([self.nframes, self.natoms * 3])
+            np.save(os.path.join(set_dir, "coord.npy"), self.coord[ss])
+            np.save(os.path.join(set_dir, "force.npy"), self.force[ss])
+            np.save(
+                os.path.join(set_dir, "box.npy"), np.random.random([self.nframes, 9])
+            )
+        open(os.path.join(self.data_name, "sys0", "nopbc"), "w").close()
+        self.systems = pack_systems(self.data_name, self.pack_name)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_name)
+        os.remove(self.pack_name)
+
+    def test_index(self):
+        self.assertEqual(
+            sorted(self.systems),
+            [self.pack_name + "#/sub/sys1", self.pack_name + "#/sys0"],
+        )
+        root = DPPath(self.pack_name)
+        self.assertIsInstance(root, DPPackPath)
+        self.assertTrue((root / "sys0" / "set.000").is_dir())
+        self.assertTrue((root / "sys0" / "set.000" / "coord.npy").is_file())
+        self.assertFalse((root / "sys0" / "set.000" / "energy.npy").is_file())
+        self.assertEqual(len(root.glob("*")), 2)
+        self.assertEqual(len(root.rglob("type.raw")), 2)
+        info = DPPath(self.pack_name + "#/sys0").get_system_info()
+        self.assertEqual(info["natoms"], self.natoms)
+        self.assertEqual(info["atom_types"], [1, 0, 1])
+        self.assertEqual(info["type_map"], ["foo", "bar"])
+        self.assertFalse(info["pbc"])
+        set_info = info["sets"]["/sys0/set.000"]
+        self.assertEqual(set_info["nframes"], self.nframes)
+        self.assertEqual(set_info["keys"], ["box", "coord", "force"])
+
+    def test_sniff_cached(self):
+        DPPath(self.pack_name)
+        misses = _is_pack_file.cache_info().misses
+        for _ in range(3):
+            self.assertIsInstance(DPPath(self.pack_name + "#/sys0"), DPPackPath)
+        # the file is read only once
+        self.assertEqual(_is_pack_file.cache_info().misses, misses)
+        # and again when it is modified
+        st = os.stat(self.pack_name)
+        os.utime(self.pack_name, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertTrue(is_pack_file(self.pack_name))
+        self.assertEqual(_is_pack_file.cache_info().misses, misses + 1)
+
+    def test_load(self):
+        for ss, name in (("sys0", "/sys0"), (os.path.join("sub", "sys1"), "/sub/sys1")):
+            dd = DeepmdData(self.pack_name + "#" + name).add(
+                "force", 3, atomic=True, must=True
+            )
+            dd_ref = DeepmdData(os.path.join(self.data_name, ss)).add(
+                "force", 3, atomic=True, must=True
+            )
+            self.assertEqual(dd.type_map, ["foo", "bar"])
+            self.assertEqual(dd.pbc, ss != "sys0")
+            data = dd._load_set(dd.train_dirs[0])
+            data_ref = dd_ref._load_set(dd_ref.train_dirs[0])
+            for kk in ("coord", "force", "type"):
+                np.testing.assert_almost_equal(data[kk], data_ref[kk], places)
+
+    def test_get_batch_mmap(self):
+        dd = DeepmdData(self.pack_name + "#/sys0", use_mmap=True)
+        data = dd.get_batch(self.nframes)
+        self.assertIsInstance(dd.batch_set["coord"], np.memmap)
+        coord = self.coord["sys0"].reshape([self.nframes, self.natoms, 3])
+        coord = coord[:, [1, 0, 2], :].reshape([self.nframes, -1])
+        np.testing.assert_almost_equal(
+            np.sort(data["coord"], axis=0), np.sort(coord, axis=0), places
+        )
+
+
 class TestH5Data(unittest.TestCase):
     def setUp(self):
         self.data_name = str(tests_path / "test.hdf5")
@@ -304,6 +577,74 @@ class TestH5Data(unittest.TestCase):
         self.assertEqual(dd.test_dir, self.data_name + "#/set.000")
         self.assertEqual(dd.train_dirs, [self.data_name + "#/set.000"])
 
+    def test_glob(self):
+        root = DPPath(self.data_name)
+        self.assertEqual(root.glob("set.*"), [self.data_name + "#/set.000"])
+        self.assertEqual(
+            sorted(str(pp) for pp in (root / "set.000").glob("*.npy")),
+            [
+                self.data_name + "#/set.000/" + kk
+                for kk in ("box.npy", "coord.npy", "energy.npy", "force.npy")
+            ],
+        )
+        self.assertEqual(root.glob("set.000/c*.npy"), [root / "set.000/coord.npy"])
+        self.assertTrue((root / "set.000" / "coord.npy").is_file())
+        self.assertFalse((root / "set.000" / "virial.npy").is_file())
+        self.assertTrue((root / "set.000").is_dir())
+
     def test_get_batch(self):
         dd = DeepmdData(self.data_name)
         data = dd.get_batch(5)
+
+
+class TestH5DataPartialRead(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.data_name = "test_data_partial.hdf5"
+        cls.nframes = 5
+        cls.natoms = 3
+        cls.coord = np.random.random([cls.nframes, cls.natoms * 3]).astype(
+            GLOBAL_NP_FLOAT_PRECISION
+        )
+        with h5py.File(cls.data_name, "w") as f:
+            f.create_dataset("type.raw", data=np.array([1, 0, 1]))
+            f.create_dataset("set.000/coord.npy", data=cls.coord, chunks=(1, 9))
+            f.create_dataset(
+                "set.000/box.npy",
+                data=np.random.random([cls.nframes, 9]).astype(
+                    GLOBAL_NP_FLOAT_PRECISION
+                ),
+            )
+        DPH5Path.set_file_options(rdcc_nbytes=1024**2, rdcc_nslots=521)
+
+    @classmethod
+    def tearDownClass(cls):
+        DPH5Path.set_file_options()
+        os.remove(cls.data_name)
+
+    def test_file_options(self):
+        root = DPPath(self.data_name)
+        self.assertEqual(
+            root.root.id.get_access_plist().get_cache()[1:3], (521, 1024**2)
+        )
+
+    def test_get_batch(self):
+        dd = DeepmdData(self.data_name, use_mmap=True)
+        data = dd.get_batch(self.nframes)
+        self.assertIsInstance(dd.batch_set["coord"], h5py.Dataset)
+        coord = self.coord.reshape([self.nframes, self.natoms, 3])
+        coord = coord[:, [1, 0, 2], :].reshape([self.nframes, -1])
+        np.testing.assert_almost_equal(
+            np.sort(data["coord"], axis=0), np.sort(coord, axis=0), places
+        )
+        # duplicated and unsorted frames
+        data = dd._get_subdata(dd.batch_set, np.array([3, 1, 3]))
+        np.testing.assert_almost_equal(data["coord"], coord[[3, 1, 3]], places)
+
+    def test_load_frames(self):
+        dd = DeepmdData(self.data_name)
+        data = dd._load_frames(dd.dirs[0], ["coord", "box"], np.array([3, 1, 3]))
+        coord = self.coord.reshape([self.nframes, self.natoms, 3])
+        coord = coord[:, [1, 0, 2], :].reshape([self.nframes, -1])
+        np.testing.assert_almost_equal(data["coord"], coord[[3, 1, 3]], places)
+        self.assertEqual(data["box"].shape, (3, 9))
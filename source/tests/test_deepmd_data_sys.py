@@ -78,6 +78,16 @@ class TestDataSystem(unittest.TestCase):
         ds = DeepmdDataSystem(self.sys_name, batch_size, test_size, 2.0)
         self.assertEqual(ds.batch_size, [1, 1, 1, 1])
 
+    def test_batch_size_max(self):
+        batch_size = "max:7"
+        test_size = 2
+        ds = DeepmdDataSystem(self.sys_name, batch_size, test_size, 2.0)
+        self.assertEqual(ds.batch_size, [2, 1, 1, 1])
+        # the number of atoms of a batch is no more than the budget
+        ds = DeepmdDataSystem(self.sys_name, "max:12", test_size, 2.0)
+        for bs, natoms in zip(ds.batch_size, ds.natoms):
+            self.assertLessEqual(bs * natoms, 12)
+
     def test_batch_size_raise(self):
         batch_size = "foo"
         test_size = 2
@@ -428,3 +438,45 @@ class TestDataSystem(unittest.TestCase):
                 data[kk][0, 3 * self.test_ndof : 6 * self.test_ndof],
                 np.zeros(3 * self.test_ndof),
             )
+
+    def test_get_mixed_batch_large(self):
+        """Test get_batch with mixed system larger than the sets."""
+        ds = DeepmdDataSystem(self.sys_name, "mixed:50", 2, 2.0)
+        ds.add("test", self.test_ndof, atomic=True, must=True)
+        data = ds.get_batch()
+        self.assertEqual(data["type"].shape[0], 50)
+        self.assertEqual(data["real_natoms_vec"].shape[0], 50)
+        self.assertEqual(data["test"].shape[0], 50)
+        np.testing.assert_equal(
+            data["real_natoms_vec"][:, 0], np.sum(data["type"] >= 0, axis=1)
+        )
+
+    def test_set_shard(self):
+        probs = []
+        for rank in range(2):
+            ds = DeepmdDataSystem(self.sys_name, 3, 2, 2.0)
+            global_probs = np.array(ds.sys_probs)
+            ds.set_shard(rank, 2)
+            self.assertAlmostEqual(np.sum(ds.sys_probs), 1.0)
+            probs.append(ds.sys_probs)
+        # disjoint shards covering all systems
+        np.testing.assert_equal((probs[0] > 0) ^ (probs[1] > 0), True)
+        # the global distribution is p_i / (size * P_k) for the shard k
+        shard_probs = np.array(
+            [np.sum(global_probs[probs[rank] > 0]) for rank in range(2)]
+        )
+        owner = np.where(probs[0] > 0, 0, 1)
+        np.testing.assert_allclose(
+            (probs[0] + probs[1]) / 2,
+            global_probs / (2 * shard_probs[owner]),
+            rtol=1e-12,
+        )
+        with self.assertRaises(RuntimeError):
+            ds.set_shard(0, ds.nsystems + 1)
+
+    def test_set_shard_imbalance(self):
+        ds = DeepmdDataSystem(self.sys_name, 3, 2, 2.0, sys_probs=[0.6, 0.2, 0.1, 0.1])
+        # the shards are [0.6] and [0.2, 0.1, 0.1]
+        with self.assertLogs("deepmd.utils.data_system", level="WARNING"):
+            ds.set_shard(0, 2)
+        np.testing.assert_allclose(ds.sys_probs, [1.0, 0.0, 0.0, 0.0])
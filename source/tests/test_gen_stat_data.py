@@ -1,6 +1,11 @@
 # SPDX-License-Identifier: LGPL-3.0-or-later
+import os
 import shutil
+import tempfile
 import unittest
+from unittest import (
+    mock,
+)
 
 import dpdata
 import numpy as np
@@ -8,13 +13,23 @@ import numpy as np
 from deepmd.descriptor import (
     DescrptSeA,
 )
+from deepmd.descriptor.se_a import (
+    _merge_stat_batches,
+)
 from deepmd.fit import (
     EnerFitting,
 )
+from deepmd.model import (
+    EnerModel,
+)
 from deepmd.model.model_stat import (
     _make_all_stat_ref,
+    get_stat_hash,
+    load_stat,
     make_stat_input,
+    make_stat_input_iter,
     merge_sys_stat,
+    save_stat,
 )
 from deepmd.utils import random as dp_random
 from deepmd.utils.data_system import (
@@ -141,3 +156,236 @@ class TestEnerShift(unittest.TestCase):
         tot0 = np.dot(data.compute_energy_shift(rcond=1), natoms)
         tot1 = np.dot(ener_shift1, natoms)
         np.testing.assert_almost_equal(tot0, tot1)
+
+
+class TestDescrptStat(unittest.TestCase):
+    def setUp(self):
+        data0 = gen_sys(20, [0, 1, 0, 2, 1])
+        data1 = gen_sys(30, [0, 1, 0, 0])
+        sys0 = dpdata.LabeledSystem()
+        sys1 = dpdata.LabeledSystem()
+        sys0.data = data0
+        sys1.data = data1
+        sys0.to_deepmd_npy("system_0", set_size=10)
+        sys1.to_deepmd_npy("system_1", set_size=10)
+
+    def tearDown(self):
+        shutil.rmtree("system_0")
+        shutil.rmtree("system_1")
+
+    def test_merged_batches(self):
+        dp_random.seed(0)
+        data = DeepmdDataSystem(["system_0", "system_1"], 5, 10, 1.0)
+        data.add("energy", 1, must=True)
+        all_stat = merge_sys_stat(make_stat_input(data, 4, merge_sys=False))
+        descrpt = DescrptSeA(6.0, 5.8, [46, 92], neuron=[25, 50, 100], axis_neuron=16)
+        descrpt.compute_input_stats(
+            all_stat["coord"],
+            all_stat["box"],
+            all_stat["type"],
+            all_stat["natoms_vec"],
+            all_stat["default_mesh"],
+            all_stat,
+        )
+        # statistics of the batches computed one by one
+        stat_dict = {kk: [] for kk in ("sumr", "sumr2", "suma", "suma2", "sumn")}
+        for cc, bb, tt, nn, mm in zip(
+            all_stat["coord"],
+            all_stat["box"],
+            all_stat["type"],
+            all_stat["natoms_vec"],
+            all_stat["default_mesh"],
+        ):
+            for kk, vv in zip(
+                ("sumr", "sumr2", "suma", "suma2", "sumn"),
+                descrpt._compute_dstats_sys_smth(cc, bb, tt, nn, mm),
+            ):
+                stat_dict[kk].append(vv)
+        davg = descrpt.davg
+        dstd = descrpt.dstd
+        descrpt.merge_input_stats(stat_dict)
+        np.testing.assert_almost_equal(davg, descrpt.davg)
+        np.testing.assert_almost_equal(dstd, descrpt.dstd)
+
+    def test_merge_max_atoms(self):
+        dp_random.seed(0)
+        data = DeepmdDataSystem(["system_0", "system_0"], 5, 10, 1.0)
+        data.add("energy", 1, must=True)
+        all_stat = merge_sys_stat(make_stat_input(data, 4, merge_sys=False))
+        args = (
+            all_stat["coord"],
+            all_stat["box"],
+            all_stat["type"],
+            all_stat["natoms_vec"],
+            all_stat["default_mesh"],
+        )
+        # 8 batches of 5 frames with 5 atoms from two systems
+        self.assertEqual([len(bb[0]) for bb in _merge_stat_batches(*args)], [40])
+        self.assertEqual(
+            [len(bb[0]) for bb in _merge_stat_batches(*args, max_atoms=60)],
+            [10, 10, 10, 10],
+        )
+        self.assertEqual(
+            [len(bb[0]) for bb in _merge_stat_batches(*args, max_atoms=5)],
+            [5] * 8,
+        )
+
+    def test_stat_input_iter(self):
+        data = DeepmdDataSystem(["system_0", "system_1"], 5, 10, 1.0)
+        data.add("energy", 1, must=True)
+        dp_random.seed(0)
+        all_stat = make_stat_input(data, 4, merge_sys=False)
+        dp_random.seed(0)
+        for ii, sys_stat in enumerate(make_stat_input_iter(data, 4)):
+            self.assertEqual(set(sys_stat), set(all_stat))
+            for kk in sys_stat:
+                np.testing.assert_equal(sys_stat[kk], all_stat[kk][ii])
+        self.assertEqual(ii, 1)
+
+    def test_stream(self):
+        data = DeepmdDataSystem(["system_0", "system_1"], 5, 10, 1.0)
+        data.add("energy", 1, must=True)
+        models = []
+        for stream in (True, False):
+            descrpt = DescrptSeA(
+                6.0, 5.8, [46, 92, 46], neuron=[25, 50, 100], axis_neuron=16
+            )
+            fitting = EnerFitting(descrpt, neuron=[240, 240, 240], resnet_dt=True)
+            model = EnerModel(descrpt, fitting, data_stat_nbatch=4)
+            self.assertTrue(model._can_stream_stat(data))
+            dp_random.seed(0)
+            with mock.patch.object(EnerModel, "_can_stream_stat", return_value=stream):
+                model.data_stat(data)
+            models.append(model)
+        # the statistics accumulated system by system are the same
+        np.testing.assert_almost_equal(models[0].descrpt.davg, models[1].descrpt.davg)
+        np.testing.assert_almost_equal(models[0].descrpt.dstd, models[1].descrpt.dstd)
+        np.testing.assert_almost_equal(
+            models[0].fitting.bias_atom_e, models[1].fitting.bias_atom_e
+        )
+
+
+class TestStatCache(unittest.TestCase):
+    def setUp(self):
+        sys0 = dpdata.LabeledSystem()
+        sys0.data = gen_sys(20, [0, 1, 0, 2, 1])
+        sys0.to_deepmd_npy("system_0", set_size=10)
+        self.stat_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree("system_0")
+        shutil.rmtree(self.stat_dir)
+
+    def test_hash(self):
+        data = DeepmdDataSystem(["system_0"], 5, 10, 1.0)
+        params = {"descriptor": {"type": "se_e2_a", "rcut": 6.0}}
+        stat_hash = get_stat_hash(data, params)
+        self.assertEqual(stat_hash, get_stat_hash(data, params))
+        # parameters
+        self.assertNotEqual(
+            stat_hash,
+            get_stat_hash(data, {"descriptor": {"type": "se_e2_a", "rcut": 5.0}}),
+        )
+        # batch size
+        data = DeepmdDataSystem(["system_0"], 4, 10, 1.0)
+        self.assertNotEqual(stat_hash, get_stat_hash(data, params))
+        # data files
+        data = DeepmdDataSystem(["system_0"], 5, 10, 1.0)
+        energy = np.load(os.path.join("system_0", "set.000", "energy.npy"))
+        np.save(os.path.join("system_0", "set.000", "energy.npy"), energy[:-1])
+        self.assertNotEqual(stat_hash, get_stat_hash(data, params))
+        stat_hash = get_stat_hash(data, params)
+        # files not read by the statistics
+        np.save(os.path.join("system_0", "set.000", "nlist.npy"), np.zeros(3))
+        force = np.load(os.path.join("system_0", "set.000", "force.npy"))
+        np.save(os.path.join("system_0", "set.000", "force.npy"), force[:-1])
+        self.assertEqual(stat_hash, get_stat_hash(data, params))
+
+    def test_data_stat(self):
+        data = DeepmdDataSystem(["system_0"], 5, 10, 1.0)
+        data.add("energy", 1, must=True)
+
+        def make_model():
+            return EnerModel(
+                {
+                    "type": "se_e2_a",
+                    "rcut": 6.0,
+                    "rcut_smth": 5.8,
+                    "sel": [46, 92, 46],
+                    "neuron": [25, 50, 100],
+                    "axis_neuron": 16,
+                },
+                {"type": "ener", "neuron": [240, 240, 240]},
+                type_map=["TYPE_0", "TYPE_1", "TYPE_2"],
+                data_stat_nbatch=4,
+                stat_cache_dir=self.stat_dir,
+            )
+
+        model0 = make_model()
+        model0.data_stat(data)
+        # the statistics are loaded instead of computed
+        model1 = make_model()
+        with mock.patch.object(
+            EnerModel, "_compute_output_stat", side_effect=AssertionError
+        ):
+            model1.data_stat(data)
+        np.testing.assert_equal(model1.descrpt.davg, model0.descrpt.davg)
+        np.testing.assert_equal(model1.descrpt.dstd, model0.descrpt.dstd)
+        np.testing.assert_equal(model1.fitting.bias_atom_e, model0.fitting.bias_atom_e)
+        # the statistics are computed again if a set is changed
+        path = os.path.join("system_0", "set.000", "energy.npy")
+        np.save(path, np.load(path) + 1.0)
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        model2 = make_model()
+        with mock.patch.object(
+            EnerModel,
+            "_compute_output_stat",
+            autospec=True,
+            side_effect=EnerModel._compute_output_stat,
+        ) as mock_compute:
+            model2.data_stat(data)
+        mock_compute.assert_called_once()
+        self.assertFalse(
+            np.allclose(model2.fitting.bias_atom_e, model0.fitting.bias_atom_e)
+        )
+
+    def test_stat_params(self):
+        data = DeepmdDataSystem(["system_0"], 5, 10, 1.0)
+
+        def get_hash(neuron=(25, 50, 100), rcond=None):
+            model = EnerModel(
+                {
+                    "type": "se_e2_a",
+                    "rcut": 6.0,
+                    "rcut_smth": 5.8,
+                    "sel": [46, 92, 46],
+                    "neuron": list(neuron),
+                    "axis_neuron": 16,
+                },
+                {"type": "ener", "neuron": [240, 240, 240], "rcond": rcond},
+                type_map=["TYPE_0", "TYPE_1", "TYPE_2"],
+                stat_cache_dir=self.stat_dir,
+            )
+            return get_stat_hash(data, model.stat_params)
+
+        stat_hash = get_hash()
+        self.assertEqual(stat_hash, get_hash())
+        # any parameter of the descriptor or the fitting
+        self.assertNotEqual(stat_hash, get_hash(neuron=(10, 20, 40)))
+        self.assertNotEqual(stat_hash, get_hash(rcond=1e-3))
+        # the floating-point precision
+        with mock.patch("deepmd.model.ener.GLOBAL_NP_FLOAT_PRECISION", np.float32):
+            self.assertNotEqual(stat_hash, get_hash())
+
+    def test_save_load(self):
+        self.assertIsNone(load_stat(self.stat_dir, "foo"))
+        stat = {
+            "descrpt0_davg": np.random.random([3, 8]),
+            "fitting_bias_atom_e": np.ones(3),
+        }
+        save_stat(self.stat_dir, "foo", stat)
+        loaded = load_stat(self.stat_dir, "foo")
+        self.assertEqual(set(loaded), set(stat))
+        for kk in stat:
+            np.testing.assert_equal(loaded[kk], stat[kk])
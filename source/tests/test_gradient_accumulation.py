@@ -0,0 +1,53 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import types
+import unittest
+
+import numpy as np
+
+from deepmd.env import (
+    tf,
+)
+from deepmd.train.trainer import (
+    DPTrainer,
+)
+
+
+class TestGradientAccumulation(unittest.TestCase):
+    def test_accumulation(self):
+        nsteps = 3
+        xs = np.random.default_rng(0).random([nsteps, 4, 2])
+        with tf.Graph().as_default():
+            trainer = types.SimpleNamespace(
+                gradient_accumulation_steps=nsteps,
+                run_opt=types.SimpleNamespace(is_distrib=False),
+                global_step=tf.train.get_or_create_global_step(),
+                _extra_train_ops=[],
+            )
+            x = tf.placeholder(tf.float64, [None, 2])
+            w = tf.Variable(np.ones(2), name="w")
+            loss = tf.reduce_mean(tf.square(tf.reduce_sum(x * w, axis=1)))
+            optimizer = tf.train.GradientDescentOptimizer(0.1)
+            apply_op, accum_op = DPTrainer._build_accumulation(
+                trainer, optimizer, loss, [w], name="train_step"
+            )
+            grad = tf.gradients(loss, w)[0]
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                sess.run(tf.local_variables_initializer())
+                # expected update: the average of the gradients of the micro-batches
+                expected = np.ones(2) - 0.1 * np.mean(
+                    [sess.run(grad, feed_dict={x: xx}) for xx in xs], axis=0
+                )
+                for xx in xs[:-1]:
+                    sess.run(accum_op, feed_dict={x: xx})
+                # not applied before the last micro-batch
+                np.testing.assert_allclose(sess.run(w), np.ones(2))
+                self.assertEqual(sess.run(trainer.global_step), 0)
+                sess.run(apply_op, feed_dict={x: xs[-1]})
+                np.testing.assert_allclose(sess.run(w), expected)
+                self.assertEqual(sess.run(trainer.global_step), 1)
+                # the accumulators are reset
+                grad0 = sess.run(grad, feed_dict={x: xs[0]})
+                sess.run(apply_op, feed_dict={x: xs[0]})
+                np.testing.assert_allclose(sess.run(w), expected - 0.1 * grad0 / nsteps)
+                self.assertEqual(sess.run(trainer.global_step), 2)
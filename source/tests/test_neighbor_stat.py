@@ -1,6 +1,11 @@
 # SPDX-License-Identifier: LGPL-3.0-or-later
+import os
 import shutil
+import types
 import unittest
+from unittest import (
+    mock,
+)
 
 import dpdata
 import numpy as np
@@ -8,6 +13,21 @@ import numpy as np
 from deepmd.entrypoints.neighbor_stat import (
     neighbor_stat,
 )
+from deepmd.utils.data import (
+    DeepmdData,
+)
+from deepmd.utils.data_manifest import (
+    get_data_manifest,
+)
+from deepmd.utils.data_system import (
+    DeepmdDataSystem,
+)
+from deepmd.utils.neighbor_stat import (
+    NeighborStat,
+)
+from deepmd.utils.parallel_op import (
+    ParallelOp,
+)
 
 
 def gen_sys(nframes):
@@ -56,3 +76,70 @@ class TestNeighborStat(unittest.TestCase):
                 )
                 self.assertAlmostEqual(min_nbor_dist, 1.0, 6)
                 self.assertEqual(max_nbor_size, [expected_neighbors])
+
+    def test_neighbor_stat_cache(self):
+        manifest = "test_neighbor_stat_manifest.json"
+        rcut = 2.0 + 1e-3
+        try:
+            with mock.patch.dict(os.environ, {"DP_DATA_MANIFEST": manifest}):
+                ref = neighbor_stat(system="system_0", rcut=rcut, type_map=["TYPE"])
+                # the statistics are taken from the manifest
+                with mock.patch.object(
+                    ParallelOp, "generate", side_effect=AssertionError
+                ):
+                    ret = neighbor_stat(system="system_0", rcut=rcut, type_map=["TYPE"])
+                get_data_manifest().save()
+            self.assertAlmostEqual(ret[0], ref[0])
+            np.testing.assert_equal(ret[1], ref[1])
+        finally:
+            if os.path.isfile(manifest):
+                os.remove(manifest)
+
+
+class TestNeighborStatSample(unittest.TestCase):
+    def setUp(self):
+        sys0 = dpdata.LabeledSystem()
+        sys0.data = gen_sys(10)
+        # sets of 4, 4 and 2 frames
+        sys0.to_deepmd_npy("system_1", set_size=4)
+
+    def tearDown(self):
+        shutil.rmtree("system_1")
+
+    def test_sample_frames(self):
+        data_sys = DeepmdData("system_1")
+        for sample, expected in ((0.5, [2, 2, 1]), (3, [1, 1, 1]), (0.9, [4, 4, 2])):
+            with self.subTest(sample=sample):
+                frames = NeighborStat._sample_frames(
+                    types.SimpleNamespace(sample=sample), data_sys
+                )
+                self.assertEqual(list(frames), [str(jj) for jj in data_sys.dirs])
+                for jj, nn in zip(data_sys.dirs, expected):
+                    idx = frames[str(jj)]
+                    if nn == data_sys._get_nframes(jj):
+                        # all frames of the set
+                        self.assertIsNone(idx)
+                    else:
+                        self.assertEqual(len(idx), nn)
+                        self.assertEqual(len(np.unique(idx)), nn)
+                        self.assertTrue(np.all(idx < data_sys._get_nframes(jj)))
+                # the same frames in every run
+                np.testing.assert_equal(
+                    frames,
+                    NeighborStat._sample_frames(
+                        types.SimpleNamespace(sample=sample), data_sys
+                    ),
+                )
+
+    def test_get_stat_sample(self):
+        rcut = 2.0 + 1e-3
+        data = DeepmdDataSystem(["system_1"], 1, 1, rcut, type_map=["TYPE"])
+        ref = NeighborStat(1, rcut).get_stat(data)
+        with self.assertLogs("deepmd.utils.neighbor_stat", level="INFO") as cm:
+            ret = NeighborStat(1, rcut, sample=0.5).get_stat(data)
+        # the frames are the same, so the estimate is exact
+        self.assertAlmostEqual(ret[0], ref[0])
+        np.testing.assert_equal(ret[1], ref[1])
+        output = "\n".join(cm.output)
+        self.assertIn("neighbor statistics of 5 sampled frames", output)
+        self.assertIn("with a probability of at most 0.17", output)